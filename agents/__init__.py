@@ -4,4 +4,7 @@ from .summarizer_agent import (
     SummarizerAgent,
     SummarizerAgentState,
     SummarizerSummaryState,
+    SummaryJob,
+    SummaryJobQueue,
+    get_summary_job_queue,
 )
\ No newline at end of file
@@ -1,11 +1,14 @@
-from typing import Union
 from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Union
 from abc import ABC, abstractmethod
 
 from langgraph.graph import StateGraph
 from langgraph.graph.state import CompiledStateGraph
+from langchain_core.runnables import RunnableConfig
 from langchain_core.language_models import BaseChatModel
 
+from intellitube.llm_cache import LLMCacheStats, ScopedLLMCache, scoped_llm
+
 
 class BaseAgent(ABC):
     llm: BaseChatModel
@@ -29,7 +32,33 @@ class BaseAgent(ABC):
         self._agent = None
 
     def __init__(self, llm: BaseChatModel) -> None:
-        self.llm = llm
+        # the LLM cache's hits & misses of every agent are counted separately
+        self.llm = scoped_llm(llm, type(self).__name__)
+    
+    @property
+    def llm_cache_stats(self) -> Optional[LLMCacheStats]:
+        """Hits & saved tokens of this agent's LLM calls, None if its LLM is not cached."""
+        if isinstance(self.llm.cache, ScopedLLMCache):
+            return self.llm.cache.stats
+        return None
+    
+    async def ainvoke(self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        """Runs the agent without blocking the event loop, \
+        so one process can serve many concurrent chats."""
+        return await self.agent.ainvoke(input, config, **kwargs)
+    
+    async def astream(self,
+        input: Dict[str, Any],
+        config: Optional[RunnableConfig] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """Streams the agent's outputs without blocking the event loop (see `CompiledStateGraph.astream()`)."""
+        async for chunk in self.agent.astream(input, config, **kwargs):
+            yield chunk
     
     def save_graph_image(self, path: Union[Path, str]) -> None:
         if isinstance(path, str):
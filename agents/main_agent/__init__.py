@@ -1,3 +1,4 @@
 from .agent import IntelliTubeAI
 from .prompts import router_agent_system_prompt
-from .states import AgentState, RouterAgentResponse
+from .router import fast_route
+from .states import AgentState, RouterAgentResponse, RouterMetrics
@@ -1,11 +1,16 @@
+import time
+import asyncio
 from loguru import logger
-from typing_extensions import List, Literal, Union
+from typing_extensions import Any, Dict, List, Literal, Optional, Union
 
-from intellitube.utils import ChatManager
+from intellitube.utils import ChatManager, TokenCounter, expand_youtube_urls, run_in_threadpool
 from intellitube.agents.base_agent import BaseAgent
+from intellitube.llm_cache import astream_with_cache, stream_with_cache
 from intellitube.tools import document_loader_tools
 from intellitube.vector_store import VectorStoreManager
-from .states import AgentState, RouterAgentResponse
+from intellitube.agents.summarizer_agent import SummaryJobQueue
+from .router import fast_route
+from .states import AgentState, RouterAgentResponse, RouterMetrics
 from .prompts import router_agent_system_prompt
 from intellitube.agents.chat_agent.prompts import (
     system_prompt as chat_agent_system_prompt
@@ -14,11 +19,13 @@ from intellitube.agents.chat_agent.prompts import (
 from langgraph.graph import START, END, StateGraph
 
 from langchain_core.messages import (
-    AIMessage, HumanMessage, ToolMessage
+    AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage, trim_messages
 )
+from langchain_core.messages.utils import message_chunk_to_message
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
 from langchain_core.vectorstores import VectorStoreRetriever
 
 
@@ -26,13 +33,21 @@ class IntelliTubeAI(BaseAgent):
     _chat_manager: ChatManager
     _vdb: VectorStoreManager
     _retriever: VectorStoreRetriever = None
+    _summary_job_queue: Optional[SummaryJobQueue] = None
     _similarity_score_threshold: float = 0.6
+    # tokens of role & formatting around every message of the history
+    _tokens_per_message: int = 4
 
     document_loader_functions = {
         "document": document_loader_tools.load_document,
         "youtube_video": document_loader_tools.load_youtube_transcript,
         "website": document_loader_tools.load_webpage
     }
+    async_document_loader_functions = {
+        "document": document_loader_tools.aload_document,
+        "youtube_video": document_loader_tools.aload_youtube_transcript,
+        "website": document_loader_tools.aload_webpage
+    }
 
     @property
     def chat_manager(self) -> ChatManager:
@@ -42,10 +57,14 @@ class IntelliTubeAI(BaseAgent):
     def vdb(self) -> VectorStoreManager:
         return self._vdb
     
+    @property
+    def summary_job_queue(self) -> Optional[SummaryJobQueue]:
+        return self._summary_job_queue
+    
     @property
     def retriever(self) -> VectorStoreRetriever:
         if not self._retriever:
-            self._retriever = self.vdb.vectorstore.as_retriever(
+            self._retriever = self.vdb.as_retriever(
                 search_type="similarity_score_threshold",
                 search_kwargs={'score_threshold': self._similarity_score_threshold}
             )
@@ -55,30 +74,156 @@ class IntelliTubeAI(BaseAgent):
         llm: BaseChatModel,
         chat_manager: ChatManager,
         vector_store_manager: VectorStoreManager,
+        summary_job_queue: Optional[SummaryJobQueue] = None,
+        auto_summarize: bool = False,
+        history_max_tokens: Optional[int] = 4096,
+        token_counter: Optional[TokenCounter] = None,
     ) -> None:
+        """
+        Args:
+            llm (BaseChatModel): the LLM of the router & the chat agent.
+            chat_manager (ChatManager): the chat being served.
+            vector_store_manager (VectorStoreManager): the chat's knowledge base.
+            summary_job_queue (Optional[SummaryJobQueue], optional): Summarizes the sources \
+                in the background (see `submit_summary_job()`). Defaults to None.
+            auto_summarize (bool, optional): Queue a summary of every newly loaded source, \
+                a map-reduce of LLM calls each (also for every video of an ingested playlist). \
+                Defaults to False.
+            history_max_tokens (Optional[int], optional): Token budget of the chat history sent to \
+                the chat agent, the latest turns that fit are kept. None to send the whole history. \
+                Defaults to 4096.
+            token_counter (Optional[TokenCounter], optional): Token counter of the history, \
+                e.g. `TokenCounter(llm.get_num_tokens)` for exact (memoized) counts. Defaults to an estimating one.
+        """
         BaseAgent.__init__(self, llm=llm)
         
         self._chat_manager = chat_manager
         self._vdb = vector_store_manager
+        self._summary_job_queue = summary_job_queue
+        self.auto_summarize = auto_summarize
+        self.history_max_tokens = history_max_tokens
+        self.token_counter = token_counter or TokenCounter()
     
     def add_to_vdb(self, documents: List[Document]) -> None:
         # convert to a list of document(s) if not already!
         if type(documents) == Document:
             documents = [documents]
         
-        self.vdb.add_documents(
-            documents, split_text=True,
-            split_config={
-                "chunk_size": 512,
-                "chunk_overlap": 128
-            },
-            skip_if_collection_exists=False,
+        # transcript chunks are already packed by whole cues (and carry their
+        # timestamps), splitting them again would cut cues in half
+        transcript_chunks = [doc for doc in documents if "start_ms" in doc.metadata]
+        documents = [doc for doc in documents if "start_ms" not in doc.metadata]
+
+        if documents:
+            self.vdb.add_documents(
+                documents, split_text=True,
+                split_config={
+                    "chunk_size": 512,
+                    "chunk_overlap": 128
+                },
+                skip_if_collection_exists=False,
+            )
+        
+        if transcript_chunks:
+            self.vdb.add_documents(transcript_chunks, skip_if_collection_exists=False)
+    
+    async def aingest_youtube_urls(self,
+        youtube_urls: Union[str, List[str]],
+        max_concurrency: int = 4,
+        requests_per_second: Optional[float] = 2.0,
+    ) -> Dict[str, Union[int, Exception]]:
+        """Loads many videos, or a playlist / channel, into the knowledge base.
+
+        The transcripts download concurrently, and each one is parsed & embedded as soon as it \
+        arrives, while the others are still downloading. Already indexed videos are skipped.
+
+        Returns:
+            Dict[str, Union[int, Exception]]: the number of chunks added per video URL, or its error.
+        """
+        youtube_urls = await run_in_threadpool(expand_youtube_urls, youtube_urls)
+        results: Dict[str, Union[int, Exception]] = {}
+        new_urls = []
+        for url in youtube_urls:
+            if await run_in_threadpool(self.vdb.use_indexed_source, url):
+                results[url] = 0
+            else:
+                new_urls.append(url)
+
+        # one source is embedded at a time (the local Qdrant client is not thread-safe),
+        # but it overlaps with the downloads & parsing of the next ones
+        embed_lock = asyncio.Lock()
+
+        async def embed(url: str, documents: List[Document]) -> None:
+            try:
+                async with embed_lock:
+                    await run_in_threadpool(self.add_to_vdb, documents)
+            except Exception as e:
+                logger.error(f"Could not index {url}: {e!r}")
+                results[url] = e
+                return
+            self._auto_summarize(url, documents)
+            results[url] = len(documents)
+
+        embed_tasks = []
+        async for url, documents in document_loader_tools.aiter_youtube_transcripts(
+            new_urls, max_concurrency=max_concurrency, requests_per_second=requests_per_second
+        ):
+            if isinstance(documents, Exception):
+                results[url] = documents
+                continue
+            embed_tasks.append(asyncio.create_task(embed(url, documents)))
+        await asyncio.gather(*embed_tasks)
+
+        logger.info(
+            f"Ingested {sum(isinstance(n, int) and n > 0 for n in results.values())}/{len(results)} videos"
         )
+        return results
+    
+    def submit_summary_job(self, source: str, documents: List[Document]) -> Optional[str]:
+        """Queues the summarization of a source in the background, the chat turn does not \
+        wait for it. The job id is kept in the chat's additional data."""
+        if not self.summary_job_queue:
+            return None
+        job_id = self.summary_job_queue.submit(
+            documents, source=source, chat_id=self.chat_manager.chat_id
+        )
+        self.chat_manager.chat.additional_data.setdefault("summary_jobs", {})[source] = job_id
+        return job_id
+    
+    def _auto_summarize(self, source: str, documents: List[Document]) -> Optional[str]:
+        """Summarizes a newly loaded source, only if `auto_summarize` is on."""
+        if not self.auto_summarize:
+            return None
+        return self.submit_summary_job(source, documents)
+    
+    @staticmethod
+    def format_source(index: int, document: Document) -> str:
+        """Formats a retrieved document for the chat agent's context.
+        Transcript chunks also tell where they are in the video."""
+        source = f"Source #{index + 1}"
+        if "start" in document.metadata and "end" in document.metadata:
+            source += f" (from {document.metadata['start']} to {document.metadata['end']}"
+            if document.metadata.get("timestamp_url"):
+                source += f", {document.metadata['timestamp_url']}"
+            source += ")"
+        return f"{source}: {document.page_content}"
     
     # ========== DEFINE NODES ==========
 
+    @staticmethod
+    def _router_metrics(route: Literal["fast", "llm"], started: float) -> RouterMetrics:
+        metrics = RouterMetrics(route=route, latency_ms=(time.perf_counter() - started) * 1000)
+        logger.info(f"Routed by the {route} path in {metrics.latency_ms:.2f} ms")
+        return metrics
+
     def router_agent_node(self, state: AgentState) -> AgentState:
         """Router Agent Nodes"""
+        # the common cases are routed by rules, without an LLM round trip
+        started = time.perf_counter()
+        agent_resp = fast_route(state["messages"][-1].content)
+        if agent_resp:
+            return {"router_response": agent_resp, "router_metrics": self._router_metrics("fast", started)}
+        
         structured_llm = self.llm.with_structured_output(RouterAgentResponse)
         messages = ChatPromptTemplate.from_messages(
             [router_agent_system_prompt, state["messages"][-1]]
@@ -87,7 +232,23 @@ class IntelliTubeAI(BaseAgent):
             messages.format_messages()
         )
         # return {"messages": [HumanMessage(agent_resp.user_query)], "router_response": agent_resp}
-        return {"router_response": agent_resp}
+        return {"router_response": agent_resp, "router_metrics": self._router_metrics("llm", started)}
+    
+    async def arouter_agent_node(self, state: AgentState) -> AgentState:
+        """Async Router Agent Node"""
+        started = time.perf_counter()
+        agent_resp = fast_route(state["messages"][-1].content)
+        if agent_resp:
+            return {"router_response": agent_resp, "router_metrics": self._router_metrics("fast", started)}
+        
+        structured_llm = self.llm.with_structured_output(RouterAgentResponse)
+        messages = ChatPromptTemplate.from_messages(
+            [router_agent_system_prompt, state["messages"][-1]]
+        )
+        agent_resp: RouterAgentResponse = await structured_llm.ainvoke(
+            messages.format_messages()
+        )
+        return {"router_response": agent_resp, "router_metrics": self._router_metrics("llm", started)}
 
     def query_router_node(self, state: AgentState) -> Literal["use_loader", "use_retriever"]:
         """query router node"""
@@ -96,12 +257,32 @@ class IntelliTubeAI(BaseAgent):
     def document_loader_node(self, state: AgentState) -> Literal["success", "fail"]:
         """document loader node"""
         logger.info(f'{state["router_response"] = }')
+        # a source indexed before is neither downloaded nor embedded again
+        if self.vdb.use_indexed_source(state["router_response"].url):
+            logger.info(f'Already indexed: {state["router_response"].url}')
+            return "success"
         loader_func = self.document_loader_functions.get(state["router_response"].url_of)
         logger.info(f"{loader_func = }")
         documents: Union[Exception, List[Document]] = loader_func(state["router_response"].url)
         if type(documents) == Exception:
             return "fail"
         self.add_to_vdb(documents)
+        self._auto_summarize(state["router_response"].url, documents)
+        return "success"
+    
+    async def adocument_loader_node(self, state: AgentState) -> Literal["success", "fail"]:
+        """async document loader node, the blocking parts run on the shared thread pool"""
+        logger.info(f'{state["router_response"] = }')
+        if await run_in_threadpool(self.vdb.use_indexed_source, state["router_response"].url):
+            logger.info(f'Already indexed: {state["router_response"].url}')
+            return "success"
+        loader_func = self.async_document_loader_functions.get(state["router_response"].url_of)
+        logger.info(f"{loader_func = }")
+        documents: Union[Exception, List[Document]] = await loader_func(state["router_response"].url)
+        if type(documents) == Exception:
+            return "fail"
+        await run_in_threadpool(self.add_to_vdb, documents)
+        self._auto_summarize(state["router_response"].url, documents)
         return "success"
     
     def document_retriever_node(self, state: AgentState) -> AgentState:
@@ -112,23 +293,79 @@ class IntelliTubeAI(BaseAgent):
         print(state["retrieved_docs"], end='\n\n')
         return state
     
-    def chat_agent_node(self, state: AgentState) -> AgentState:
-        """A Chat Agent Node!"""
+    async def adocument_retriever_node(self, state: AgentState) -> AgentState:
+        """async document retriever node"""
+        # the local Qdrant client is synchronous, so the search runs on the thread pool
+        state["retrieved_docs"] = await run_in_threadpool(
+            self.retriever.invoke, state["router_response"].user_query
+        )
+        return state
+    
+    def _count_message_tokens(self, messages: List[BaseMessage]) -> int:
+        return sum(
+            self.token_counter(str(message.content)) + self._tokens_per_message for message in messages
+        )
+
+    def _chat_history(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """The latest turns of the chat that fit in `history_max_tokens`, starting on a user message."""
+        if self.history_max_tokens is None:
+            return messages
+        history = trim_messages(
+            messages,
+            max_tokens=self.history_max_tokens,
+            token_counter=self._count_message_tokens,
+            strategy="last",
+            start_on="human",
+            allow_partial=False,
+        )
+        if not history:
+            # the last turn alone is over the budget: it is still needed to answer
+            last_human = max(
+                (i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0
+            )
+            history = messages[last_human:]
+        if len(history) < len(messages):
+            logger.debug(f"Chat history trimmed to the last {len(history)}/{len(messages)} messages")
+        return history
+
+    def _chat_agent_messages(self, state: AgentState) -> List[Any]:
+        """Formats the chat agent's prompt, with the retrieved documents as the context."""
         docs = (
-            "\n\n".join(f"Source #{i + 1}: {document.page_content}" for i, document in enumerate(state["retrieved_docs"]))
+            "\n\n".join(self.format_source(i, document) for i, document in enumerate(state["retrieved_docs"]))
             if state.get("retrieved_docs") else ""
         )
         context = '\n' + docs if docs else '[No Context Available.]'
         context_source = f" from {state['router_response'].url} {state['router_response'].url_of}"
         
         messages = ChatPromptTemplate.from_messages(
-            [chat_agent_system_prompt, *state["messages"]]
+            [chat_agent_system_prompt, *self._chat_history(state["messages"])]
         )
-        ai_msg: AIMessage = self.llm.invoke(messages.format_messages(
+        return messages.format_messages(
             context=context, context_source=context_source
-        ))
+        )
+    
+    def chat_agent_node(self, state: AgentState) -> AgentState:
+        """A Chat Agent Node!"""
+        # the response is streamed, so `stream_mode="messages"` yields it token by token;
+        # a repeated prompt is answered by the model's LLM cache in one chunk
+        full_message: AIMessageChunk = None
+        for chunk in stream_with_cache(self.llm, self._chat_agent_messages(state)):
+            full_message = chunk if full_message is None else full_message + chunk
         # return None to reset every other variable except "messages"
-        return {"messages": [ai_msg], "retrieved_docs": None, "router_response": None}
+        return {
+            "messages": [message_chunk_to_message(full_message)],
+            "retrieved_docs": None, "router_response": None
+        }
+    
+    async def achat_agent_node(self, state: AgentState) -> AgentState:
+        """Async Chat Agent Node"""
+        full_message: AIMessageChunk = None
+        async for chunk in astream_with_cache(self.llm, self._chat_agent_messages(state)):
+            full_message = chunk if full_message is None else full_message + chunk
+        return {
+            "messages": [message_chunk_to_message(full_message)],
+            "retrieved_docs": None, "router_response": None
+        }
     
     def deliver_failed_message_node(self, state: AgentState) -> AgentState:
         return {
@@ -142,10 +379,17 @@ class IntelliTubeAI(BaseAgent):
     def build_graph(self) -> StateGraph:
         graph = (
             StateGraph(state_schema=AgentState)
-            .add_node("router_agent", self.router_agent_node)
-            .add_node("chat_agent", self.chat_agent_node)
+            # every node has a sync & an async implementation, for `invoke()` & `ainvoke()`
+            .add_node("router_agent", RunnableLambda(
+                self.router_agent_node, afunc=self.arouter_agent_node
+            ))
+            .add_node("chat_agent", RunnableLambda(
+                self.chat_agent_node, afunc=self.achat_agent_node
+            ))
             .add_node("document_loader", lambda state: state)
-            .add_node("document_retriever", self.document_retriever_node)
+            .add_node("document_retriever", RunnableLambda(
+                self.document_retriever_node, afunc=self.adocument_retriever_node
+            ))
             .add_node(
                 "deliver_failed_message",
                 self.deliver_failed_message_node
@@ -162,7 +406,9 @@ class IntelliTubeAI(BaseAgent):
             )
             .add_conditional_edges(
                 source="document_loader",
-                path=self.document_loader_node,
+                path=RunnableLambda(
+                    self.document_loader_node, afunc=self.adocument_loader_node
+                ),
                 path_map={
                     "fail": "deliver_failed_message",
                     "success": "document_retriever",
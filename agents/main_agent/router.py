@@ -0,0 +1,113 @@
+import re
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing_extensions import List, Optional
+
+from intellitube.utils import extract_youtube_video_id, is_youtube_host
+from intellitube.tools.document_loader_tools import SUPPORTED_DOCUMENT_SUFFIXES
+from .states import RouterAgentResponse
+
+
+_URL_RE = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+# local paths: `~/..`, `./..`, `../..`, `/..`, `C:\..`, `dir/file.ext` and bare file names like `notes.txt`
+_PATH_RE = re.compile(
+    r"(?<![\w/.:~\\@-])("
+    r"(?:~|\.{1,2})?/[^\s<>\"'`]+"
+    r"|[A-Za-z]:\\[^\s<>\"'`]+"
+    r"|[\w.-]+(?:/[\w.-]*)+"
+    r"|[\w.-]+\.[A-Za-z0-9]{1,10}"
+    r")"
+)
+# scheme-less web addresses (e.g. `github.com/...`) can't be told apart from file paths reliably
+_BARE_DOMAIN_RE = re.compile(r"(?<![\w/.@-])(?:www\.)?[\w-]+(?:\.[\w-]+)+/\S*", re.IGNORECASE)
+_TRAILING_PUNCTUATION = ".,;:!?)]}"
+
+_DOCUMENT_EXTENSIONS = {
+    'pdf', 'txt', 'md', 'py', 'ipynb', 'json', 'yaml', 'yml', 'toml', 'csv',
+    'html', 'htm', 'xml', 'docx', 'doc', 'rst', 'ini', 'cfg', 'log', 'webarchive',
+}
+
+
+def _strip_trailing_punctuation(token: str) -> str:
+    return token.rstrip(_TRAILING_PUNCTUATION)
+
+
+def _find_urls(text: str) -> List[str]:
+    return [_strip_trailing_punctuation(M.group(0)) for M in _URL_RE.finditer(text)]
+
+
+def _find_paths(text: str) -> List[str]:
+    paths = []
+    for M in _PATH_RE.finditer(text):
+        path = _strip_trailing_punctuation(M.group(1))
+        name = path.replace("\\", "/").rstrip("/").rsplit("/", 1)[-1]
+        extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+        if "/" in path or "\\" in path:
+            # `/exit`, `and/or` like tokens are not paths, a directory or a file in it is
+            if path.startswith(("~", ".")) or path.count("/") > 1 or extension or ":" in path:
+                paths.append(path)
+        elif extension in _DOCUMENT_EXTENSIONS:
+            paths.append(path)
+    return paths
+
+
+def _is_loadable_document(path: str) -> bool:
+    """Whether `path` is an existing file `load_document()` can read: dates (`10/12/2024`), \
+    `TCP/IP` like terms & file names that are only mentioned look like paths too."""
+    try:
+        path = Path(path).expanduser()
+        return path.suffix.lower() in SUPPORTED_DOCUMENT_SUFFIXES and path.is_file()
+    except (OSError, ValueError):
+        return False
+
+
+def _classify_url(url: str) -> Optional[str]:
+    """`youtube_video` or `website`, None if it's a YouTube page that's not a video (e.g. a channel)."""
+    host = (urlsplit(url).hostname or "").lower()
+    if is_youtube_host(host):
+        return "youtube_video" if extract_youtube_video_id(url) else None
+    return "website"
+
+
+def _remove(text: str, token: str) -> str:
+    return re.sub(r"\s+", " ", text.replace(token, " ")).strip()
+
+
+def fast_route(text: str) -> Optional[RouterAgentResponse]:
+    """Deterministic router for the common cases: a message with no link, \
+    or with exactly one URL or local path.
+
+    Returns None when the message is ambiguous (several links, a scheme-less address, \
+    a non-video YouTube page, a path-like token that's not a document on disk or nothing \
+    left to ask), so the LLM router decides instead.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return None
+
+    urls = _find_urls(text)
+    # paths are searched for after removing the URLs, their paths would match too
+    text_without_urls = _URL_RE.sub(" ", text)
+    paths = _find_paths(text_without_urls)
+
+    if not urls and not paths:
+        if _BARE_DOMAIN_RE.search(text):
+            return None
+        return RouterAgentResponse(user_query=text.strip())
+
+    if len(urls) + len(paths) > 1:
+        return None
+
+    if urls:
+        url, url_of = urls[0], _classify_url(urls[0])
+        if url_of is None:
+            return None
+    else:
+        url, url_of = paths[0], "document"
+        if _BARE_DOMAIN_RE.match(url) or not _is_loadable_document(url):
+            return None
+
+    user_query = _remove(text, url)
+    if not user_query:
+        return None
+    return RouterAgentResponse(user_query=user_query, url=url, url_of=url_of)
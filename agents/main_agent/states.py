@@ -26,8 +26,16 @@ class RouterAgentResponse(BaseModel):
         "If no URL/path is provided, this should be null."
     ))
 
+# how the router handled a turn
+class RouterMetrics(BaseModel):
+    route: Literal["fast", "llm"] = Field(description=(
+        "`fast` if the rule-based router handled the turn, `llm` if it fell back to the LLM router"
+    ))
+    latency_ms: float = Field(description="Time spent routing the turn, in milliseconds")
+
 # define Chat Agent Output Schema
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     router_response: Optional[RouterAgentResponse] = None
+    router_metrics: Optional[RouterMetrics] = None
     retrieved_docs: Optional[List[Document]] = None
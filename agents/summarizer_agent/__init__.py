@@ -1,2 +1,3 @@
 from .agent import SummarizerAgent
-from .states import SummarizerAgentState, SummarizerSummaryState
\ No newline at end of file
+from .states import SummarizerAgentState, SummarizerSummaryState
+from .jobs import SummaryJob, SummaryJobQueue, get_summary_job_queue
\ No newline at end of file
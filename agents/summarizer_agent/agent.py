@@ -1,7 +1,13 @@
+import os
+import json
+import uuid
 import asyncio
+import hashlib
+from pathlib import Path
+from loguru import logger
 from typing import (
     Any, Callable, Dict, List,
-    Literal, Optional, Tuple, 
+    Literal, Optional, Tuple, Union,
 )
 
 from langchain_core.documents import Document
@@ -9,6 +15,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableConfig, RunnableSerializable
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from langchain.chains.combine_documents.reduce import (
     acollapse_docs, split_list_of_docs
@@ -18,12 +25,25 @@ from langgraph.constants import Send
 from langgraph.graph import START, END, StateGraph
 
 from intellitube.agents.base_agent import BaseAgent
+from intellitube.utils import (
+    AsyncRateLimiter, TokenCounter, canonical_source_key, retry_with_backoff, run_coroutine_sync,
+)
 from .prompts import map_prompt, reduce_prompt
 from .states import SummarizerAgentState, SummarizerSummaryState
 
 
 class SummarizerAgent(BaseAgent):
+    # summaries are cached per source, like the downloads in `test_data/cache/youtube`
+    summary_cache_dir: str = 'test_data/cache/summaries'
     max_tokens: int
+    chunk_tokens: int
+    max_retries: int
+    retry_base_delay: float
+    rate_limiter: AsyncRateLimiter
+    token_counter: TokenCounter
+    _text_splitter: RecursiveCharacterTextSplitter = None
+    # joins the small documents packed into one chunk
+    _chunk_separator: str = "\n\n"
     _map_chain: RunnableSerializable = None
     _reduce_chain: RunnableSerializable = None
 
@@ -43,28 +63,124 @@ class SummarizerAgent(BaseAgent):
             )
         return self._reduce_chain
 
+    @property
+    def text_splitter(self) -> RecursiveCharacterTextSplitter:
+        if not self._text_splitter:
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_tokens, chunk_overlap=0,
+                # the splitter measures many throwaway pieces, not worth memoizing
+                length_function=self.token_counter.count_function,
+            )
+        return self._text_splitter
+
     def __init__(self,
         llm: BaseChatModel,
-        max_tokens: int = 2048
+        max_tokens: int = 2048,
+        chunk_tokens: int = 1024,
+        max_concurrency: int = 4,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 3,
+        retry_base_delay: float = 1.0,
+        rate_limiter: Optional[AsyncRateLimiter] = None,
+        token_counter: Optional[TokenCounter] = None,
     ) -> None:
+        """
+        Args:
+            llm (BaseChatModel): the LLM that writes the summaries.
+            max_tokens (int, optional): Token budget of a reduce (collapse) step. Defaults to 2048.
+            chunk_tokens (int, optional): The inputs are split into chunks of about this many tokens, \
+                each summarized by its own map call. Defaults to 1024.
+            max_concurrency (int, optional): Max. number of LLM calls in flight. Defaults to 4.
+            requests_per_second (Optional[float], optional): Max. average rate of LLM calls, \
+                None for no limit. Defaults to None.
+            max_retries (int, optional): Retries of a failed LLM call, with exponential backoff. Defaults to 3.
+            retry_base_delay (float, optional): Max. delay (seconds) before the first retry, \
+                doubled for every next one. Defaults to 1.0.
+            rate_limiter (Optional[AsyncRateLimiter], optional): A limiter shared with other agents, \
+                overrides `max_concurrency` & `requests_per_second`. Defaults to None.
+            token_counter (Optional[TokenCounter], optional): Token counter, e.g. \
+                `TokenCounter(llm.get_num_tokens)` for exact (memoized) counts. \
+                Defaults to a local estimator (no tokenizer, no network calls).
+        """
         BaseAgent.__init__(self, llm)
         self.max_tokens = max_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.token_counter = token_counter or TokenCounter()
+        self.rate_limiter = rate_limiter or AsyncRateLimiter(
+            max_concurrency=max_concurrency,
+            requests_per_second=requests_per_second,
+        )
     
     def length_function(self, documents: List[Document]) -> int:
-        """Get number of tokens for input contents."""
-        return sum(self.llm.get_num_tokens(doc.page_content) for doc in documents)
+        """Get number of tokens for input contents.
+        With an exact tokenizer, the counts are memoized by content: the same summaries are measured
+        again on every collapse round."""
+        return self.token_counter.count_documents(documents)
+    
+    async def _limited_ainvoke(self, chain: RunnableSerializable, input: Any) -> Any:
+        """Invokes `chain` under the rate limiter, retrying with backoff if the call fails."""
+        async def call() -> Any:
+            async with self.rate_limiter:
+                return await chain.ainvoke(input)
+        return await retry_with_backoff(
+            call, max_retries=self.max_retries, base_delay=self.retry_base_delay
+        )
     
-    async def generate_summary(self, state: SummarizerSummaryState) -> Dict[str, List[str]]:
+    async def generate_summary(self, state: SummarizerSummaryState) -> Dict[str, Any]:
         """Generate summary of a document"""
-        llm_response = await self.map_chain.ainvoke(state['content'])
-        return {"summaries": [llm_response]}
+        # an unchanged chunk of an already summarized source
+        llm_response = state.get('cached_summary') or await self._limited_ainvoke(
+            self.map_chain, state['content']
+        )
+        return {
+            "summaries": [llm_response],
+            "chunk_summaries": {state['content_hash']: llm_response},
+        }
+    
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+    
+    def split_contents(self, documents: List[Union[str, Document]]) -> List[str]:
+        """Splits the documents into chunks of about `chunk_tokens` tokens,
+        so a long transcript is summarized by many parallel map calls instead of a single one.
+        Adjacent small documents (e.g. 128-token transcript chunks) are packed together up to
+        `chunk_tokens`, so they don't cost a map call each."""
+        count = self.token_counter.count_function
+        separator_tokens = count(self._chunk_separator)
+
+        chunks: List[str] = []
+        pieces: List[str] = []
+        n_tokens = 0
+        for document in documents:
+            for piece in self.text_splitter.split_text(
+                document.page_content if isinstance(document, Document) else document
+            ):
+                piece_tokens = count(piece)
+                if pieces and n_tokens + separator_tokens + piece_tokens > self.chunk_tokens:
+                    chunks.append(self._chunk_separator.join(pieces))
+                    pieces, n_tokens = [], 0
+                n_tokens += piece_tokens + (separator_tokens if pieces else 0)
+                pieces.append(piece)
+        if pieces:
+            chunks.append(self._chunk_separator.join(pieces))
+        return chunks
     
     def map_summaries(self, state: SummarizerAgentState) -> List[Send]:
-        """Maps the summary of the given documents"""
-        return [
-            Send("generate_summary", {"content": content})
-            for content in state["documents"]
-        ]
+        """Maps the summary of the given documents, already split by `_prepare_state()`: \
+        each chunk is summarized as it is, so its hash matches the cached summaries' keys"""
+        cached_summaries = state.get("cached_summaries") or {}
+        sends = []
+        for content in state["documents"]:
+            content_hash = self.content_hash(content)
+            sends.append(Send("generate_summary", {
+                "content": content,
+                "content_hash": content_hash,
+                "cached_summary": cached_summaries.get(content_hash),
+            }))
+        return sends
     
     def collect_summaries(self, state: SummarizerAgentState) -> Dict[str, List[Document]]:
         """Collects the summaries of the mapped-documents"""
@@ -80,12 +196,15 @@ class SummarizerAgent(BaseAgent):
         doc_lists = split_list_of_docs(
             state["collapsed_summaries"], self.length_function, self.max_tokens
         )
-        results = []
-        for doc_list in doc_lists:
-            results.append(
-                await acollapse_docs(doc_list, self.reduce_chain.invoke)
-            )
-        return {"collapsed_summaries": results}
+        # the groups of a round are reduced concurrently (under the same limiter as the map phase),
+        # so a round costs about one LLM call's latency and the rounds shrink the summaries geometrically
+        async def reduce(documents: List[Document], **kwargs: Any) -> str:
+            return await self._limited_ainvoke(self.reduce_chain, documents)
+        
+        results = await asyncio.gather(*(
+            acollapse_docs(doc_list, reduce) for doc_list in doc_lists
+        ))
+        return {"collapsed_summaries": list(results)}
     
     def should_collapse(self,
         state: SummarizerAgentState
@@ -98,7 +217,7 @@ class SummarizerAgent(BaseAgent):
         )
     
     async def generate_final_summary(self, state: SummarizerAgentState) -> Dict[str, Any]:
-        llm_response = await self.reduce_chain.ainvoke(state["collapsed_summaries"])
+        llm_response = await self._limited_ainvoke(self.reduce_chain, state["collapsed_summaries"])
         return {"final_summary": llm_response}
     
     def build_graph(self) -> StateGraph:
@@ -120,39 +239,130 @@ class SummarizerAgent(BaseAgent):
         super().build_graph()
         return graph
     
+    def _summary_cache_path(self, source: str) -> Path:
+        """Keyed like the vector store's sources: every URL of a YouTube video shares its summaries. \
+        The file is named by a hash of the whole key, so e.g. `doc.txt` & `doc.pdf` don't collide."""
+        key_hash = hashlib.sha256(canonical_source_key(source).encode()).hexdigest()
+        return Path(self.summary_cache_dir) / f"{key_hash}.json"
+    
+    def _load_summary_cache(self, source: str) -> Dict[str, Any]:
+        try:
+            return json.loads(self._summary_cache_path(source).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"Ignoring a corrupt summary cache entry of: {source}")
+            return {}
+    
+    def _model_id(self) -> str:
+        """Summaries of another model are not reused."""
+        name = getattr(self.llm, 'model_name', None) or getattr(self.llm, 'model', None) or ''
+        return f"{type(self.llm).__name__}:{name}"
+    
+    def _prepare_state(self,
+        documents: List[Union[str, Document]],
+        source: Optional[str],
+    ) -> Tuple[SummarizerAgentState, Optional[str]]:
+        """Initial state of a run, with the cached map summaries of `source`. \
+        Also returns the cached final summary, if the source has not changed since."""
+        chunks = self.split_contents(documents)
+        state = SummarizerAgentState(documents=chunks)
+        if not source:
+            return state, None
+        
+        entry = self._load_summary_cache(source)
+        if not entry or entry.get("model") != self._model_id() or entry.get("chunk_tokens") != self.chunk_tokens:
+            return state, None
+        
+        state["cached_summaries"] = entry.get("map_summaries", {})
+        combined_hash = self.content_hash("".join(self.content_hash(chunk) for chunk in chunks))
+        if entry.get("content_hash") == combined_hash and entry.get("final_summary"):
+            logger.info(f"Using the cached summary of: {source}")
+            return state, entry["final_summary"]
+        
+        n_cached = sum(self.content_hash(chunk) in state["cached_summaries"] for chunk in chunks)
+        logger.info(f"Source changed, re-summarizing {len(chunks) - n_cached}/{len(chunks)} chunks of: {source}")
+        return state, None
+    
+    def _cached_result(self, state: SummarizerAgentState, final_summary: str) -> SummarizerAgentState:
+        return SummarizerAgentState(
+            **state,
+            summaries=[state["cached_summaries"].get(self.content_hash(chunk)) for chunk in state["documents"]],
+            chunk_summaries=state["cached_summaries"],
+            final_summary=final_summary,
+        )
+    
+    def _save_summary_cache(self, source: Optional[str], state: SummarizerAgentState) -> None:
+        if not source or not state.get("final_summary"):
+            return
+        chunk_hashes = [self.content_hash(chunk) for chunk in state["documents"]]
+        chunk_summaries = state.get("chunk_summaries") or {}
+        entry = {
+            "source": source,
+            "source_key": canonical_source_key(source),
+            "model": self._model_id(),
+            "chunk_tokens": self.chunk_tokens,
+            "content_hash": self.content_hash("".join(chunk_hashes)),
+            # only the chunks of the current version are kept
+            "map_summaries": {h: chunk_summaries[h] for h in chunk_hashes if h in chunk_summaries},
+            "final_summary": state["final_summary"],
+        }
+        # written atomically: a crash mid-write never leaves a corrupt entry
+        filepath = self._summary_cache_path(source)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        temp_filepath = filepath.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        temp_filepath.write_text(json.dumps(entry, indent=2), encoding='utf-8')
+        os.replace(temp_filepath, filepath)
+    
     async def asummarize(self,
         documents: List[Document],
         config: Optional[RunnableConfig] = None,
+        source: Optional[str] = None,
         **kwargs
     ) -> SummarizerAgentState:
-        """Asynchronous method to summarize the given list of documents together."""
-        state = SummarizerAgentState(documents=documents)
+        """Asynchronous method to summarize the given list of documents together.
+        With a `source` (e.g. the video URL), the summaries are cached: a repeated request returns \
+        instantly, and only the changed chunks of a changed source are summarized again."""
+        state, final_summary = self._prepare_state(documents, source)
+        if final_summary:
+            return self._cached_result(state, final_summary)
+        
         state = await self.agent.ainvoke(
             input=state,
             config=config or {"recursion_limit": 30},
             **kwargs
         )
+        self._save_summary_cache(source, state)
         return state
     
     def summarize(self,
         documents: List[Document],
         config: Optional[RunnableConfig] = None,
+        source: Optional[str] = None,
         **kwargs
     ) -> SummarizerAgentState:
         """Synchronous method to summarize the given list of documents together."""
-        return asyncio.run(self.asummarize(
-            documents, config, **kwargs
+        return run_coroutine_sync(self.asummarize(
+            documents, config, source, **kwargs
         ))
     
     async def stream_asummarize(self,
         documents: List[Document],
         config: Optional[RunnableConfig] = None,
         stream_updater_callback: Optional[Callable] = None,
+        source: Optional[str] = None,
+        start_callback: Optional[Callable[[SummarizerAgentState], None]] = None,
         **kwargs
     ) -> Tuple[List[Dict[str, Any]], SummarizerAgentState]:
-        """Asynchronous method to summarize the given list of documents together."""
+        """Asynchronous method to summarize the given list of documents together.
+        Cached per `source`, see `asummarize()`. `start_callback` is called with the initial \
+        state (e.g. the number of chunks to summarize) before the graph runs."""
         steps = []
-        state = SummarizerAgentState(documents=documents)
+        state, final_summary = self._prepare_state(documents, source)
+        if callable(start_callback):
+            start_callback(state)
+        if final_summary:
+            return steps, self._cached_result(state, final_summary)
         
         async for step in self.agent.astream(
             input=state,
@@ -167,18 +377,26 @@ class SummarizerAgent(BaseAgent):
                 for _dict in list(step.values())
                 for k, v in _dict.items()
             }
-            state = SummarizerAgentState(**state, **results)
+            # every map step adds to "summaries" & "chunk_summaries" (see their reducers), the rest are overwritten
+            if "summaries" in results:
+                results["summaries"] = state.get("summaries", []) + results["summaries"]
+            if "chunk_summaries" in results:
+                results["chunk_summaries"] = {**state.get("chunk_summaries", {}), **results["chunk_summaries"]}
+            state = SummarizerAgentState(**{**state, **results})
             steps.append(step)
-            
+        
+        self._save_summary_cache(source, state)
         return steps, state
     
     def stream_summarize(self,
         documents: List[Document],
         config: Optional[RunnableConfig] = None,
         stream_updater_callback: Optional[Callable] = None,
+        source: Optional[str] = None,
+        start_callback: Optional[Callable[[SummarizerAgentState], None]] = None,
         **kwargs
     ) -> Tuple[List[Dict[str, Any]], SummarizerAgentState]:
         """Synchronous method to summarize the given list of documents together."""
-        return asyncio.run(self.stream_asummarize(
-            documents, config, stream_updater_callback, **kwargs
+        return run_coroutine_sync(self.stream_asummarize(
+            documents, config, stream_updater_callback, source, start_callback, **kwargs
         ))
@@ -0,0 +1,298 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from loguru import logger
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+
+from intellitube.utils import get_background_loop, run_coroutine_sync, run_in_threadpool
+from .agent import SummarizerAgent
+from .states import SummarizerAgentState
+
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class SummaryJob(BaseModel):
+    job_id: str
+    source: Optional[str] = None
+    chat_id: Optional[str] = None
+    status: JobStatus = "queued"
+    stage: Optional[str] = None
+    """The last graph node that finished, e.g. `generate_summary`, `collapse_summaries`"""
+    chunks_done: int = 0
+    chunks_total: int = 0
+    summary: Optional[str] = None
+    error: Optional[str] = None
+    created_timestamp: float
+    updated_timestamp: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def progress(self) -> float:
+        """0.0 to 1.0, the map phase counts as 90% of the work."""
+        if self.status == "done":
+            return 1.0
+        if not self.chunks_total:
+            return 0.0
+        return 0.9 * self.chunks_done / self.chunks_total
+
+
+class SummaryJobQueue:
+    """Local queue of summarization jobs, run in the background by a pool of workers.
+
+    The jobs are persisted in SQLite, so the queued (and interrupted) ones are resumed \
+    after a restart. The workers are coroutines on the process-wide background loop (see \
+    `get_background_loop()`, the LLM's async clients are bound to it) running \
+    `SummarizerAgent.stream_asummarize()`; its `stream_updater_callback` updates the job's \
+    progress, and calls the callbacks given to `submit()`. The SQLite writes run on the \
+    shared thread pool, never on the loop.
+    """
+    _default_db_path: Path = Path("test_data/summary_jobs/jobs.sqlite3")
+
+    @property
+    def summarizer(self) -> SummarizerAgent:
+        return self._summarizer
+
+    def __init__(self,
+        summarizer: SummarizerAgent,
+        db_path: Optional[Union[Path, str]] = None,
+        num_workers: int = 2,
+    ) -> None:
+        """
+        Args:
+            summarizer (SummarizerAgent): the agent that runs the jobs.
+            db_path (Optional[Union[Path, str]], optional): SQLite file of the job state. \
+                Defaults to `test_data/summary_jobs/jobs.sqlite3`.
+            num_workers (int, optional): Number of jobs run at the same time. Defaults to 2. \
+                The LLM calls of all the jobs are still bounded by the summarizer's rate limiter.
+        """
+        self._summarizer = summarizer
+        self._num_workers = num_workers
+        self._callbacks: Dict[str, List[Callable[[SummaryJob, Dict[str, Any]], None]]] = {}
+        self._lock = threading.Lock()
+
+        db_path = Path(db_path or self._default_db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, source TEXT, chat_id TEXT, status TEXT NOT NULL, "
+            "stage TEXT, chunks_done INTEGER NOT NULL DEFAULT 0, chunks_total INTEGER NOT NULL DEFAULT 0, "
+            "summary TEXT, error TEXT, documents TEXT NOT NULL, "
+            "created_timestamp REAL NOT NULL, updated_timestamp REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_chat_id ON jobs (chat_id)")
+        self._db.commit()
+
+        # the workers run on the background loop, so submitting never blocks the chat turn
+        self._loop = get_background_loop()
+        self._workers: List[asyncio.Task] = []
+        self._queue: asyncio.Queue = run_coroutine_sync(self._start_workers())
+
+        # resume the jobs that were queued or running when the process stopped
+        for job_id, in self._db.execute(
+            "SELECT job_id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_timestamp"
+        ).fetchall():
+            logger.info(f"Resuming summary job: {job_id}")
+            self._enqueue(job_id)
+
+    # ========== WORKERS ==========
+
+    async def _start_workers(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        # the loop only keeps weak references to its tasks
+        self._workers = [asyncio.create_task(self._worker(queue)) for _ in range(self._num_workers)]
+        return queue
+
+    def _enqueue(self, job_id: str) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"Summary job {job_id} failed: {e!r}")
+                job = await run_in_threadpool(self._update, job_id, status="failed", error=str(e))
+                self._notify(job, {})
+            finally:
+                queue.task_done()
+
+    def _load_documents(self, job_id: str) -> Tuple[Optional[str], List[str]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT source, documents FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return row[0], json.loads(row[1])
+
+    async def _run_job(self, job_id: str) -> None:
+        source, documents = await run_in_threadpool(self._load_documents, job_id)
+        job = await run_in_threadpool(self._update, job_id, status="running", chunks_done=0)
+
+        # the progress is kept in memory and written by one writer at a time, the graph
+        # steps never wait for SQLite and a slow write only coalesces the next ones
+        latest: Optional[SummaryJob] = None
+        writer: Optional[asyncio.Task] = None
+
+        async def write_progress() -> None:
+            nonlocal latest
+            while latest is not None:
+                progress, latest = latest, None
+                await run_in_threadpool(self._save_progress, progress)
+
+        def set_progress(step: Dict[str, Any], **fields: Any) -> None:
+            nonlocal job, latest, writer
+            job = latest = job.model_copy(update={**fields, "updated_timestamp": time.time()})
+            if writer is None or writer.done():
+                writer = asyncio.ensure_future(write_progress())
+            self._notify(job, step)
+
+        def start_callback(state: SummarizerAgentState) -> None:
+            set_progress({}, chunks_total=len(state["documents"]))
+
+        def stream_updater_callback(step: Dict[str, Any]) -> None:
+            set_progress(
+                step, stage=next(iter(step), None),
+                chunks_done=job.chunks_done + ("generate_summary" in step),
+            )
+
+        _, state = await self.summarizer.stream_asummarize(
+            documents=documents,
+            stream_updater_callback=stream_updater_callback,
+            source=source,
+            start_callback=start_callback,
+        )
+        if writer is not None:
+            await writer
+        job = await run_in_threadpool(
+            self._update, job_id, status="done", stage=job.stage,
+            chunks_done=job.chunks_total, chunks_total=job.chunks_total, summary=state.get("final_summary"),
+        )
+        self._notify(job, {})
+        logger.info(f"Summary job done: {job_id} ({source})")
+
+    def _notify(self, job: SummaryJob, step: Dict[str, Any]) -> None:
+        for callback in self._callbacks.get(job.job_id, []):
+            try:
+                callback(job, step)
+            except Exception as e:
+                logger.error(f"Summary job callback failed: {e!r}")
+        if job.finished:
+            self._callbacks.pop(job.job_id, None)
+
+    # ========== JOB STATE ==========
+
+    def _update(self, job_id: str, **fields: Any) -> SummaryJob:
+        fields["updated_timestamp"] = time.time()
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def _save_progress(self, job: SummaryJob) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, chunks_done = ?, chunks_total = ?, updated_timestamp = ? "
+                "WHERE job_id = ?",
+                (job.stage, job.chunks_done, job.chunks_total, job.updated_timestamp, job.job_id)
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[SummaryJob]:
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT job_id, source, chat_id, status, stage, chunks_done, chunks_total, "
+                "summary, error, created_timestamp, updated_timestamp FROM jobs WHERE job_id = ?",
+                (job_id,)
+            )
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        return SummaryJob(**dict(zip(columns, row))) if row else None
+
+    def jobs_of_chat(self, chat_id: str) -> List[SummaryJob]:
+        with self._lock:
+            job_ids = [row[0] for row in self._db.execute(
+                "SELECT job_id FROM jobs WHERE chat_id = ? ORDER BY created_timestamp", (chat_id,)
+            )]
+        return [self.get(job_id) for job_id in job_ids]
+
+    def submit(self,
+        documents: List[Union[str, Document]],
+        source: Optional[str] = None,
+        chat_id: Optional[str] = None,
+        callback: Optional[Callable[[SummaryJob, Dict[str, Any]], None]] = None,
+    ) -> str:
+        """Queues a summarization job and returns its id at once.
+
+        Args:
+            documents (List[Union[str, Document]]): the contents to summarize together.
+            source (Optional[str], optional): The documents' source, e.g. the video URL. \
+                Its summaries are cached (see `SummarizerAgent.asummarize()`). Defaults to None.
+            chat_id (Optional[str], optional): The chat that requested it. Defaults to None.
+            callback (Optional[Callable], optional): Called with the job & the graph step \
+                on every progress update, on the background loop: it must not block. Defaults to None.
+        """
+        job_id = str(uuid.uuid4())
+        contents = [doc.page_content if isinstance(doc, Document) else doc for doc in documents]
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, source, chat_id, status, documents, created_timestamp, updated_timestamp) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, source, chat_id, json.dumps(contents), now, now)
+            )
+            self._db.commit()
+            if callback:
+                self._callbacks.setdefault(job_id, []).append(callback)
+
+        logger.info(f"Summary job queued: {job_id} ({source})")
+        self._enqueue(job_id)
+        return job_id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.2) -> SummaryJob:
+        """Blocks until the job is finished (or `timeout` seconds passed), returns its latest state."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and not job.finished and (deadline is None or time.monotonic() < deadline):
+            time.sleep(poll_interval)
+            job = self.get(job_id)
+        return job
+
+
+_summary_job_queue: Optional[SummaryJobQueue] = None
+_summary_job_queue_lock = threading.Lock()
+
+
+def get_summary_job_queue(
+    llm: Optional[BaseChatModel] = None,
+    db_path: Optional[Union[Path, str]] = None,
+    num_workers: int = 2,
+    summarizer: Optional[SummarizerAgent] = None,
+) -> SummaryJobQueue:
+    """Returns the process-wide job queue. It's created on the first call, with `summarizer` \
+    or a `SummarizerAgent` of `llm` built then; the later calls don't build anything."""
+    global _summary_job_queue
+    with _summary_job_queue_lock:
+        if _summary_job_queue is None:
+            if summarizer is None:
+                if llm is None:
+                    raise ValueError("An `llm` or a `summarizer` is required to create the summary job queue.")
+                summarizer = SummarizerAgent(llm=llm)
+            _summary_job_queue = SummaryJobQueue(summarizer, db_path, num_workers)
+    return _summary_job_queue
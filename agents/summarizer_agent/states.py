@@ -1,6 +1,6 @@
 import operator
 from langchain_core.documents import Document
-from typing_extensions import Annotated, List, TypedDict
+from typing_extensions import Annotated, Dict, List, Optional, TypedDict
 
 class SummarizerAgentState(TypedDict):
     """Overall State of the Agent"""
@@ -8,7 +8,13 @@ class SummarizerAgentState(TypedDict):
     summaries: Annotated[list, operator.add]
     collapsed_summaries: List[Document]
     final_summary: str
+    # map summaries of the source's previous version, by chunk hash (input)
+    cached_summaries: Dict[str, str]
+    # map summaries of this run, by chunk hash (output)
+    chunk_summaries: Annotated[Dict[str, str], operator.or_]
 
 class SummarizerSummaryState(TypedDict):
     """Map node's state"""
     content: str
+    content_hash: str
+    cached_summary: Optional[str]
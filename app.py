@@ -6,9 +6,10 @@ from intellitube.vector_store import VectorStoreManager
 
 from intellitube.ui.streamlit_ui import StreamlitUI
 from intellitube.agents.main_agent import IntelliTubeAI
+from intellitube.agents.summarizer_agent import get_summary_job_queue
 
 
-def init_function() -> Union[ChatManager, IntelliTubeAI]:
+def init_function(auto_summarize: bool = False) -> Union[ChatManager, IntelliTubeAI]:
     # initialize an llm
     llm = init_llm(model_provider='google')
     
@@ -22,10 +23,15 @@ def init_function() -> Union[ChatManager, IntelliTubeAI]:
         collection_name=chatman.chat_id,
     )
 
+    # opt-in: summaries of the loaded sources are made in the background
+    summary_job_queue = get_summary_job_queue(llm) if auto_summarize else None
+
     # initialize the agent
     ai_agent = IntelliTubeAI(
         llm=llm, chat_manager=chatman,
         vector_store_manager=vsman,
+        summary_job_queue=summary_job_queue,
+        auto_summarize=auto_summarize,
     )
 
     # ai_agent.cli_chat_loop()
@@ -0,0 +1,322 @@
+import sqlite3
+import hashlib
+import threading
+from array import array
+from pathlib import Path
+from loguru import logger
+from collections import OrderedDict
+from typing_extensions import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCacheStats(BaseModel):
+    hits: int = 0
+    """Embeddings found in the in-memory LRU"""
+    disk_hits: int = 0
+    """Embeddings found in the on-disk store"""
+    misses: int = 0
+    """Embeddings that had to be computed by the embedding model"""
+    batches: int = 0
+    """Number of calls made to the embedding model"""
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an `Embeddings` object with a content-hash keyed cache.
+
+    Lookups go through a size-bounded in-memory LRU first, then an SQLite store on disk, \
+    so a chunk is embedded only once, no matter how many chats (or processes) load it. \
+    The misses are sent to the wrapped model in fixed-size `embed_documents` batches.
+    """
+    _default_cache_path: Path = Path("test_data/cache/embeddings/embeddings.sqlite3")
+    # max. number of host parameters in a single SQLite statement
+    _sqlite_max_variables: int = 500
+
+    @property
+    def embedding_model(self) -> Embeddings:
+        return self._embedding_model
+
+    @property
+    def namespace(self) -> str:
+        return self._namespace
+
+    @property
+    def stats(self) -> EmbeddingCacheStats:
+        return self._stats
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        """Vector size of the model, known once any vector was cached (in any process)."""
+        return self._dimension
+
+    def __init__(self,
+        embedding_model: Embeddings,
+        cache_path: Optional[Union[Path, str]] = None,
+        namespace: Optional[str] = None,
+        max_entries: int = 10_000,
+        batch_size: int = 64,
+    ) -> None:
+        """
+        Args:
+            embedding_model (Embeddings): the embedding model to wrap.
+            cache_path (Optional[Union[Path, str]], optional): SQLite file of the on-disk store. \
+                Defaults to `test_data/cache/embeddings/embeddings.sqlite3`.
+            namespace (Optional[str], optional): Keeps the vectors of different models apart. \
+                Defaults to the model's provider class, name & output dimension (see `default_namespace()`).
+            max_entries (int, optional): Size of the in-memory LRU. Defaults to 10_000.
+            batch_size (int, optional): Number of texts per `embed_documents` call. Defaults to 64.
+        """
+        self._embedding_model = embedding_model
+        self._namespace = namespace or self.default_namespace(embedding_model)
+        self._max_entries = max_entries
+        self._batch_size = batch_size
+
+        self._stats = EmbeddingCacheStats()
+        self._lru: OrderedDict[bytes, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        cache_path = Path(cache_path or self._default_cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # the vectors are stored as float64, so a cached vector is bit-identical to the computed one
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dimensions (namespace TEXT PRIMARY KEY, size INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+        row = self._db.execute(
+            "SELECT size FROM dimensions WHERE namespace = ?", (self._namespace,)
+        ).fetchone()
+        self._dimension: Optional[int] = row[0] if row else None
+
+    @staticmethod
+    def model_name(embedding_model: Embeddings) -> str:
+        """Best-effort name of an embedding model, e.g. `sentence-transformers/all-MiniLM-L12-v2`."""
+        for attr in ('model_name', 'model', 'model_id'):
+            name = getattr(embedding_model, attr, None)
+            if isinstance(name, str) and name:
+                return name
+        return type(embedding_model).__name__
+
+    @staticmethod
+    def default_namespace(embedding_model: Embeddings) -> str:
+        """The provider class, name & configured output dimension of a model, \
+        e.g. `langchain_openai.embeddings.base.OpenAIEmbeddings:text-embedding-3-small:256`: \
+        the same model with another `dimensions` setting or provider gives other vectors."""
+        provider = f"{type(embedding_model).__module__}.{type(embedding_model).__qualname__}"
+        dimension = _dimension_from_config(embedding_model)
+        return f"{provider}:{CachedEmbeddings.model_name(embedding_model)}:{dimension or 'default'}"
+
+    def _key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{self._namespace}\0{kind}\0{text}".encode()).digest()
+
+    def _lru_get(self, key: bytes) -> Optional[List[float]]:
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+        return vector
+
+    def _lru_put(self, key: bytes, vector: List[float]) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        if len(self._lru) > self._max_entries:
+            self._lru.popitem(last=False)
+
+    def _load_from_disk(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        found: Dict[bytes, List[float]] = {}
+        for i in range(0, len(keys), self._sqlite_max_variables):
+            batch = keys[i : i + self._sqlite_max_variables]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for key, blob in rows:
+                found[key] = array('d', blob).tolist()
+        return found
+
+    def _save_to_disk(self, items: Dict[bytes, List[float]]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            ((key, array('d', vector).tobytes()) for key, vector in items.items())
+        )
+        self._db.commit()
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Returns the cached vectors of `keys`; the missing ones are left out."""
+        found: Dict[bytes, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru_get(key)
+                if vector is not None:
+                    found[key] = vector
+            self._stats.hits += len(found)
+
+            on_disk = self._load_from_disk([key for key in keys if key not in found])
+            for key, vector in on_disk.items():
+                self._lru_put(key, vector)
+            self._stats.disk_hits += len(on_disk)
+
+        found.update(on_disk)
+        return found
+
+    def _store(self, items: Dict[bytes, List[float]]) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._lru_put(key, vector)
+            self._save_to_disk(items)
+
+            if self._dimension is None and items:
+                self._dimension = len(next(iter(items.values())))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO dimensions (namespace, size) VALUES (?, ?)",
+                    (self._namespace, self._dimension)
+                )
+                self._db.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key('document', text) for text in texts]
+        vectors = self._lookup(list(dict.fromkeys(keys)))
+
+        # embed every missing text once, even if it's repeated in `texts`
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        missing_keys = list(missing.keys())
+
+        for i in range(0, len(missing_keys), self._batch_size):
+            batch = missing_keys[i : i + self._batch_size]
+            embedded = dict(zip(
+                batch, self.embedding_model.embed_documents([missing[key] for key in batch])
+            ))
+            self._store(embedded)
+            vectors.update(embedded)
+
+            with self._lock:
+                self._stats.misses += len(batch)
+                self._stats.batches += 1
+
+        if missing:
+            logger.debug(
+                f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits, "
+                f"{len(missing)} texts embedded."
+            )
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key('query', text)
+        vector = self._lookup([key]).get(key)
+
+        if vector is None:
+            vector = self.embedding_model.embed_query(text)
+            self._store({key: vector})
+            with self._lock:
+                self._stats.misses += 1
+                self._stats.batches += 1
+        return vector
+
+
+# ========== PROCESS-WIDE MODEL REGISTRY ==========
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L12-v2'
+
+_registry_lock = threading.Lock()
+_load_locks: Dict[str, threading.Lock] = {}
+_embedding_models: Dict[str, Embeddings] = {}
+_embedding_dimensions: Dict[str, int] = {}
+_cached_embeddings: Dict[Tuple[int, str], Tuple[Embeddings, CachedEmbeddings]] = {}
+
+
+def load_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Embeddings:
+    """Loads a HuggingFace embedding model once per process and shares it across
+    all sessions & threads. Concurrent callers wait for the first load to finish."""
+    model = _embedding_models.get(model_name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        load_lock = _load_locks.setdefault(model_name, threading.Lock())
+
+    # only the callers of the same model wait for each other
+    with load_lock:
+        model = _embedding_models.get(model_name)
+        if model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            logger.debug(f"Loading embedding model: {model_name}")
+            model = HuggingFaceEmbeddings(model=model_name)
+            _embedding_models[model_name] = model
+    return model
+
+
+def get_cached_embeddings(
+    embedding_model: Embeddings,
+    cache_path: Optional[Union[Path, str]] = None,
+) -> CachedEmbeddings:
+    """Returns the process-wide `CachedEmbeddings` of `embedding_model`, so that
+    all the sessions using the same model share one in-memory LRU & database connection."""
+    if isinstance(embedding_model, CachedEmbeddings):
+        return embedding_model
+
+    key = (id(embedding_model), str(cache_path or ''))
+    with _registry_lock:
+        # the model is kept in the value too, so its `id()` can't be reused
+        _, cached = _cached_embeddings.get(key, (None, None))
+        if cached is None:
+            cached = CachedEmbeddings(embedding_model, cache_path=cache_path)
+            _cached_embeddings[key] = (embedding_model, cached)
+    return cached
+
+
+def _dimension_from_config(embedding_model: Embeddings) -> Optional[int]:
+    """Reads the vector size from the model's configuration, without embedding anything."""
+    # sentence-transformers models (e.g. `HuggingFaceEmbeddings`)
+    client = getattr(embedding_model, '_client', None)
+    if hasattr(client, 'get_sentence_embedding_dimension'):
+        size = client.get_sentence_embedding_dimension()
+        if size:
+            return size
+
+    # e.g. `OpenAIEmbeddings(dimensions=...)`, `FakeEmbeddings(size=...)`
+    for attr in ('dimensions', 'dimension', 'size'):
+        size = getattr(embedding_model, attr, None)
+        if isinstance(size, int) and size > 0:
+            return size
+    return None
+
+
+def get_embedding_dimension(embedding_model: Embeddings) -> int:
+    """Returns the vector size of `embedding_model`, resolved once per model.
+
+    It's read from the model's config or from the embedding cache if possible. \
+    Only if neither knows it, a single probe query is embedded (and cached).
+    """
+    if isinstance(embedding_model, CachedEmbeddings):
+        name = embedding_model.namespace
+        base_model = embedding_model.embedding_model
+    else:
+        name = CachedEmbeddings.default_namespace(embedding_model)
+        base_model = embedding_model
+
+    size = _embedding_dimensions.get(name)
+    if size:
+        return size
+
+    size = (
+        (isinstance(embedding_model, CachedEmbeddings) and embedding_model.dimension)
+        or _dimension_from_config(base_model)
+    )
+    if not size:
+        logger.debug(f"Probing the vector size of: {name}")
+        size = len(embedding_model.embed_query("hehe"))
+
+    _embedding_dimensions[name] = size
+    return size
@@ -1,7 +1,10 @@
-from typing import Literal, Optional
+from pathlib import Path
+from typing import Literal, Optional, Union
 from langchain.chat_models import init_chat_model as __init_chat_model
 from langchain_core.language_models import BaseChatModel
 
+from intellitube.llm_cache import get_llm_cache
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -26,8 +29,16 @@ def init_llm(
     model_name: Optional[str] = None,
     temperature: float = 0.0,
     api_key: Optional[str] = None,
+    use_cache: bool = True,
+    cache_path: Optional[Union[Path, str]] = None,
+    cache_ttl: Optional[float] = 7 * 24 * 3600,
     **kwargs
 ) -> BaseChatModel:
+    """Initializes a chat model of the given provider.
+
+    With `use_cache`, the responses are kept in the process-wide, disk-backed `SQLiteLLMCache` \
+    (see `intellitube.llm_cache`), so identical prompts to the same model & parameters are not re-sent.
+    """
     global DEFAULT_MODELS, MODEL_PROVIDERS
     
     params = {
@@ -39,4 +50,7 @@ def init_llm(
     if api_key:
         params["api_key"] = api_key
 
+    if use_cache and "cache" not in kwargs:
+        params["cache"] = get_llm_cache(cache_path, ttl=cache_ttl)
+
     return __init_chat_model(**params, **kwargs)
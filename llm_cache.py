@@ -0,0 +1,305 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from loguru import logger
+from typing_extensions import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from pydantic import BaseModel
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import ChatGeneration
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, BaseMessageChunk
+from langchain_core.messages.utils import message_chunk_to_message
+
+from intellitube.utils import estimate_num_tokens
+
+
+class LLMCacheStats(BaseModel):
+    hits: int = 0
+    """Responses served from the cache"""
+    misses: int = 0
+    """Responses that had to be generated by the LLM"""
+    saved_tokens: int = 0
+    """Tokens (prompt + completion) of the LLM calls the cache answered"""
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits}/{self.hits + self.misses} hits ({self.hit_rate:.1%}), "
+            f"{self.saved_tokens} tokens saved"
+        )
+
+
+class SQLiteLLMCache(BaseCache):
+    """Disk-backed LLM response cache with a time-to-live.
+
+    Entries are keyed by the model & its parameters (LangChain's `llm_string`) and the prompt. \
+    The message ids are left out of the key, they differ on every turn for the same prompt. \
+    Expired entries are never returned and get evicted on the next write.
+    """
+    _default_cache_path: Path = Path("test_data/cache/llm/llm_responses.sqlite3")
+    # expired entries are purged at most this often (seconds)
+    _eviction_interval: float = 60.0
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self._ttl
+
+    @property
+    def stats(self) -> LLMCacheStats:
+        return self._stats
+
+    def __init__(self,
+        cache_path: Optional[Union[Path, str]] = None,
+        ttl: Optional[float] = 7 * 24 * 3600,
+    ) -> None:
+        """
+        Args:
+            cache_path (Optional[Union[Path, str]], optional): SQLite file of the cache. \
+                Defaults to `test_data/cache/llm/llm_responses.sqlite3`.
+            ttl (Optional[float], optional): Seconds an entry stays valid, None to keep it forever. \
+                Defaults to 7 days.
+        """
+        self._ttl = ttl
+        self._stats = LLMCacheStats()
+        self._scoped_stats: Dict[str, LLMCacheStats] = {}
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+
+        cache_path = Path(cache_path or self._default_cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key BLOB PRIMARY KEY, response TEXT NOT NULL, tokens INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _strip_message_ids(value: Any) -> Any:
+        if isinstance(value, dict):
+            kwargs = value.get("kwargs")
+            if isinstance(kwargs, dict) and "id" in kwargs:
+                value = {**value, "kwargs": {k: v for k, v in kwargs.items() if k != "id"}}
+            return {k: SQLiteLLMCache._strip_message_ids(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [SQLiteLLMCache._strip_message_ids(v) for v in value]
+        return value
+
+    def _key(self, prompt: str, llm_string: str) -> bytes:
+        try:
+            prompt = json.dumps(self._strip_message_ids(json.loads(prompt)), sort_keys=True)
+        except ValueError:
+            pass    # a plain string prompt
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode()).digest()
+
+    @staticmethod
+    def _count_tokens(prompt: str, return_val: RETURN_VAL_TYPE) -> int:
+        """Tokens of the call, from the provider's usage report if there is one."""
+        for generation in return_val:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage and usage.get("total_tokens"):
+                return usage["total_tokens"]
+        return estimate_num_tokens(prompt) + sum(
+            estimate_num_tokens(generation.text) for generation in return_val
+        )
+
+    def _record(self, scope: Optional[str], hit: bool, tokens: int = 0) -> None:
+        with self._lock:
+            stats_list = [self._stats]
+            if scope:
+                stats_list.append(self._scoped_stats.setdefault(scope, LLMCacheStats()))
+            for stats in stats_list:
+                if hit:
+                    stats.hits += 1
+                    stats.saved_tokens += tokens
+                else:
+                    stats.misses += 1
+
+    def scoped_stats(self) -> Dict[str, LLMCacheStats]:
+        """The stats of every scope (e.g. per agent), see `scoped()`."""
+        return dict(self._scoped_stats)
+
+    def scoped(self, scope: str) -> "ScopedLLMCache":
+        """A view of this cache that also counts its hits & misses under `scope`."""
+        return ScopedLLMCache(self, scope)
+
+    def _lookup(self, prompt: str, llm_string: str, scope: Optional[str] = None) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, tokens, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None or (self._ttl is not None and time.time() - row[2] > self._ttl):
+            self._record(scope, hit=False)
+            return None
+
+        try:
+            response = loads(row[0])
+        except Exception as e:
+            logger.warning(f"Dropping an unreadable LLM cache entry: {e}")
+            self._record(scope, hit=False)
+            return None
+
+        self._record(scope, hit=True, tokens=row[1])
+        return response
+
+    def _update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        # only chat generations can be restored as messages
+        if not all(isinstance(generation, ChatGeneration) for generation in return_val):
+            return
+
+        key = self._key(prompt, llm_string)
+        tokens = self._count_tokens(prompt, return_val)
+        # a replayed message must not keep its id, `add_messages` would replace the original one
+        return_val = [
+            generation.model_copy(update={"message": generation.message.model_copy(update={"id": None})})
+            for generation in return_val
+        ]
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, tokens, created) VALUES (?, ?, ?, ?)",
+                (key, dumps(return_val), tokens, now)
+            )
+            if self._ttl is not None and now - self._last_eviction > self._eviction_interval:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (now - self._ttl,))
+                self._last_eviction = now
+            self._db.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self._lookup(prompt, llm_string)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self._update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+
+class ScopedLLMCache(BaseCache):
+    """Shares the storage of a `SQLiteLLMCache`, but also keeps the stats of its scope."""
+
+    @property
+    def cache(self) -> SQLiteLLMCache:
+        return self._cache
+
+    @property
+    def scope(self) -> str:
+        return self._scope
+
+    @property
+    def stats(self) -> LLMCacheStats:
+        return self._cache._scoped_stats.setdefault(self._scope, LLMCacheStats())
+
+    def __init__(self, cache: SQLiteLLMCache, scope: str) -> None:
+        self._cache = cache
+        self._scope = scope
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self._cache._lookup(prompt, llm_string, scope=self._scope)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self._cache._update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self._cache.clear(**kwargs)
+
+
+# ========== PROCESS-WIDE CACHE ==========
+
+_llm_caches: Dict[str, SQLiteLLMCache] = {}
+_llm_caches_lock = threading.Lock()
+
+
+def get_llm_cache(
+    cache_path: Optional[Union[Path, str]] = None,
+    ttl: Optional[float] = 7 * 24 * 3600,
+) -> SQLiteLLMCache:
+    """Returns the process-wide LLM cache stored at `cache_path`, shared by all the models."""
+    key = str(Path(cache_path or SQLiteLLMCache._default_cache_path).resolve())
+    with _llm_caches_lock:
+        cache = _llm_caches.get(key)
+        if cache is None:
+            cache = _llm_caches[key] = SQLiteLLMCache(cache_path, ttl=ttl)
+    return cache
+
+
+def scoped_llm(llm: BaseChatModel, scope: str) -> BaseChatModel:
+    """Copy of `llm` whose cache hits & misses are also counted under `scope` (e.g. an agent's name).
+    Returned as is, if the LLM does not use a `SQLiteLLMCache`."""
+    cache = llm.cache
+    if isinstance(cache, ScopedLLMCache):
+        cache = cache.cache
+    if not isinstance(cache, SQLiteLLMCache):
+        return llm
+    return llm.model_copy(update={"cache": cache.scoped(scope)})
+
+
+# ========== STREAMING THROUGH THE CACHE ==========
+# `BaseChatModel.stream()` never looks at the model's cache, only `invoke()` does
+
+def _cached_chunk(llm: BaseChatModel, messages: List[BaseMessage]) -> Optional[AIMessageChunk]:
+    """The model's cached response to `messages` as a single chunk, None on a miss or without a cache."""
+    if not isinstance(llm.cache, BaseCache):
+        return None
+    cached = llm.cache.lookup(dumps(messages), llm._get_llm_string())
+    if not cached:
+        return None
+    message = cached[0].message
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+    )
+
+
+def _cache_streamed(llm: BaseChatModel, messages: List[BaseMessage], full: Optional[BaseMessageChunk]) -> None:
+    if full is not None and isinstance(llm.cache, BaseCache):
+        llm.cache.update(
+            dumps(messages), llm._get_llm_string(), [ChatGeneration(message=message_chunk_to_message(full))]
+        )
+
+
+def stream_with_cache(llm: BaseChatModel, messages: List[BaseMessage]) -> Iterator[BaseMessageChunk]:
+    """`llm.stream(messages)` through the model's own cache: a cached response is yielded as one chunk, \
+    otherwise the tokens are streamed as they're generated and the whole response is cached afterwards."""
+    chunk = _cached_chunk(llm, messages)
+    if chunk is not None:
+        yield chunk
+        return
+
+    full: Optional[BaseMessageChunk] = None
+    for chunk in llm.stream(messages):
+        full = chunk if full is None else full + chunk
+        yield chunk
+    _cache_streamed(llm, messages, full)
+
+
+async def astream_with_cache(llm: BaseChatModel, messages: List[BaseMessage]) -> AsyncIterator[BaseMessageChunk]:
+    """Async version of `stream_with_cache()`."""
+    chunk = _cached_chunk(llm, messages)
+    if chunk is not None:
+        yield chunk
+        return
+
+    full: Optional[BaseMessageChunk] = None
+    async for chunk in llm.astream(messages):
+        full = chunk if full is None else full + chunk
+        yield chunk
+    _cache_streamed(llm, messages, full)
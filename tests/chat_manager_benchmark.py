@@ -0,0 +1,62 @@
+"""Measures the sidebar's chat list query and a turn's save against the number of chats,
+for the SQLite & the file (JSONL log) chat storage backends."""
+import time
+import random
+import tempfile
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from intellitube.utils import ChatManager, ChatStorage, FileChatStorage, SQLiteChatStorage
+from intellitube.utils.chat_manager import ChatInfo
+
+
+def fill_storage(storage: ChatStorage, n_chats: int, n_messages: int) -> None:
+    for i in range(n_chats):
+        chat_id = f"chat-{i}"
+        storage.save_chat_info(ChatInfo(
+            chat_id=chat_id, created_timestamp=i, last_accessed_timestamp=random.random() * n_chats
+        ))
+        storage.append_messages(chat_id, [
+            HumanMessage(f"question {j}") if j % 2 == 0 else AIMessage(f"answer {j} " * 50)
+            for j in range(n_messages)
+        ])
+
+
+def benchmark(name: str, storage: ChatStorage, root_dir: Path, n_chats: int, page_size: int = 20) -> None:
+    fill_storage(storage, n_chats, n_messages=20)
+
+    t0 = time.perf_counter()
+    storage.count_chats()
+    storage.list_chats(limit=page_size)
+    list_ms = (time.perf_counter() - t0) * 1000
+
+    # what the sidebar did before: load every chat & sort them in Python
+    t0 = time.perf_counter()
+    sorted(storage.list_chats(), key=lambda chat_info: chat_info["last_accessed_timestamp"], reverse=True)
+    list_all_ms = (time.perf_counter() - t0) * 1000
+
+    chatman = ChatManager(root_dir=root_dir, chat_id="chat-0", storage=storage)
+    t0 = time.perf_counter()
+    n_messages = len(chatman.chat_messages)
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for turn in range(20):
+        chatman.add_message(HumanMessage(f"new question {turn}"))
+        chatman.add_message(AIMessage(f"new answer {turn} " * 50))
+        chatman.save_chat()
+    save_ms = (time.perf_counter() - t0) * 1000 / 20
+
+    print(
+        f"{name:>6}  chats={n_chats:>6}  list page: {list_ms:7.2f} ms  list all + sort: {list_all_ms:7.2f} ms  "
+        f"load chat ({n_messages} messages): {load_ms:6.2f} ms  save turn: {save_ms:5.2f} ms"
+    )
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    for n_chats in (100, 1000, 5000):
+        for name, storage_class in (("sqlite", SQLiteChatStorage), ("file", FileChatStorage)):
+            with tempfile.TemporaryDirectory() as tempdir:
+                benchmark(name, storage_class(tempdir), Path(tempdir), n_chats)
@@ -0,0 +1,121 @@
+"""Measures how many concurrent chats one process serves with `IntelliTubeAI.ainvoke()`,
+compared to running the turns one after another with the sync `invoke()`; and the latency of
+a turn as the chat history grows, with & without the history token budget.
+The LLM is a fake one that simulates a remote provider's latency."""
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Any, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+
+from intellitube.utils import ChatManager, estimate_num_tokens
+from intellitube.vector_store import VectorStoreManager
+from intellitube.agents.main_agent import IntelliTubeAI
+from intellitube.agents.main_agent.states import RouterAgentResponse
+
+
+class SlowRemoteChatModel(BaseChatModel):
+    """Fake chat model: every call costs one round trip of `latency` seconds,
+    plus `latency_per_token` per prompt token."""
+    latency: float = 0.5
+    latency_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-remote-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage("Hi!"))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        n_tokens = sum(estimate_num_tokens(str(message.content)) for message in messages)
+        await asyncio.sleep(self.latency + n_tokens * self.latency_per_token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage("Hi!"))])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> RunnableLambda:
+        response = RouterAgentResponse(user_query="hi", url=None, url_of=None)
+
+        def route(_: Any) -> RouterAgentResponse:
+            time.sleep(self.latency)
+            return response
+
+        async def aroute(_: Any) -> RouterAgentResponse:
+            await asyncio.sleep(self.latency)
+            return response
+
+        return RunnableLambda(route, afunc=aroute)
+
+
+def create_agents(root: Path, n_chats: int, **agent_kwargs: Any) -> List[IntelliTubeAI]:
+    llm = SlowRemoteChatModel(**agent_kwargs.pop("llm_kwargs", {}))
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    agents = []
+    for i in range(n_chats):
+        chat_dir = root / f"chat_{i}"
+        vsman = VectorStoreManager(
+            embedding_model=embedding_model,
+            path_on_disk=chat_dir,
+            collection_path_on_disk=chat_dir / "collection",
+            collection_name=f"chat_{i}",
+            use_embedding_cache=False,
+        )
+        agents.append(IntelliTubeAI(
+            llm=llm, chat_manager=ChatManager(), vector_store_manager=vsman, **agent_kwargs
+        ))
+    return agents
+
+
+async def run_concurrently(agents: List[IntelliTubeAI]) -> float:
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        agent.ainvoke({"messages": [HumanMessage("Hi!")]}) for agent in agents
+    ))
+    return time.perf_counter() - t0
+
+
+def run_sequentially(agents: List[IntelliTubeAI]) -> float:
+    t0 = time.perf_counter()
+    for agent in agents:
+        agent.agent.invoke({"messages": [HumanMessage("Hi!")]})
+    return time.perf_counter() - t0
+
+
+async def turn_latency(agent: IntelliTubeAI, n_turns: int) -> float:
+    history: List[BaseMessage] = []
+    for turn in range(n_turns):
+        history += [HumanMessage(f"Question {turn}? " * 20), AIMessage(f"Answer {turn}. " * 100)]
+
+    t0 = time.perf_counter()
+    await agent.ainvoke({"messages": [*history, HumanMessage("Hi!")]})
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    n_chats = 10
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        agents = create_agents(Path(tempdir), n_chats)
+        sequential = run_sequentially(agents)
+        concurrent = asyncio.run(run_concurrently(agents))
+
+    print(f"{n_chats} chats, one turn each ({agents[0].llm.latency} s per LLM call)")
+    print(f"Sequential invoke():  {sequential:6.2f} s")
+    print(f"Concurrent ainvoke(): {concurrent:6.2f} s")
+
+    print("\nTurn latency vs history length (0.1 s + 50 ms per 1k prompt tokens)")
+    with tempfile.TemporaryDirectory() as tempdir:
+        llm_kwargs = {"latency": 0.1, "latency_per_token": 50e-6}
+        whole, = create_agents(Path(tempdir) / "whole", 1, llm_kwargs=dict(llm_kwargs), history_max_tokens=None)
+        budget, = create_agents(Path(tempdir) / "budget", 1, llm_kwargs=dict(llm_kwargs), history_max_tokens=4096)
+        for n_turns in (10, 100, 500):
+            print(
+                f"{n_turns:>4} turns:  whole history {asyncio.run(turn_latency(whole, n_turns)):6.2f} s  "
+                f"4096-token budget {asyncio.run(turn_latency(budget, n_turns)):6.2f} s"
+            )
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+from intellitube.agents.main_agent.router import fast_route
+
+
+# an existing document, only those are routed without the LLM
+_tempdir = tempfile.TemporaryDirectory()
+DOCUMENT_PATH = os.path.join(_tempdir.name, "vdb-eval-guide.pdf")
+open(DOCUMENT_PATH, "wb").close()
+
+
+# (message, expected url, expected url_of); `...` means the LLM router has to decide
+cases = [
+    ("Hi, what's up?", None, None),
+    ("explain the observability module used here pls", None, None),
+    (
+        "What's that python lib he used in this video to chunk text?\n"
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "youtube_video"
+    ),
+    (
+        "The video explains streaming eval but I don't get the part at 3:52\n"
+        "https://youtu.be/_eSYjZ2x9rM",
+        "https://youtu.be/_eSYjZ2x9rM", "youtube_video"
+    ),
+    (
+        "Umm can u check this site and tell me how they used reranking?\n"
+        "https://cohere.com/blog/re-ranking",
+        "https://cohere.com/blog/re-ranking", "website"
+    ),
+    (
+        "How to use LangChain structured output? (https://docs.langchain.com/docs/structured_outputs).",
+        "https://docs.langchain.com/docs/structured_outputs", "website"
+    ),
+    (
+        "Check my saved pdf here for the instructions on vector DB evals:\n" + DOCUMENT_PATH,
+        DOCUMENT_PATH, "document"
+    ),
+    ("what does the conclusion of %s say?" % DOCUMENT_PATH, DOCUMENT_PATH, "document"),
+    ("is input/output handled and/or logged?", None, None),
+    # lookalike hosts are websites, not YouTube
+    (
+        "what is this page about? https://notyoutube.com/watch?v=dQw4w9WgXcQ",
+        "https://notyoutube.com/watch?v=dQw4w9WgXcQ", "website"
+    ),
+    ("summarize https://evil-youtu.be/about", "https://evil-youtu.be/about", "website"),
+    # ambiguous: left to the LLM
+    ("compare https://a.com/x with https://b.com/y", ..., ...),
+    ("see github.com/microsoft/guidance", ..., ...),
+    ("list the videos of https://www.youtube.com/@LangChain", ..., ...),
+    ("https://youtu.be/_eSYjZ2x9rM", ..., ...),
+    # path-like text that's not a document on disk: left to the LLM, never a failed load
+    (
+        "how does that docker file setup work again? It's in this local folder\n"
+        "~/projects/ragstack/",
+        ..., ...
+    ),
+    (
+        "extract the retry logic from the python file in this directory:\n"
+        "./scripts/error_handler.py",
+        ..., ...
+    ),
+    ("I wrote the idea somewhere in draft.txt... just quote it pls", ..., ...),
+    ("what does scripts/error_handler.py do?", ..., ...),
+    ("what happened on 10/12/2024?", ..., ...),
+    ("what is 1/2/3 of the total?", ..., ...),
+    ("explain the TCP/IP/UDP layers", ..., ...),
+    ("why is my index.html blank?", ..., ...),
+    ("summarize the README.md conventions", ..., ...),
+]
+
+
+def fast_route_test() -> None:
+    for message, url, url_of in cases:
+        response = fast_route(message)
+        print(f"{message!r}\n    -> {response}")
+
+        if url is ...:
+            assert response is None, message
+        else:
+            assert response is not None, message
+            assert (response.url, response.url_of) == (url, url_of), message
+            assert not url or url not in response.user_query, message
+    print(f"\nAll {len(cases)} cases passed.")
+
+
+if __name__ == '__main__':
+    fast_route_test()
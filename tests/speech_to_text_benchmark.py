@@ -0,0 +1,83 @@
+"""Real-time factor (processing time / audio duration) of the local speech-to-text fallback:
+decoding the 44.1 kHz mp3 vs the 16 kHz mono Opus download, and transcribing with 1..N workers.
+
+Usage: python -m intellitube.tests.speech_to_text_benchmark [audio file] [model size]
+Without an audio file, a synthetic one is generated (the VAD is then disabled, it's not speech)."""
+import sys
+import time
+import wave
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from intellitube.utils import SpeechToText, iter_audio_segments, is_speech_to_text_available
+
+
+def write_synthetic_wav(path: Path, seconds: float = 300, sample_rate: int = 44100) -> None:
+    """A stereo, 44.1 kHz sweep with noise: what the mp3 download decodes to."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * (200 + 100 * np.sin(t)) * t) + 0.05 * np.random.randn(len(t))
+    samples = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    with wave.open(str(path), 'wb') as file:
+        file.setnchannels(2)
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes(np.repeat(samples, 2).tobytes())
+
+
+def encode(src: Path, dst: Path, *args: str) -> Path:
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", str(src), *args, str(dst)], check=True)
+    return dst
+
+
+def audio_seconds(audio_path: Path) -> float:
+    return sum(len(samples) for _, samples in iter_audio_segments(audio_path)) / 16000
+
+
+def benchmark_decode(name: str, audio_path: Path, duration: float) -> None:
+    t0 = time.perf_counter()
+    for _ in iter_audio_segments(audio_path):
+        pass
+    elapsed = time.perf_counter() - t0
+    print(
+        f"decode {name:>22}: {audio_path.stat().st_size / 2**20:6.2f} MiB  "
+        f"{elapsed:6.2f} s  RTF {elapsed / duration:.4f}"
+    )
+
+
+def benchmark_transcribe(audio_path: Path, duration: float, model_size: str, vad_filter: bool) -> None:
+    for num_workers in (1, 2, 4):
+        speech_to_text = SpeechToText(model_size, num_workers=num_workers, vad_filter=vad_filter)
+        speech_to_text.model  # not timed: loaded once per process in the app
+
+        t0 = time.perf_counter()
+        n_cues = sum(1 for _ in speech_to_text.iter_cues(audio_path, language="en"))
+        elapsed = time.perf_counter() - t0
+        print(
+            f"transcribe ({model_size}, {num_workers} workers): {elapsed:7.2f} s  "
+            f"RTF {elapsed / duration:.3f}  ({n_cues} cues)"
+        )
+
+
+if __name__ == '__main__':
+    if not is_speech_to_text_available():
+        sys.exit("Speech-to-text is not available: install `faster-whisper` and `ffmpeg`")
+
+    model_size = sys.argv[2] if len(sys.argv) > 2 else "tiny"
+    with tempfile.TemporaryDirectory() as tempdir:
+        source = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+        if source is None:
+            source = Path(tempdir) / "synthetic.wav"
+            write_synthetic_wav(source)
+
+        # the two download formats of `download_youtube_audio_or_transcript()`
+        mp3 = encode(source, Path(tempdir) / "audio.mp3", "-ar", "44100", "-b:a", "192k")
+        speech = encode(source, Path(tempdir) / "speech.opus", "-ar", "16000", "-ac", "1", "-b:a", "32k")
+        duration = audio_seconds(speech)
+        print(f"audio: {duration:.0f} s")
+
+        benchmark_decode("mp3 44.1 kHz stereo", mp3, duration)
+        benchmark_decode("opus 16 kHz mono", speech, duration)
+        benchmark_transcribe(speech, duration, model_size, vad_filter=len(sys.argv) > 1)
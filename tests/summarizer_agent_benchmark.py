@@ -0,0 +1,128 @@
+"""Measures the wall-clock time of `SummarizerAgent` on a long transcript against the number
+of map chunks, with a fake local LLM that simulates a remote provider's latency & failures."""
+import time
+import random
+import asyncio
+from typing import Any, List, Optional, Union
+
+from langchain_core.documents import Document
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.language_models import BaseChatModel
+
+from intellitube.agents import SummarizerAgent
+from intellitube.utils import estimate_num_tokens, chunk_transcript_cues, WebVTTCue, TokenCounter
+
+
+class SlowFlakyChatModel(BaseChatModel):
+    """Fake chat model: a call takes `latency` seconds plus `latency_per_token` per prompt token,
+    and fails with `failure_rate` probability."""
+    latency: float = 0.2
+    latency_per_token: float = 50e-6
+    failure_rate: float = 0.05
+    response_words: int = 6
+    calls: int = 0
+    failures: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-flaky-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        return asyncio.run(self._agenerate(messages, stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        n_tokens = sum(estimate_num_tokens(str(message.content)) for message in messages)
+        await asyncio.sleep(self.latency + n_tokens * self.latency_per_token)
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError("429 Too Many Requests")
+        summary = " ".join([f"summary-{self.calls}"] * self.response_words)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(summary))])
+
+
+def synthetic_transcript(n_tokens: int) -> str:
+    sentence = "So in this part of the lecture we talk about how the model learns from data. "
+    return sentence * (n_tokens // estimate_num_tokens(sentence))
+
+
+async def benchmark(
+    transcript: Union[str, List[Document]], chunk_tokens: int, max_concurrency: int,
+    response_words: int = 6, max_tokens: int = 2048,
+) -> None:
+    llm = SlowFlakyChatModel(response_words=response_words)
+    summarizer = SummarizerAgent(
+        llm=llm, chunk_tokens=chunk_tokens, max_tokens=max_tokens,
+        max_concurrency=max_concurrency, max_retries=5,
+        # keep the backoff short, the fake failures are not real rate limits
+        retry_base_delay=0.1,
+    )
+    documents = transcript if isinstance(transcript, list) else [transcript]
+    n_chunks = len(summarizer.split_contents(documents))
+
+    t0 = time.perf_counter()
+    steps, _ = await summarizer.stream_asummarize(documents)
+    elapsed = time.perf_counter() - t0
+    collapse_rounds = sum("collapse_summaries" in step for step in steps)
+
+    print(
+        f"chunk_tokens={chunk_tokens:>6}  chunks={n_chunks:>4}  concurrency={max_concurrency:>2}  "
+        f"collapse rounds={collapse_rounds}  "
+        f"{elapsed:6.2f} s  LLM calls: {llm.calls:>4} ({llm.failures} failed & retried)"
+    )
+
+
+def benchmark_token_counting(texts: List[str], rounds: int = 20) -> None:
+    """Cost of counting the same texts again (like the collapse rounds): memoizing only pays off \
+    for a real tokenizer, the estimate is cheaper than hashing the text."""
+    def slow_tokenizer(text: str) -> int:
+        # stand-in for a real tokenizer: its cost grows with the text
+        return len(text.split()) + sum(1 for _ in range(len(text) // 16))
+
+    counters = {
+        "estimate": TokenCounter(),
+        "estimate, memoized": TokenCounter(memoize=True),
+        "tokenizer": TokenCounter(slow_tokenizer, memoize=False),
+        "tokenizer, memoized": TokenCounter(slow_tokenizer),
+    }
+    for name, counter in counters.items():
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            counter.count_documents(texts)
+        elapsed = time.perf_counter() - t0
+        print(f"count tokens ({name:>19}): {elapsed / (rounds * len(texts)) * 1e6:7.2f} us / text")
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    transcript = synthetic_transcript(n_tokens=32_000)
+    print(
+        f"Synthetic transcript: ~{estimate_num_tokens(transcript)} tokens, "
+        f"LLM call: 0.2 s + 50 ms per 1k prompt tokens\n"
+    )
+
+    for chunk_tokens in (32_000, 8192, 4096, 1024, 512):
+        asyncio.run(benchmark(transcript, chunk_tokens, max_concurrency=8))
+
+    print()
+    for max_concurrency in (1, 4, 16):
+        asyncio.run(benchmark(transcript, 1024, max_concurrency))
+
+    # the loaded transcripts arrive as 128-token chunks of whole cues: packed into `chunk_tokens` map inputs
+    print()
+    cues = (WebVTTCue(i * 1000, (i + 1) * 1000, sentence) for i, sentence in enumerate(transcript.split(". ")))
+    transcript_chunks = list(chunk_transcript_cues(cues, max_tokens=128))
+    print(f"{len(transcript_chunks)} transcript chunks of <= 128 tokens")
+    asyncio.run(benchmark(transcript_chunks, 1024, max_concurrency=8))
+
+    print()
+    benchmark_token_counting([chunk.page_content for chunk in transcript_chunks])
+
+    # long map summaries on a small reduce budget: forces a few collapse rounds
+    print()
+    for max_concurrency in (1, 16):
+        asyncio.run(benchmark(
+            transcript, 512, max_concurrency, response_words=150, max_tokens=1024
+        ))
@@ -45,6 +45,8 @@ def test_summarizer_agent(llm: BaseChatModel, docs: List[Document]) -> None:
     # summarizer.save_graph_image("images/summarizer_agent_graph.png")
     data: SummarizerAgentState = summarizer.summarize(docs)
     print(data["final_summary"])
+    # rerunning the test answers the same prompts from the LLM cache
+    print(f"LLM cache: {summarizer.llm_cache_stats}")
 
 def test_summarizer_agent_stream(llm: BaseChatModel, docs: List[Document]) -> None:
     def stream_updater_callback(step: Dict[str, Any]):
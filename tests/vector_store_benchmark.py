@@ -0,0 +1,61 @@
+"""Measures the chat-start latency of `VectorStoreManager`, i.e. creating a new collection,
+with an embedding model that simulates a remote provider's round trip."""
+import time
+import tempfile
+import statistics
+from pathlib import Path
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from intellitube.vector_store import VectorStoreManager
+
+
+class SlowRemoteEmbeddings(Embeddings):
+    """Fake remote embedding provider: every call costs one network round trip."""
+    model_name: str = "fake-remote-embeddings"
+
+    def __init__(self, size: int = 384, latency: float = 0.25) -> None:
+        self.size_ = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, n: int) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [[0.1] * self.size_ for _ in range(n)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(len(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(1)[0]
+
+
+def create_chats(embedding_model: Embeddings, root: Path, n_chats: int) -> List[float]:
+    latencies = []
+    for i in range(n_chats):
+        chat_dir = root / f"chat_{i}"
+        t0 = time.perf_counter()
+        VectorStoreManager(
+            embedding_model=embedding_model,
+            path_on_disk=chat_dir,
+            collection_path_on_disk=chat_dir / "collection",
+            collection_name=f"chat_{i}",
+            embedding_cache_path=root / "embeddings.sqlite3",
+        )
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+if __name__ == '__main__':
+    n_chats = 20
+    embedding_model = SlowRemoteEmbeddings()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        latencies = create_chats(embedding_model, Path(tempdir), n_chats)
+
+    print(f"First chat start:        {latencies[0] * 1000:8.2f} ms")
+    print(f"Next chats (mean):       {statistics.mean(latencies[1:]) * 1000:8.2f} ms")
+    print(f"Next chats (max):        {max(latencies[1:]) * 1000:8.2f} ms")
+    print(f"Embedding provider calls: {embedding_model.calls} for {n_chats} new chats")
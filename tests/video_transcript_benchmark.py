@@ -0,0 +1,108 @@
+"""Compares the streaming WEBVTT parser against the old list-based implementation
+on a synthetic 10-hour transcript (throughput & peak memory)."""
+import re
+import os
+import time
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from intellitube.utils import iter_webvtt_cues, webvtt_2_str
+from intellitube.utils.video_transcript import ms_2_timestamp
+
+
+def legacy_webvtt_2_json(
+    vtt_content: Optional[str] = None,
+    vtt_file_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """The previous `webvtt_2_json()` implementation, kept here as the baseline."""
+    lines: List[str] = (vtt_content or "").split("\n")
+
+    if not lines[0]:
+        with open(vtt_file_path, 'r') as file:
+            lines = file.read().strip().split("\n")
+
+    metadata = {}
+    json_data = []
+
+    for line in lines:
+        try:
+            if not line: continue
+            M = re.match(r"\d+:\d+:.+ --> \d+:\d+:.+", line)
+            if M:
+                time_range = line.split("-->")
+                json_data.append({
+                    "start": time_range[0].strip(),
+                    "end": time_range[1].strip(),
+                })
+            else:
+                if not json_data and not M:
+                    if line != "WEBVTT":
+                        data = line.split(':')
+                        metadata[data[0].strip()] = data[1].strip()
+                    else:
+                        metadata["type"] = "WEBVTT"
+                else:
+                    json_data[-1]["text"] = line
+        except Exception as e:
+            print(f"ERROR: {e}")
+
+    return {"metadata": metadata, "captions": json_data}
+
+
+def legacy_webvtt_2_str(vtt_file_path: str) -> str:
+    vtt_json = legacy_webvtt_2_json(vtt_file_path=vtt_file_path)
+    return "\n".join(caption['text'] for caption in vtt_json["captions"])
+
+
+def write_synthetic_vtt(path: str, hours: float = 10, cue_ms: int = 2500) -> int:
+    """Writes a YouTube-like two-line-per-cue WEBVTT file. Returns the number of cues."""
+    n_cues = int(hours * 3600 * 1000 // cue_ms)
+    with open(path, 'w') as file:
+        file.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        for i in range(n_cues):
+            start, end = i * cue_ms, (i + 1) * cue_ms
+            file.write(
+                f"{ms_2_timestamp(start)} --> {ms_2_timestamp(end)} align:start position:0%\n"
+                f"so this is caption line number {i} of the lecture\n"
+                f"and it continues on a second line\n\n"
+            )
+    return n_cues
+
+
+def benchmark(name: str, func: Callable[[], Any], size_bytes: int, repeat: int = 3) -> None:
+    # time it without tracing, `tracemalloc` slows down every allocation
+    elapsed = min(_timed(func) for _ in range(repeat))
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:<28} {elapsed:8.3f} s  "
+        f"{size_bytes / elapsed / 2**20:8.2f} MiB/s  "
+        f"peak: {peak / 2**20:8.2f} MiB"
+    )
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    func()
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, "synthetic_10h.vtt")
+        n_cues = write_synthetic_vtt(path)
+        size_bytes = os.path.getsize(path)
+        print(f"Synthetic transcript: {n_cues} cues, {size_bytes / 2**20:.2f} MiB\n")
+
+        # parsing only
+        benchmark("legacy webvtt_2_json", lambda: legacy_webvtt_2_json(vtt_file_path=path), size_bytes)
+        benchmark("iter_webvtt_cues", lambda: sum(1 for _ in iter_webvtt_cues(vtt_file_path=path)), size_bytes)
+
+        # parsing + building the transcript string
+        benchmark("legacy webvtt_2_str", lambda: legacy_webvtt_2_str(path), size_bytes)
+        benchmark("webvtt_2_str", lambda: webvtt_2_str(vtt_file_path=path), size_bytes)
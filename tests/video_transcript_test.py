@@ -1,8 +1,68 @@
-from intellitube.utils import webvtt_2_json, webvtt_2_langchain_documents
+from intellitube.utils import (
+    TranscriptDedupStats, WebVTTCue, dedupe_rolling_cues, is_auto_caption_webvtt,
+    webvtt_2_json, webvtt_2_langchain_documents, webvtt_2_str
+)
+import tempfile
+
 from intellitube.utils import YTContentData, download_youtube_audio_or_transcript
+from intellitube.utils import youtube
+
+
+# YouTube's auto-captions: the previous line is repeated above the new one, and held alone by a 10ms cue
+ROLLING_AUTO_CAPTIONS = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.350 align:start position:0%
+
+hello<00:00:00.320><c> world</c>
+
+00:00:02.350 --> 00:00:02.360 align:start position:0%
+hello world
+
+
+00:00:02.360 --> 00:00:05.000 align:start position:0%
+hello world
+this<00:00:02.800><c> is</c><00:00:03.100><c> fine</c>
+"""
+
+
+def test_dedupe_rolling_cues() -> None:
+    # regular captions: repeated words & lines are real speech, nothing is dropped
+    false_positives = [
+        ([(0, 1000, "I think that"), (1000, 2000, "that is right")], "I think that that is right"),
+        ([(0, 1000, "no"), (1000, 2000, "no")], "no no"),
+        ([(0, 1000, "go go"), (1000, 2000, "go")], "go go go"),
+    ]
+    for cues, expected in false_positives:
+        text = " ".join(cue.text for cue in dedupe_rolling_cues(WebVTTCue(*cue) for cue in cues))
+        assert text == expected, (text, expected)
+
+    assert is_auto_caption_webvtt(vtt_content=ROLLING_AUTO_CAPTIONS)
+    assert webvtt_2_str(vtt_content=ROLLING_AUTO_CAPTIONS, dedupe=True) == "hello world this is fine"
+    assert not is_auto_caption_webvtt(vtt_content="WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nno\n")
+    print("dedupe_rolling_cues: OK")
+
+
+def test_transcribe_without_audio() -> None:
+    # no subtitles and no audio stream: the loader's fallback gets None, not an error
+    is_available, download = youtube.is_speech_to_text_available, youtube.download_youtube_content
+    youtube.is_speech_to_text_available = lambda: True
+    youtube.download_youtube_content = lambda *args, **kwargs: None
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            assert youtube.transcribe_youtube_audio(
+                'https://www.youtube.com/watch?v=W3I3kAg2J7w', output_dir=output_dir
+            ) is None
+    finally:
+        youtube.is_speech_to_text_available, youtube.download_youtube_content = is_available, download
+    print("transcribe_youtube_audio without audio: OK")
 
 
 if __name__ == '__main__':
+    test_dedupe_rolling_cues()
+    test_transcribe_without_audio()
+
     url = 'https://www.youtube.com/watch?v=W3I3kAg2J7w&t=231s'
     
     data: YTContentData = download_youtube_audio_or_transcript(
@@ -15,4 +75,9 @@ if __name__ == '__main__':
 
     data = webvtt_2_langchain_documents(vtt_content=json_data)
     print(data[0])
-    print(len(data))
\ No newline at end of file
+    print(len(data))
+
+    stats = TranscriptDedupStats()
+    deduped_str = webvtt_2_str(vtt_content=json_data, dedupe=True, dedupe_stats=stats)
+    print("Deduplicated:", deduped_str[:200], end='\n\n')
+    print(stats)
@@ -0,0 +1,88 @@
+"""Measures the ingestion of many YouTube videos into the knowledge base: one after another
+(download -> parse -> embed per video) against `IntelliTubeAI.aingest_youtube_urls()`, where the
+downloads run concurrently and overlap with the parsing & embedding. The downloads are faked
+with a fixed latency, so no network is needed."""
+import os
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+from intellitube.utils import ChatManager, youtube
+from intellitube.tools import document_loader_tools
+from intellitube.vector_store import VectorStoreManager
+from intellitube.agents.main_agent import IntelliTubeAI
+
+DOWNLOAD_LATENCY = 0.5
+
+
+def fake_fetch_youtube_subtitles(video_url: str, language: Optional[str] = None) -> Tuple[str, str]:
+    """Stands in for yt-dlp: waits like a download, returns a 10 minute transcript."""
+    time.sleep(DOWNLOAD_LATENCY)
+    video_id = youtube.extract_youtube_video_id(video_url)
+    cues = "\n".join(
+        f"00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{(i + 1) // 60:02d}:{(i + 1) % 60:02d}.000\n"
+        f"line {i} of the video {video_id} about something\n"
+        for i in range(600)
+    )
+    return language or "en", f"WEBVTT\n\n{cues}"
+
+
+def create_agent(root: Path) -> IntelliTubeAI:
+    vsman = VectorStoreManager(
+        embedding_model=DeterministicFakeEmbedding(size=16),
+        path_on_disk=root,
+        collection_path_on_disk=root / "collection",
+        collection_name="ingestion",
+        use_embedding_cache=False,
+    )
+    return IntelliTubeAI(llm=FakeListChatModel(responses=[""]), chat_manager=ChatManager(), vector_store_manager=vsman)
+
+
+def ingest_sequentially(agent: IntelliTubeAI, urls: List[str]) -> float:
+    t0 = time.perf_counter()
+    for url in urls:
+        data = youtube.download_youtube_audio_or_transcript(url)
+        agent.add_to_vdb(document_loader_tools.parse_youtube_transcript(url, vtt_file_path=data.transcript_path))
+    return time.perf_counter() - t0
+
+
+async def ingest_concurrently(agent: IntelliTubeAI, urls: List[str], kwargs: Dict[str, Any]) -> float:
+    t0 = time.perf_counter()
+    results = await agent.aingest_youtube_urls(urls, **kwargs)
+    assert all(isinstance(n, int) for n in results.values()), results
+    return time.perf_counter() - t0
+
+
+def run_in_tempdir(name: str, ingest: Any, *args: Any) -> None:
+    """Runs `ingest(agent, *args)` in a fresh folder, it also holds the download cache."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tempdir:
+        os.chdir(tempdir)
+        try:
+            elapsed = ingest(create_agent(Path(tempdir) / "vdb"), *args)
+            if asyncio.iscoroutine(elapsed):
+                elapsed = asyncio.run(elapsed)
+        finally:
+            os.chdir(cwd)
+    print(f"{name:<38} {elapsed:6.2f} s")
+
+
+if __name__ == '__main__':
+    youtube.fetch_youtube_subtitles = fake_fetch_youtube_subtitles
+    urls = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(16)]
+
+    print(f"{len(urls)} videos, {DOWNLOAD_LATENCY} s per download")
+    run_in_tempdir("Sequential", ingest_sequentially, urls)
+    run_in_tempdir(
+        "Batch, 4 at once, 2 req/s per host", ingest_concurrently, urls,
+        {"max_concurrency": 4, "requests_per_second": 2.0},
+    )
+    run_in_tempdir(
+        "Batch, 8 at once, no rate limit", ingest_concurrently, urls,
+        {"max_concurrency": 8, "requests_per_second": None},
+    )
@@ -1,6 +1,6 @@
 from pathlib import Path
 from loguru import logger
-from typing import List, Union
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
 from langchain_core.documents import Document
 from langchain_community.document_loaders import (
@@ -8,31 +8,73 @@ from langchain_community.document_loaders import (
 )
 
 from intellitube.utils import (
-    YTContentData,
-    webvtt_2_str, download_youtube_audio_or_transcript,
+    run_in_threadpool, TranscriptDedupStats,
+    iter_webvtt_cues, dedupe_rolling_cues, is_auto_caption_webvtt, chunk_transcript_cues,
+    fetch_youtube_transcript, transcribe_youtube_audio, youtube_timestamp_url, aiter_youtube_downloads,
 )
 
 
+# the file types `load_document()` can read
+SUPPORTED_DOCUMENT_SUFFIXES = ('.pdf', '.txt', '.py')
+
+
+def parse_youtube_transcript(
+    youtube_url: str,
+    vtt_content: Optional[str] = None,
+    vtt_file_path: Optional[str] = None,
+    dedupe: Optional[bool] = None,
+) -> List[Document]:
+    """Parses a transcript (WebVTT content or file) into chunks of whole cues, that link to their time in the video.
+
+    The rolling auto-caption lines are merged (see `dedupe_rolling_cues()`) only if `dedupe`, \
+    which defaults to whether the transcript is YouTube's auto-captions (see `is_auto_caption_webvtt()`): \
+    uploaded subtitles & speech-to-text transcripts are kept as they are.
+    """
+    if dedupe is None:
+        dedupe = is_auto_caption_webvtt(vtt_content=vtt_content, vtt_file_path=vtt_file_path)
+
+    # parse the WEBVTT format trancript & merge the repeated auto-caption lines
+    dedupe_stats = TranscriptDedupStats()
+    cues = iter_webvtt_cues(vtt_content=vtt_content, vtt_file_path=vtt_file_path)
+    if dedupe:
+        cues = dedupe_rolling_cues(cues, dedupe_stats)
+
+    # chunk it by whole cues, so every chunk knows where it is in the video
+    documents = list(chunk_transcript_cues(
+        cues, max_tokens=128, metadata={ "source": youtube_url }
+    ))
+    for document in documents:
+        document.metadata["timestamp_url"] = youtube_timestamp_url(
+            youtube_url, document.metadata["start_ms"]
+        )
+
+    logger.debug(documents[0].page_content[:100] if documents else "")    # print first 100 characters
+    if dedupe:
+        logger.info(f"Transcript deduplicated: {dedupe_stats}")
+    return documents
+
+
 def load_youtube_transcript(youtube_url: str) -> Union[Exception, List[Document]]:
     """Load the given YouTube video's transcript to the vector database.
     It is required to answer user-queries based on the the Transcript context."""
-    document: Document
+    documents: List[Document]
     try:
         logger.debug("Loading Youtube Transcript...")
         
-        # download the youtube transcript (or audio if transcript not available)
-        yt_video_data: YTContentData = download_youtube_audio_or_transcript(
-            video_url=youtube_url,
-        )
-
-        # convert the WEBVTT format trancript to a plain text string
-        vtt_str = webvtt_2_str(vtt_file_path=yt_video_data.transcript_path)
-        logger.debug(vtt_str[:100])    # print first 100 characters
-        document = Document(vtt_str, metadata={ "source": youtube_url })
+        # fetch the youtube transcript in memory (or read it from the download cache)
+        vtt_content = fetch_youtube_transcript(video_url=youtube_url)
+        if vtt_content:
+            documents = parse_youtube_transcript(youtube_url, vtt_content=vtt_content)
+        else:
+            # no subtitles: transcribe the audio locally, if speech-to-text is installed
+            vtt_content = transcribe_youtube_audio(video_url=youtube_url)
+            if not vtt_content:
+                raise Exception(f"No transcript available for: {youtube_url}")
+            documents = parse_youtube_transcript(youtube_url, vtt_content=vtt_content, dedupe=False)
     except Exception as e:
         logger.error(str(e))
         return e
-    return [document]
+    return documents
 
 
 def load_document(document_path: Union[Path, str]) -> Union[Exception, List[Document]]:
@@ -51,7 +93,7 @@ def load_document(document_path: Union[Path, str]) -> Union[Exception, List[Docu
 
         if ext == '.pdf':
             documents = PyPDFLoader(document_path).load()
-        elif ext in ['.txt', '.py']:
+        elif ext in SUPPORTED_DOCUMENT_SUFFIXES:
             documents = [Document(
                 page_content=document_path.read_text(),
                 metadata={"source": document_path}
@@ -78,3 +120,46 @@ def load_webpage(webpage_url: str) -> Union[Exception, List[Document]]:
         logger.error(str(e))
         return e
     return documents
+
+
+# ========== ASYNC LOADERS ==========
+# the loaders block on network & disk I/O, so they run on the shared thread pool
+
+async def aload_youtube_transcript(youtube_url: str) -> Union[Exception, List[Document]]:
+    """Async version of `load_youtube_transcript()`."""
+    return await run_in_threadpool(load_youtube_transcript, youtube_url)
+
+
+async def aload_document(document_path: Union[Path, str]) -> Union[Exception, List[Document]]:
+    """Async version of `load_document()`."""
+    return await run_in_threadpool(load_document, document_path)
+
+
+async def aload_webpage(webpage_url: str) -> Union[Exception, List[Document]]:
+    """Async version of `load_webpage()`."""
+    return await run_in_threadpool(load_webpage, webpage_url)
+
+
+async def aiter_youtube_transcripts(
+    youtube_urls: Union[str, List[str]],
+    max_concurrency: int = 4,
+    requests_per_second: Optional[float] = 2.0,
+) -> AsyncIterator[Tuple[str, Union[Exception, List[Document]]]]:
+    """Batch version of `aload_youtube_transcript()` for many videos, or a playlist / channel.
+    The transcripts download concurrently (see `aiter_youtube_downloads()`), and each one is parsed
+    as soon as it arrives, while the others are still downloading."""
+    async for youtube_url, yt_video_data in aiter_youtube_downloads(
+        youtube_urls, 'transcript', max_concurrency=max_concurrency, requests_per_second=requests_per_second
+    ):
+        if isinstance(yt_video_data, Exception):
+            yield youtube_url, yt_video_data
+            continue
+        try:
+            documents = await run_in_threadpool(
+                parse_youtube_transcript, youtube_url, vtt_file_path=yt_video_data.transcript_path
+            )
+        except Exception as e:
+            logger.error(str(e))
+            yield youtube_url, e
+            continue
+        yield youtube_url, documents
@@ -1,14 +1,17 @@
 import os
+import time
 import streamlit as st
-from typing import Callable, Optional, Union
+from loguru import logger
+from typing import Any, Callable, Dict, Iterator, Optional, Union
 
 from langgraph.graph.state import CompiledStateGraph
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 from intellitube.llm import init_llm
-from intellitube.utils import ChatManager
+from intellitube.utils import ChatManager, iter_over_async
 from intellitube.vector_store import VectorStoreManager
 from intellitube.agents.main_agent import IntelliTubeAI
+from intellitube.agents.summarizer_agent import get_summary_job_queue
 
 
 class StreamlitUI:
@@ -18,6 +21,7 @@ class StreamlitUI:
         "page_icon": "🤖",
         "layout": "wide",
     }
+    chat_list_page_size: int = 20
 
     @property
     def chat_manager(self) -> ChatManager:
@@ -42,13 +46,17 @@ class StreamlitUI:
 
     def __init__(self,
         init_function: Optional[Callable] = None,
+        auto_summarize: bool = False,
     ) -> None:
         self._init_function = init_function
+        # opt-in: queue a background summary of every loaded source
+        self.auto_summarize = auto_summarize
 
         # initialize session state for backend loading
         if "backend_loaded" not in st.session_state:
             st.session_state.backend_loaded = False
             st.session_state.chat_messages = []
+            st.session_state.ttft_history = []
     
     def _do_preprocesing(self) -> None:
         chatman: ChatManager
@@ -70,16 +78,22 @@ class StreamlitUI:
                 collection_name=chatman.chat_id,
             )
 
+            # summaries of the loaded sources are made in the background
+            summary_job_queue = get_summary_job_queue(llm) if self.auto_summarize else None
+
             # initialize the agent
             ai_agent = IntelliTubeAI(
                 llm=llm, chat_manager=chatman,
                 vector_store_manager=vsman,
+                summary_job_queue=summary_job_queue,
+                auto_summarize=self.auto_summarize,
             )
 
         # Store in session state
         st.session_state.chat_manager = chatman
         st.session_state.agent = ai_agent.agent
         st.session_state.chat_id = chatman.chat_id
+        st.session_state.summary_job_queue = ai_agent.summary_job_queue
 
     def launch(self) -> None:
         st.set_page_config(**self.page_config)
@@ -142,20 +156,21 @@ class StreamlitUI:
         with st.sidebar:
             st.header("💬 Chat History")
             
-            # get and display chat list
+            # get and display a page of the chat list (most recent first, sorted by the storage's index)
             try:
-                chat_list = self.chat_manager.chatlist
-                if chat_list:
-                    st.caption(f"Found {len(chat_list)} previous chats:")
-                    
-                    # sort chats by last accessed timestamp (most recent first)
-                    sorted_chats = sorted(
-                        chat_list.items(), 
-                        key=lambda x: x[1]['last_accessed_timestamp'], 
-                        reverse=True
+                n_chats = self.chat_manager.count_chats()
+                if n_chats:
+                    n_pages = (n_chats + self.chat_list_page_size - 1) // self.chat_list_page_size
+                    page = st.number_input(
+                        f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1
+                    ) if n_pages > 1 else 1
+                    st.caption(f"Found {n_chats} previous chats:")
+
+                    chat_list = self.chat_manager.list_chats(
+                        limit=self.chat_list_page_size, offset=(page - 1) * self.chat_list_page_size
                     )
-                    
-                    for chat_id, chat_info in sorted_chats:
+                    for chat_info in chat_list:
+                        chat_id = chat_info['chat_id']
                         # format timestamps
                         import datetime
                         created_time = datetime.datetime.fromtimestamp(chat_info['created_timestamp'])
@@ -168,7 +183,7 @@ class StreamlitUI:
                             st.info(f"💭 **Chat Session**")
                         
                         # display all metadata
-                        st.caption(f"**Chat ID:** `{self.chat_id}`")
+                        st.caption(f"**Chat ID:** `{chat_id}`")
                         st.caption(f"**Created:** {created_time.strftime('%Y-%m-%d at %I:%M %p')}")
                         st.caption(f"**Last Used:** {last_accessed.strftime('%Y-%m-%d at %I:%M %p')}")
                         st.divider()
@@ -178,6 +193,8 @@ class StreamlitUI:
             except Exception as e:
                 st.error(f"Error loading chat history: {str(e)}")
             
+            self.summary_jobs_panel()
+            
             st.header("ℹ️ About")
             st.write("This is your IntelliTube chat assistant. You can:")
             st.write("- Ask questions about documents")
@@ -195,6 +212,77 @@ class StreamlitUI:
                 self.chat_manager.save_chat()
                 st.success("Chat saved!")
     
+    def summary_jobs_panel(self) -> None:
+        """Shows the background summaries of this chat's sources, polled every few seconds."""
+        queue = st.session_state.get("summary_job_queue")
+        if not queue:
+            return
+
+        @st.fragment(run_every=3)
+        def jobs_panel() -> None:
+            jobs = queue.jobs_of_chat(self.chat_id)
+            if not jobs:
+                return
+            st.header("📝 Summaries")
+            for job in jobs:
+                if job.status == "done":
+                    with st.expander(f"✅ {job.source}"):
+                        st.write(job.summary)
+                elif job.status == "failed":
+                    st.error(f"Summary of {job.source} failed: {job.error}")
+                else:
+                    st.caption(f"⏳ {job.source} ({job.status}, {job.stage or 'waiting'})")
+                    st.progress(job.progress)
+            st.divider()
+
+        jobs_panel()
+    
+    @staticmethod
+    def _chunk_text(chunk: AIMessage) -> str:
+        if isinstance(chunk.content, str):
+            return chunk.content
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in chunk.content
+        )
+    
+    def stream_agent_response(self, turn: Dict[str, Any]) -> Iterator[str]:
+        """Runs the agent on the chat messages and yields the chat agent's response token by token.
+
+        The final graph state is stored in `turn["result"]`, and the time-to-first-token \
+        (seconds from the user's message to the first token on screen) in `turn["ttft"]`.
+        """
+        turn_start = time.perf_counter()
+        stream = self.agent.astream(
+            {"messages": self.chat_manager.chat_messages},
+            stream_mode=["messages", "values"],
+        )
+        for mode, data in iter_over_async(stream):
+            if mode == "values":
+                turn["result"] = data
+                continue
+
+            chunk, metadata = data
+            # skip the router's (structured output) tokens, only the answer is shown;
+            # a cached answer arrives as one whole `AIMessage` instead of chunks
+            if metadata.get("langgraph_node") != "chat_agent" or not isinstance(chunk, AIMessage):
+                continue
+            text = self._chunk_text(chunk)
+            if not text:
+                continue
+            if turn.get("ttft") is None:
+                turn["ttft"] = time.perf_counter() - turn_start
+            yield text
+    
+    def record_ttft(self, ttft: Optional[float]) -> None:
+        """Keeps the per-turn time-to-first-token in the session & the chat's additional data."""
+        if ttft is None:
+            return
+        ttft_ms = round(ttft * 1000, 2)
+        st.session_state.ttft_history.append(ttft_ms)
+        self.chat_manager.chat.additional_data.setdefault("ttft_ms", []).append(ttft_ms)
+        logger.info(f"Time to first token: {ttft_ms} ms")
+
     def process_chat_page_user_input(self) -> None:
         # chat input
         user_input = st.chat_input("Type your message here...")
@@ -216,24 +304,29 @@ class StreamlitUI:
             
             # Process with agent
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    # Create HumanMessage and add to chat manager
-                    usr_msg = HumanMessage(user_input)
-                    self.chat_manager.add_message(usr_msg)
-                    
-                    # Get agent response
-                    result = self.agent.invoke({"messages": self.chat_manager.chat_messages})
-                    self.chat_manager.chat_messages = result["messages"]
-                    
-                    # Get the AI response
-                    ai_msg = self.chat_manager.chat_messages[-1]
-                    
-                    # Add messages to session state first
-                    self.chat_messages.extend([HumanMessage(user_input), ai_msg])
-                    
-                # Display AI response (outside spinner to avoid fading)
-                st.write(ai_msg.content)
+                # Create HumanMessage and add to chat manager
+                usr_msg = HumanMessage(user_input)
+                self.chat_manager.add_message(usr_msg)
+                
+                # Stream the agent response, token by token
+                turn: Dict[str, Any] = {}
+                st.write_stream(self.stream_agent_response(turn))
+                self.record_ttft(turn.get("ttft"))
+                
+                self.chat_manager.chat_messages = turn["result"]["messages"]
+                if turn["result"].get("router_metrics"):
+                    self.chat_manager.chat.additional_data.setdefault("router_metrics", []).append(
+                        turn["result"]["router_metrics"].model_dump()
+                    )
+                
+                # Get the AI response
+                ai_msg = self.chat_manager.chat_messages[-1]
+                
+                # Add messages to session state
+                self.chat_messages.extend([HumanMessage(user_input), ai_msg])
     
     def chat_page_footer(self) -> None:
         st.divider()
+        if st.session_state.get("ttft_history"):
+            st.caption(f"First token after: {st.session_state.ttft_history[-1]:.0f} ms")
         st.caption("Built with IntelliTube 🚀")
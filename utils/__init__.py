@@ -1,15 +1,65 @@
 from .cacher import Cacher
+from .token_counter import TokenCounter, estimate_num_tokens
+from .concurrency import (
+    AsyncRateLimiter,
+    get_executor,
+    run_in_threadpool,
+    iter_over_async,
+    get_background_loop,
+    run_coroutine_sync,
+    retry_with_backoff,
+)
+from .download_cache import (
+    DownloadCache,
+    DownloadCacheStats,
+    get_download_cache,
+)
+from .speech_to_text import (
+    SpeechToText,
+    get_speech_to_text,
+    iter_audio_segments,
+    is_speech_to_text_available,
+)
 from .youtube import (
     YTContentData,
+    YouTubeSearchCache,
     search_youtube,
+    search_youtube_batch,
+    normalize_search_query,
+    get_youtube_search_cache,
+    get_youtube_dl,
+    expand_youtube_urls,
+    cached_youtube_content,
+    fetch_youtube_subtitles,
+    fetch_youtube_transcript,
+    transcribe_youtube_audio,
+    aiter_youtube_downloads,
     download_youtube_content,
     download_youtube_audio_or_transcript,
+    extract_youtube_video_id,
+    is_youtube_host,
+    canonical_source_key,
+    youtube_timestamp_url,
 )
 from .video_transcript import (
+    WebVTTCue,
+    TranscriptDedupStats,
+    iter_webvtt_cues,
+    dedupe_rolling_cues,
+    is_auto_caption_webvtt,
+    chunk_transcript_cues,
+    cues_2_webvtt,
     webvtt_2_json,
     webvtt_2_langchain_documents,
     webvtt_2_str,
 )
+from .chat_storage import (
+    ChatStorage,
+    SQLiteChatStorage,
+    FileChatStorage,
+    get_chat_storage,
+    migrate_chat_storage,
+)
 from .chat_manager import (
     ChatInfo,
     Chat,
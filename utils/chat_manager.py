@@ -5,16 +5,12 @@ import shutil
 from pathlib import Path
 from loguru import logger
 from datetime import datetime
-from typing_extensions import Any, List, Dict, TypedDict, Optional, Union
+from typing_extensions import Any, List, Dict, Optional, Union
 
 from pydantic import BaseModel
 from langchain_core.messages import BaseMessage
 
-
-class ChatInfo(TypedDict):
-    chat_id: str
-    created_timestamp: float
-    last_accessed_timestamp: float
+from .chat_storage import ChatInfo, ChatStorage, ChatStorageBackend, get_chat_storage
 
 
 class Chat(BaseModel):
@@ -23,194 +19,303 @@ class Chat(BaseModel):
 
 
 class ChatManager:
+    """Creates, resumes & saves a chat through a `ChatStorage` backend (SQLite by default).
+
+    A resumed chat's messages are read from the storage on first access, optionally only the \
+    last few of them (see `from_chat_history()`), and saving appends only the messages added \
+    since the last save.
+    """
     _root_dir: Path = Path("test_data/chat_history")
     _chats_dir: str = "chats"   # container of: chat-messages + vector-database
     _chat_id: str = ""
-    
-    _chat_filename: str = "chat_messages.json"
-    _chatlist_filename: str = "chatlist.json"
+
+    _chat_filename: str = "chat_messages.jsonl"
+    _chatlist_filename: str = "chats.sqlite3"
     _chatlist_filepath: Path = None
-    
+
     _chat_dirpath: Path = None
     _chat_filepath: Path = None
 
-    _chat: Chat = Chat(messages=[])
-    _chat_list: Dict[str, ChatInfo] = {}
-    
+    _storage_backend: ChatStorageBackend = "sqlite"
+    _storage: ChatStorage = None
+    _chat: Chat = None
+    _chat_list: Dict[str, ChatInfo] = None
+
     @property
     def root_dir(self) -> Path:
         if not isinstance(self._root_dir, Path):
             self._root_dir = Path(self._root_dir)
         return self._root_dir
-    
+
     @root_dir.setter
     def root_dir(self, path: Union[Path, str]) -> None:
         if not isinstance(path, Path):
             path = Path(path)
-        
+
         # create the folder along with the parent directories if they dont exist already
         dirpath = path / self.chats_dir
         dirpath.mkdir(parents=True, exist_ok=True)
-        
+
         # set the paths
         self._root_dir = path
         self._chatlist_filepath = self.root_dir / self.chatlist_filename
-        
-        # create `chat_list.json` if it does not exist already
-        if not self.chatlist_filepath.exists():
-            self.chatlist_filepath.write_text(
-                json.dumps(self._chat_list, indent=4)
-            )
-    
+        if not self._storage_given:
+            self._storage = get_chat_storage(path, self._storage_backend)
+
+    @property
+    def storage(self) -> ChatStorage:
+        return self._storage
+
     @property
     def chats_dir(self) -> str:
         return self._chats_dir
-    
+
     @property
     def chat_id(self) -> str:
         if not self._chat_id:
             self._chat_id = str(uuid.uuid4())
         return self._chat_id
-    
+
     @property
     def chat_filename(self) -> str:
         return self._chat_filename
-    
+
     @property
     def chatlist_filename(self) -> str:
         return self._chatlist_filename
-    
+
     @property
     def chatlist_filepath(self) -> Path:
         if not isinstance(self._chatlist_filepath, Path):
             self._chatlist_filepath = Path(self._chatlist_filepath)
         return self._chatlist_filepath
-    
+
     @property
     def chat_dirpath(self) -> Path:
         if not self._chat_dirpath:
             self._chat_dirpath = self.root_dir / self.chats_dir / self.chat_id
         return self._chat_dirpath
-    
+
     @property
     def chat_filepath(self) -> Path:
         if not self._chat_filepath:
             self._chat_filepath = self.chat_dirpath / self.chat_filename
         return self._chat_filepath
-    
+
     @property
     def chatlist(self) -> Dict[str, ChatInfo]:
+        """All the chats; prefer the paginated `list_chats()` for large histories."""
         if not self._chat_list:
             self._chat_list = self.load_chatlist()
         return self._chat_list
-    
+
     @property
     def chat(self) -> Chat:
+        if self._chat is None:
+            self._chat = self._load_chat()
         return self._chat
-    
+
     @property
     def chat_messages(self) -> List[BaseMessage]:
         return self.chat.messages
-    
+
     @chat_messages.setter
     def chat_messages(self, messages: List[BaseMessage]) -> None:
-        self._chat.messages = messages
-    
+        self.chat.messages = messages
+
     @staticmethod
     def new_chat(chat_id: Optional[str] = None, root_dir: Optional[str] = None) -> 'ChatManager':
         _manager = ChatManager(root_dir, chat_id=chat_id)
 
-        if _manager.chatlist.get(_manager.chat_id, None):
+        if _manager.storage.get_chat_info(_manager.chat_id):
             raise ValueError(f"Given chat_id={_manager.chat_id} already exists. Please provide an unique chat id.")
 
         # create the folers
         _manager.chat_dirpath.mkdir(parents=True, exist_ok=True)
-        
+
         _dt_now_ts = datetime.timestamp(datetime.now())
-        _manager.chatlist[_manager.chat_id] = ChatInfo(
+        _manager.storage.save_chat_info(ChatInfo(
             chat_id=_manager.chat_id,
             created_timestamp=_dt_now_ts,
             last_accessed_timestamp=_dt_now_ts,
-        )
+        ))
+        _manager._chat = Chat(messages=[])
         return _manager
-    
+
+    @property
+    def num_older_messages(self) -> int:
+        """Saved messages before the loaded ones, see `load_older_messages()`."""
+        if self._chat is None:
+            self._chat = self._load_chat()
+        return self._window_start
+
     @staticmethod
-    def from_chat_history(chat_id: str) -> 'ChatManager':
+    def from_chat_history(chat_id: str, last_n: Optional[int] = None) -> 'ChatManager':
+        """Resumes a chat, its messages are loaded on first access.
+
+        Args:
+            chat_id (str): id of the chat to resume.
+            last_n (Optional[int], optional): Load only the last `last_n` messages, the older ones \
+                are read on demand with `load_older_messages()`. Defaults to None (all of them).
+        """
         _manager = ChatManager(chat_id=chat_id)
-        _chatlist = _manager.chatlist
-        
-        if not _chatlist.get(_manager.chat_id, None):
+
+        if not _manager.storage.get_chat_info(_manager.chat_id):
             raise Exception(f"Invalid chat_id: {_manager.chat_id}")
-        
-        with open(_manager.get_chat_dirpath(_manager.chat_id), 'r') as chat_file:
-            _manager._chat = Chat(**json.load(chat_file))
+        _manager._history_window = last_n
         return _manager
-    
+
     def __init__(self,
         root_dir: Optional[Union[Path, str]] = None,
         chat_id: Optional[str] = None,
         chatlist: Optional[Dict[str, ChatInfo]] = None,
-        chat: Optional[Chat] = None
+        chat: Optional[Chat] = None,
+        storage: Optional[ChatStorage] = None,
     ) -> None:
+        """
+        Args:
+            root_dir (Optional[Union[Path, str]], optional): Folder of the chats. Defaults to `test_data/chat_history`.
+            chat_id (Optional[str], optional): Defaults to a new uuid4.
+            chatlist (Optional[Dict[str, ChatInfo]], optional): Chats to add to the chat list. Defaults to None.
+            chat (Optional[Chat], optional): The chat's contents, saved as new messages. Defaults to None.
+            storage (Optional[ChatStorage], optional): Where the chats are kept. \
+                Defaults to the process-wide SQLite storage of `root_dir` (see `get_chat_storage()`).
+        """
+        # per instance state: a class-level default would be shared by all the managers
+        self._storage_given = storage is not None
+        self._storage = storage
+        self._chat = chat
+        self._chat_list = None
+        self._saved_messages: List[BaseMessage] = []
+        self._history_window: Optional[int] = None
+        # storage position of the first loaded message
+        self._window_start: int = 0
+        self._saved_additional_data: Optional[str] = None
+
         self.root_dir = root_dir or self._root_dir
 
         if chat_id: self._chat_id = chat_id
-        if chatlist: self._chat_list = chatlist
-        if chat: self._chat = chat
-    
+        if chatlist:
+            for chat_info in chatlist.values():
+                self.storage.save_chat_info(chat_info)
+
     def __del__(self) -> None:
-        """Delete the chat folder if it's empty; save it otherwise."""
+        """Delete the chat if it was never used; save it otherwise."""
         try:
-            if not list(self.chat_dirpath.iterdir()):
-                self.chat_dirpath.rmdir()
-            else:
+            if self._chat is None:
+                return  # resumed but never read: nothing to save
+
+            if self.chat_messages or self.chat.additional_data:
                 self.save_chat()
+            elif (
+                not self.storage.count_messages(self.chat_id)
+                and self.chat_dirpath.exists() and not list(self.chat_dirpath.iterdir())
+            ):
+                self.chat_dirpath.rmdir()
+                self.storage.delete_chat(self.chat_id)
         except Exception as e:
             logger.error(str(e))
 
     def load_chatlist(self) -> Dict[str, ChatInfo]:
-        with open(self._chatlist_filepath, 'r') as chat_list_file:
-            return json.load(chat_list_file)
-    
+        return {chat_info["chat_id"]: chat_info for chat_info in self.storage.list_chats()}
+
     def refresh_chatlist(self) -> Dict[str, ChatInfo]:
         self._chat_list = self.load_chatlist()
         return self._chat_list
-    
-    def _save_chatlist(self) -> None:
-        with open(self._chatlist_filepath, 'w') as chat_list_file:
-            json.dump(self._chat_list, chat_list_file, indent=4)
-    
+
+    def list_chats(self, limit: Optional[int] = None, offset: int = 0) -> List[ChatInfo]:
+        """A page of the chats, the most recently accessed first."""
+        return self.storage.list_chats(limit=limit, offset=offset)
+
+    def count_chats(self) -> int:
+        return self.storage.count_chats()
+
     def get_chat_dirpath(self, chat_id: str) -> Path:
-        return self.root_dir / self.chats_dir / chat_id / self.chat_filename
+        return self.root_dir / self.chats_dir / chat_id
+
+    def _load_chat(self) -> Chat:
+        self._window_start = 0
+        if self._history_window is not None:
+            n_messages = self.storage.count_messages(self.chat_id)
+            self._window_start = max(0, n_messages - self._history_window)
+
+        messages = list(self.storage.iter_messages(self.chat_id, start=self._window_start))
+        additional_data = self.storage.load_additional_data(self.chat_id)
+
+        self._saved_messages = list(messages)
+        self._saved_additional_data = json.dumps(additional_data, default=str)
+        return Chat(messages=messages, additional_data=additional_data)
+
+    def load_older_messages(self, n: int) -> List[BaseMessage]:
+        """Reads up to `n` of the saved messages before the loaded ones, and prepends them \
+        to `chat_messages`. Returns them, an empty list once the whole chat is loaded."""
+        stop = self.num_older_messages
+        start = max(0, stop - n)
+        older_messages = list(self.storage.iter_messages(self.chat_id, start=start, stop=stop))
+
+        self.chat.messages[:0] = older_messages
+        self._saved_messages[:0] = older_messages
+        self._window_start = start
+        return older_messages
+
+    def _save_chat(self) -> None:
+        if self._chat is None:
+            return  # never loaded, nothing changed
+
+        messages = self.chat_messages
+        saved = self._saved_messages
+
+        # the saved messages were replaced (e.g. the chat was cleared): they can't be appended to,
+        # the whole history is replaced, including the older messages that were not loaded
+        appendable = len(messages) >= len(saved) and all(
+            new is old or new == old for new, old in zip(messages, saved)
+        )
+        if not appendable:
+            self.storage.replace_messages(self.chat_id, messages)
+            self._window_start = 0
+        elif len(messages) > len(saved):
+            self.storage.append_messages(self.chat_id, messages[len(saved):])
+        self._saved_messages = list(messages)
+
+        additional_data = json.dumps(self.chat.additional_data, default=str)
+        if additional_data != self._saved_additional_data:
+            self.storage.save_additional_data(self.chat_id, self.chat.additional_data)
+            self._saved_additional_data = additional_data
 
-    def _save_chat(self, indent: int = 4) -> None:
-        with open(self.get_chat_dirpath(self._chat_id), 'w') as chat_file:
-            json.dump(self.chat.model_dump(), chat_file, indent=indent)
-    
     def save_chat(self) -> None:
-        self.chatlist[self.chat_id]["last_accessed_timestamp"] = (
-            datetime.timestamp(datetime.now())
+        _dt_now_ts = datetime.timestamp(datetime.now())
+        chat_info = self.storage.get_chat_info(self.chat_id) or ChatInfo(
+            chat_id=self.chat_id, created_timestamp=_dt_now_ts, last_accessed_timestamp=_dt_now_ts
         )
+        chat_info["last_accessed_timestamp"] = _dt_now_ts
         self._save_chat()
-        self._save_chatlist()
-    
+        self.storage.save_chat_info(chat_info)
+        if self._chat_list is not None:
+            self._chat_list[self.chat_id] = chat_info
+
     def delete_current_chat(self) -> None:
         shutil.rmtree(self.chat_dirpath)
-    
+        self.storage.delete_chat(self.chat_id)
+        if self._chat_list is not None:
+            self._chat_list.pop(self.chat_id, None)
+
     def delete_chat(self, chat_id: str) -> None:
         """Raises `FileNotFoundError` if the chat folder does not exist."""
         shutil.rmtree(self.get_chat_dirpath(chat_id))
-    
+        self.storage.delete_chat(chat_id)
+        if self._chat_list is not None:
+            self._chat_list.pop(chat_id, None)
+
     def add_message(self, message: BaseMessage) -> None:
         self.chat.messages.append(message)
-    
+
     def remove_unlisted_chats(self, excluded_ids: Optional[List[str]] = None) -> None:
-        """Remove the chats that are not in the `chatlist.json`.
-        
+        """Remove the chats that are not in the chat list.
+
         Args:
-            excluded_ids (Optional[List[str]], optional): List of ids to exclude that are not in `chatlist.json`. Defaults to None.
+            excluded_ids (Optional[List[str]], optional): List of ids to exclude that are not in the chat list. Defaults to None.
         """
-        
+
         chats_dirpath = self.root_dir / self.chats_dir
         chat_ids = set([path.stem for path in chats_dirpath.iterdir()])
         excluded_ids = set((excluded_ids or []) + [self.chat_id] + list(self.chatlist.keys()))
@@ -0,0 +1,463 @@
+"""Storage backends of the chat history"""
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from loguru import logger
+from typing_extensions import Any, Dict, Iterator, List, Literal, Optional, Tuple, TypedDict, Union
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the chat logs are then only safe for one writer at a time
+    fcntl = None
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+
+class ChatInfo(TypedDict):
+    chat_id: str
+    created_timestamp: float
+    last_accessed_timestamp: float
+
+
+ChatStorageBackend = Literal["sqlite", "file"]
+
+
+class ChatStorage(ABC):
+    """Where `ChatManager` keeps the chat list, and the messages & additional data of every chat.
+
+    Messages are addressed by their position in the chat, so a backend can read a range of \
+    them without loading the whole history.
+    """
+
+    # ========== CHAT LIST ==========
+
+    @abstractmethod
+    def get_chat_info(self, chat_id: str) -> Optional[ChatInfo]:
+        ...
+
+    @abstractmethod
+    def save_chat_info(self, chat_info: ChatInfo) -> None:
+        """Inserts the chat, or updates its `last_accessed_timestamp`."""
+
+    @abstractmethod
+    def list_chats(self, limit: Optional[int] = None, offset: int = 0) -> List[ChatInfo]:
+        """The chats, the most recently accessed first."""
+
+    @abstractmethod
+    def count_chats(self) -> int:
+        ...
+
+    @abstractmethod
+    def delete_chat(self, chat_id: str) -> None:
+        """Removes the chat from the list, along with its messages & data."""
+
+    # ========== MESSAGES ==========
+
+    @abstractmethod
+    def count_messages(self, chat_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def iter_messages(self, chat_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[BaseMessage]:
+        """Yields the messages from position `start` up to (excluding) `stop`."""
+
+    @abstractmethod
+    def append_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        ...
+
+    @abstractmethod
+    def replace_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        """Overwrites all the messages of the chat."""
+
+    @abstractmethod
+    def load_additional_data(self, chat_id: str) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def save_additional_data(self, chat_id: str, additional_data: Dict[str, Any]) -> None:
+        ...
+
+
+class SQLiteChatIndex(ChatStorage):
+    """Chat list kept in the `chats` table of a SQLite database, indexed by the last access."""
+
+    def __init__(self, db_path: Union[Path, str]) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chats ("
+            "chat_id TEXT PRIMARY KEY, created_timestamp REAL NOT NULL, last_accessed_timestamp REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS chats_last_accessed ON chats (last_accessed_timestamp DESC)"
+        )
+        self._db.commit()
+
+    def get_chat_info(self, chat_id: str) -> Optional[ChatInfo]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT chat_id, created_timestamp, last_accessed_timestamp FROM chats WHERE chat_id = ?",
+                (chat_id,)
+            ).fetchone()
+        return ChatInfo(chat_id=row[0], created_timestamp=row[1], last_accessed_timestamp=row[2]) if row else None
+
+    def save_chat_info(self, chat_info: ChatInfo) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO chats (chat_id, created_timestamp, last_accessed_timestamp) "
+                "VALUES (:chat_id, :created_timestamp, :last_accessed_timestamp) "
+                "ON CONFLICT (chat_id) DO UPDATE SET last_accessed_timestamp = excluded.last_accessed_timestamp",
+                dict(chat_info)
+            )
+            self._db.commit()
+
+    def list_chats(self, limit: Optional[int] = None, offset: int = 0) -> List[ChatInfo]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chat_id, created_timestamp, last_accessed_timestamp FROM chats "
+                "ORDER BY last_accessed_timestamp DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [ChatInfo(chat_id=row[0], created_timestamp=row[1], last_accessed_timestamp=row[2]) for row in rows]
+
+    def count_chats(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def delete_chat(self, chat_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class SQLiteChatStorage(SQLiteChatIndex):
+    """The chat list & the messages in one SQLite database (WAL mode), one row per message.
+
+    Saving a turn inserts its new rows only, and any range of messages is read through the \
+    `(chat_id, position)` primary key.
+    """
+    db_filename: str = "chats.sqlite3"
+
+    def __init__(self, root_dir: Union[Path, str]) -> None:
+        self._root_dir = Path(root_dir)
+        self._root_dir.mkdir(parents=True, exist_ok=True)
+        super().__init__(self._root_dir / self.db_filename)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "chat_id TEXT NOT NULL, position INTEGER NOT NULL, message TEXT NOT NULL, "
+            "PRIMARY KEY (chat_id, position)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_data (chat_id TEXT PRIMARY KEY, additional_data TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def delete_chat(self, chat_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+            self._db.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            self._db.execute("DELETE FROM chat_data WHERE chat_id = ?", (chat_id,))
+            self._db.commit()
+
+    def count_messages(self, chat_id: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()[0]
+
+    def iter_messages(self, chat_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[BaseMessage]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT message FROM messages WHERE chat_id = ? AND position >= ? AND position < ? "
+                "ORDER BY position",
+                (chat_id, start, stop if stop is not None else 2 ** 63 - 1)
+            ).fetchall()
+        for row in rows:
+            yield from messages_from_dict([json.loads(row[0])])
+
+    def _insert_messages(self, chat_id: str, messages: List[BaseMessage], start: int) -> None:
+        self._db.executemany(
+            "INSERT INTO messages (chat_id, position, message) VALUES (?, ?, ?)",
+            [
+                (chat_id, start + i, json.dumps(message, default=str))
+                for i, message in enumerate(messages_to_dict(messages))
+            ]
+        )
+
+    def append_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        with self._lock:
+            start = self._db.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()[0]
+            self._insert_messages(chat_id, messages, start)
+            self._db.commit()
+
+    def replace_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            self._insert_messages(chat_id, messages, 0)
+            self._db.commit()
+
+    def load_additional_data(self, chat_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT additional_data FROM chat_data WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_additional_data(self, chat_id: str, additional_data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_data (chat_id, additional_data) VALUES (?, ?)",
+                (chat_id, json.dumps(additional_data, default=str))
+            )
+            self._db.commit()
+
+
+class FileChatStorage(SQLiteChatIndex):
+    """Every chat's messages in an append-only JSONL log inside its folder, \
+    `<root_dir>/chats/<chat_id>/chat_messages.jsonl`, and the chat list in `chatlist.sqlite3`.
+
+    Appends are one write per record, so concurrent writers never interleave within a line. \
+    The log is compacted into a snapshot, atomically (temp file + rename), once it holds \
+    too many stale records. Appends & compactions hold a file lock (`fcntl.flock`) of the chat, \
+    so they're safe across threads and processes. The older `chatlist.json` & \
+    `chat_messages.json` files are imported on first use.
+    """
+    chats_dir: str = "chats"
+    chat_filename: str = "chat_messages.jsonl"
+    # the log is replaced on compaction, so it's locked through a file of its own
+    lock_filename: str = "chat_messages.lock"
+    chatlist_filename: str = "chatlist.sqlite3"
+    legacy_chat_filename: str = "chat_messages.json"
+    legacy_chatlist_filename: str = "chatlist.json"
+    # the log is compacted once it has this many records more than a snapshot would
+    compaction_threshold: int = 200
+
+    def __init__(self, root_dir: Union[Path, str]) -> None:
+        self._root_dir = Path(root_dir)
+        (self._root_dir / self.chats_dir).mkdir(parents=True, exist_ok=True)
+        super().__init__(self._root_dir / self.chatlist_filename)
+        # chat_id -> the log's (inode, bytes) when counted, and its (messages, records)
+        self._log_sizes: Dict[str, Tuple[Optional[Tuple[int, int]], List[int]]] = {}
+
+        # import the chats of the old `chatlist.json`, once
+        legacy_filepath = self._root_dir / self.legacy_chatlist_filename
+        if legacy_filepath.exists():
+            legacy_chatlist: Dict[str, ChatInfo] = json.loads(legacy_filepath.read_text() or "{}")
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO chats (chat_id, created_timestamp, last_accessed_timestamp) "
+                    "VALUES (:chat_id, :created_timestamp, :last_accessed_timestamp)",
+                    list(legacy_chatlist.values())
+                )
+                self._db.commit()
+            legacy_filepath.rename(legacy_filepath.with_suffix(".json.migrated"))
+            logger.info(f"Migrated {len(legacy_chatlist)} chats to: {self._root_dir / self.chatlist_filename}")
+
+    def chat_filepath(self, chat_id: str) -> Path:
+        filepath = self._root_dir / self.chats_dir / chat_id / self.chat_filename
+        legacy_filepath = filepath.with_name(self.legacy_chat_filename)
+        if not filepath.exists() and legacy_filepath.exists():
+            # convert the old single-JSON chat into a log
+            legacy_chat = json.loads(legacy_filepath.read_text())
+            messages = messages_from_dict([
+                {"type": message["type"], "data": message} for message in legacy_chat["messages"]
+            ])
+            self._write_snapshot(filepath, messages, legacy_chat.get("additional_data", {}))
+            legacy_filepath.rename(legacy_filepath.with_suffix(".json.migrated"))
+        return filepath
+
+    def _iter_records(self, chat_id: str) -> Iterator[Dict[str, Any]]:
+        filepath = self.chat_filepath(chat_id)
+        if not filepath.exists():
+            return
+        with open(filepath, 'r') as chat_file:
+            for line in chat_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # a torn write at the end of the log (e.g. the process was killed)
+                    logger.warning(f"Skipping a corrupt record in: {filepath}")
+
+    @contextmanager
+    def _chat_lock(self, chat_id: str) -> Iterator[None]:
+        """Exclusive lock of the chat's log, across threads & processes."""
+        lock_filepath = self._root_dir / self.chats_dir / chat_id / self.lock_filename
+        lock_filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_filepath, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            # released when the file is closed
+            yield
+
+    @staticmethod
+    def _file_version(filepath: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _log_size(self, chat_id: str) -> List[int]:
+        """(messages, records) of the chat's log, counted again if another process changed it."""
+        version = self._file_version(self.chat_filepath(chat_id))
+        cached = self._log_sizes.get(chat_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        size = [0, 0]
+        for record in self._iter_records(chat_id):
+            size[0] += "message" in record
+            size[1] += 1
+        self._log_sizes[chat_id] = (version, size)
+        return size
+
+    def _write_snapshot(self, filepath: Path, messages: List[BaseMessage], additional_data: Dict[str, Any]) -> None:
+        records = [{"message": message} for message in messages_to_dict(messages)]
+        records.append({"additional_data": additional_data})
+
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        temp_filepath = filepath.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_filepath, 'w') as chat_file:
+            chat_file.writelines(json.dumps(record, default=str) + "\n" for record in records)
+            chat_file.flush()
+            os.fsync(chat_file.fileno())
+        os.replace(temp_filepath, filepath)
+        self._log_sizes[filepath.parent.name] = (self._file_version(filepath), [len(messages), len(records)])
+
+    def _append_records(self, chat_id: str, records: List[Dict[str, Any]]) -> None:
+        with self._chat_lock(chat_id):
+            # counted under the lock: another process may have appended or compacted since
+            size = self._log_size(chat_id)
+            filepath = self.chat_filepath(chat_id)
+            with open(filepath, 'a') as chat_file:
+                for record in records:
+                    chat_file.write(json.dumps(record, default=str) + "\n")
+                    chat_file.flush()
+                os.fsync(chat_file.fileno())
+            size[0] += sum("message" in record for record in records)
+            size[1] += len(records)
+            self._log_sizes[chat_id] = (self._file_version(filepath), size)
+
+            # a snapshot needs one record per message + one for the additional data
+            if size[1] - (size[0] + 1) > self.compaction_threshold:
+                self._compact(chat_id)
+
+    def _compact(self, chat_id: str) -> None:
+        self._write_snapshot(
+            self.chat_filepath(chat_id), list(self.iter_messages(chat_id)), self.load_additional_data(chat_id)
+        )
+
+    def compact(self, chat_id: str) -> None:
+        """Rewrites the chat's log as a snapshot of its messages & latest additional data."""
+        with self._chat_lock(chat_id):
+            self._compact(chat_id)
+
+    def delete_chat(self, chat_id: str) -> None:
+        super().delete_chat(chat_id)
+        self._log_sizes.pop(chat_id, None)
+        chat_dirpath = self._root_dir / self.chats_dir / chat_id
+        # e.g. `ChatManager.delete_chat()` removed the folder already: locking would create it again
+        if not chat_dirpath.is_dir():
+            return
+        with self._chat_lock(chat_id):
+            self._log_sizes.pop(chat_id, None)
+            (chat_dirpath / self.chat_filename).unlink(missing_ok=True)
+        (chat_dirpath / self.lock_filename).unlink(missing_ok=True)
+        try:
+            chat_dirpath.rmdir()
+        except OSError:
+            # other files of the chat (e.g. its vector store) are not ours to delete
+            pass
+
+    def count_messages(self, chat_id: str) -> int:
+        return self._log_size(chat_id)[0]
+
+    def iter_messages(self, chat_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[BaseMessage]:
+        position = 0
+        for record in self._iter_records(chat_id):
+            if "message" not in record:
+                continue
+            if stop is not None and position >= stop:
+                break
+            if position >= start:
+                yield from messages_from_dict([record["message"]])
+            position += 1
+
+    def append_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        self._append_records(chat_id, [{"message": message} for message in messages_to_dict(messages)])
+
+    def replace_messages(self, chat_id: str, messages: List[BaseMessage]) -> None:
+        with self._chat_lock(chat_id):
+            self._write_snapshot(self.chat_filepath(chat_id), messages, self.load_additional_data(chat_id))
+
+    def load_additional_data(self, chat_id: str) -> Dict[str, Any]:
+        additional_data = {}
+        for record in self._iter_records(chat_id):
+            if "additional_data" in record:
+                additional_data = record["additional_data"]
+        return additional_data
+
+    def save_additional_data(self, chat_id: str, additional_data: Dict[str, Any]) -> None:
+        self._append_records(chat_id, [{"additional_data": additional_data}])
+
+
+def migrate_chat_storage(source: ChatStorage, target: ChatStorage) -> int:
+    """Copies every chat of `source` into `target`, returns the number of chats copied."""
+    chats = source.list_chats()
+    for chat_info in chats:
+        chat_id = chat_info["chat_id"]
+        target.save_chat_info(chat_info)
+        target.replace_messages(chat_id, list(source.iter_messages(chat_id)))
+        target.save_additional_data(chat_id, source.load_additional_data(chat_id))
+    return len(chats)
+
+
+# ========== PROCESS-WIDE STORAGE ==========
+
+_chat_storages: Dict[tuple, ChatStorage] = {}
+_chat_storages_lock = threading.Lock()
+
+
+def get_chat_storage(root_dir: Union[Path, str], backend: ChatStorageBackend = "sqlite") -> ChatStorage:
+    """Returns the process-wide chat storage of `root_dir`.
+
+    The first time the SQLite backend opens a folder that has chats in the file layout \
+    (`chatlist.json` or `chatlist.sqlite3`), they are migrated into it.
+    """
+    root_dir = Path(root_dir).resolve()
+    key = (root_dir, backend)
+    with _chat_storages_lock:
+        storage = _chat_storages.get(key)
+        if storage is None:
+            if backend == "file":
+                storage = FileChatStorage(root_dir)
+            elif backend == "sqlite":
+                is_new = not (root_dir / SQLiteChatStorage.db_filename).exists()
+                storage = SQLiteChatStorage(root_dir)
+                has_file_layout = any(
+                    (root_dir / filename).exists()
+                    for filename in (FileChatStorage.chatlist_filename, FileChatStorage.legacy_chatlist_filename)
+                )
+                if is_new and has_file_layout:
+                    file_storage = FileChatStorage(root_dir)
+                    n_chats = migrate_chat_storage(file_storage, storage)
+                    file_storage.close()
+                    logger.info(f"Migrated {n_chats} chats to: {root_dir / SQLiteChatStorage.db_filename}")
+            else:
+                raise ValueError(f"Unknown chat storage backend: {backend}")
+            _chat_storages[key] = storage
+    return storage
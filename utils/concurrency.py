@@ -0,0 +1,227 @@
+import os
+import time
+import random
+import asyncio
+import functools
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from typing_extensions import (
+    Any, AsyncIterator, Awaitable, Callable, Deque, Iterator, Optional, Tuple, Type, TypeVar
+)
+
+T = TypeVar("T")
+
+# blocking calls (downloads, file parsing, embedding, local DB) of all the chats share this pool
+MAX_WORKERS: int = min(32, (os.cpu_count() or 1) + 4)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide, bounded thread pool for blocking library calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="intellitube"
+                )
+    return _executor
+
+
+async def run_in_threadpool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking `func(*args, **kwargs)` on the shared thread pool, without blocking the event loop.
+    The context variables (e.g. LangChain's callbacks & tracing) are carried over to the worker thread."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Returns the process-wide event loop, running forever in a daemon thread.
+
+    The sync code (Streamlit's script thread, the sync wrappers) submits its coroutines to this one loop, \
+    instead of a new loop per call: the process-wide async clients (LLM & HTTP sessions, cached models) \
+    are bound to the loop they were first used in, and fail with "Event loop is closed" on any other.
+    """
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="intellitube-event-loop", daemon=True
+                ).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def run_coroutine_sync(awaitable: Awaitable[T]) -> T:
+    """Runs `awaitable` on the background loop (see `get_background_loop()`) and blocks until it's done.
+    The caller's context variables are carried over. Must not be called from the background loop itself."""
+    loop = get_background_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        raise RuntimeError("`run_coroutine_sync()` would block the background loop, await the coroutine instead.")
+
+    async def run() -> T:
+        return await awaitable
+
+    # the task is created in a copy of the calling thread's context (see `loop.call_soon_threadsafe()`)
+    return asyncio.run_coroutine_threadsafe(run(), loop).result()
+
+
+def iter_over_async(async_iterator: AsyncIterator[T]) -> Iterator[T]:
+    """Consumes an async iterator from sync code (e.g. to feed `st.write_stream()`),
+    driving it on the process-wide background loop (see `get_background_loop()`)."""
+    try:
+        while True:
+            try:
+                yield run_coroutine_sync(async_iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        # e.g. the consumer stopped early: close the async generator on its own loop
+        aclose = getattr(async_iterator, "aclose", None)
+        if aclose is not None:
+            run_coroutine_sync(aclose())
+
+
+class AsyncRateLimiter:
+    """Limits the calls to a rate-limited API: at most `max_concurrency` in flight (semaphore), \
+    started at no more than `requests_per_second` on average, in bursts of up to `burst` (token bucket).
+
+    Usage: `async with limiter: ...`. One limiter can be shared by many tasks, event loops & threads.
+    """
+
+    def __init__(self,
+        max_concurrency: int = 4,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            max_concurrency (int, optional): Max. number of calls in flight. Defaults to 4.
+            requests_per_second (Optional[float], optional): Average rate of new calls, \
+                None for no rate limit. Defaults to None.
+            burst (Optional[int], optional): Calls that can start at once after an idle period. \
+                Defaults to `max_concurrency`.
+        """
+        if max_concurrency < 1:
+            raise ValueError("`max_concurrency` must be at least 1.")
+        if requests_per_second is not None and requests_per_second <= 0:
+            raise ValueError("`requests_per_second` must be positive.")
+
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst or max_concurrency
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._bucket_lock = threading.Lock()
+        # the semaphore is thread-safe & loop independent (an `asyncio.Semaphore` is bound to one loop):
+        # the calls in flight are counted across every loop, the waiters are woken up FIFO on their own loop
+        self._in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._slots_lock = threading.Lock()
+
+    async def _acquire_slot(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._slots_lock:
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            # `release()` hands its slot over, `_in_flight` stays the same
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._slots_lock:
+                try:
+                    self._waiters.remove(waiter)
+                    handed_over = False
+                except ValueError:
+                    handed_over = True
+            if handed_over:
+                self.release()
+            raise
+
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def _reserve(self) -> float:
+        """Takes a token from the bucket, returns the seconds to wait until it's actually available."""
+        with self._bucket_lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.burst),
+                self._tokens + (now - self._last_refill) * self.requests_per_second
+            )
+            self._last_refill = now
+            self._tokens -= 1
+            return -self._tokens / self.requests_per_second if self._tokens < 0 else 0.0
+
+    async def acquire(self) -> None:
+        await self._acquire_slot()
+        if self.requests_per_second is not None:
+            delay = self._reserve()
+            if delay > 0:
+                try:
+                    await asyncio.sleep(delay)
+                except BaseException:
+                    # cancelled while holding the slot: `__aexit__` won't run to release it
+                    self.release()
+                    raise
+
+    def release(self) -> None:
+        with self._slots_lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(self._wake, future)
+                    return
+            self._in_flight -= 1
+
+    async def __aenter__(self) -> "AsyncRateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+async def retry_with_backoff(
+    func: Callable[[], Awaitable[T]],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+) -> T:
+    """Awaits `func()`, retrying it on failure with exponential backoff & full jitter.
+    The last error is raised after `max_retries` retries."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await func()
+        except retry_on as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"Attempt {attempt + 1} failed ({e!r}), retrying in {delay:.2f} s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,252 @@
+"""Content-addressed cache of the downloaded YouTube transcripts & audio"""
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from loguru import logger
+from typing_extensions import Dict, Literal, Optional, Union
+
+from pydantic import BaseModel
+
+
+# `speech`: 16 kHz mono audio for speech-to-text, `speech_transcript`: its WebVTT transcript
+AssetKind = Literal['transcript', 'audio', 'speech', 'speech_transcript']
+
+
+class DownloadCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    dropped: int = 0
+    """Entries removed because their file was missing or changed"""
+    evictions: int = 0
+    evicted_bytes: int = 0
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        return (
+            f"{self.hits}/{total} hits, {self.dropped} dropped, "
+            f"{self.evictions} evicted ({self.evicted_bytes / 2**20:.1f} MiB)"
+        )
+
+
+class DownloadCache:
+    """Downloads keyed by the canonical video id, the asset kind & the language.
+
+    Every file is stored once, under the sha256 of its content (`<cache_dir>/<sha[:2]>/<sha>.<ext>`), \
+    and indexed in `<cache_dir>/index.sqlite3`. An entry whose file is gone or has a different \
+    size is dropped on lookup. The least recently used entries are evicted once the cache is \
+    over `max_bytes`, and those not used for `max_age` seconds on every write; the entry just \
+    written, and those used in the last `eviction_grace` seconds (their files may still be read), \
+    are never evicted.
+    """
+    _default_cache_dir: Path = Path("test_data/cache/youtube/downloads")
+    eviction_grace: float = 60.0
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir
+
+    @property
+    def stats(self) -> DownloadCacheStats:
+        return self._stats
+
+    def __init__(self,
+        cache_dir: Optional[Union[Path, str]] = None,
+        max_bytes: Optional[int] = 2 * 2**30,
+        max_age: Optional[float] = 30 * 24 * 3600,
+    ) -> None:
+        """
+        Args:
+            cache_dir (Optional[Union[Path, str]], optional): Folder of the files & their index. \
+                Defaults to `test_data/cache/youtube/downloads`.
+            max_bytes (Optional[int], optional): Total size kept, None for no limit. Defaults to 2 GiB.
+            max_age (Optional[float], optional): Seconds an unused entry is kept, None to keep it forever. \
+                Defaults to 30 days.
+        """
+        self._cache_dir = Path(cache_dir or self._default_cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._stats = DownloadCacheStats()
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(self._cache_dir / "index.sqlite3", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, video_id TEXT NOT NULL, kind TEXT NOT NULL, language TEXT, "
+            "sha256 TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_accessed ON entries (last_accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(video_id: str, kind: AssetKind, language: Optional[str] = None) -> str:
+        return f"{video_id}:{kind}:{language or ''}"
+
+    def get(self, video_id: str, kind: AssetKind, language: Optional[str] = None) -> Optional[Path]:
+        """Path of the cached file, or None on a miss."""
+        key = self.make_key(video_id, kind, language)
+        with self._lock:
+            row = self._db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats.misses += 1
+                return None
+
+            path, size = Path(row[0]), row[1]
+            if not path.is_file() or path.stat().st_size != size:
+                logger.warning(f"Dropping a broken download cache entry: {key}")
+                self._drop_entries([(key, str(path))])
+                self._db.commit()
+                self._stats.misses += 1
+                return None
+
+            self._db.execute("UPDATE entries SET last_accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self._stats.hits += 1
+        return path
+
+    def _store_path(self, sha256: str, suffix: str) -> Path:
+        return self._cache_dir / sha256[:2] / f"{sha256}{suffix}"
+
+    def _index(self, video_id: str, kind: AssetKind, language: Optional[str], sha256: str, path: Path) -> Path:
+        key = self.make_key(video_id, kind, language)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, video_id, kind, language, sha256, path, size, created, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, video_id, kind, language, sha256, str(path), path.stat().st_size, now, now)
+            )
+            self._db.commit()
+        self.evict(keep=key)
+        return path
+
+    def put_file(self,
+        video_id: str, kind: AssetKind, src_path: Union[Path, str],
+        language: Optional[str] = None, move: bool = True,
+    ) -> Path:
+        """Stores a downloaded file (moved, or copied if `move=False`), returns its path in the cache."""
+        src_path = Path(src_path)
+        digest = hashlib.sha256()
+        with open(src_path, 'rb') as src_file:
+            for block in iter(lambda: src_file.read(2**20), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+
+        path = self._store_path(sha256, src_path.suffix)
+        if path.is_file():
+            # the same content is already stored, e.g. for another language
+            if move:
+                src_path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            (shutil.move if move else shutil.copyfile)(src_path, path)
+        return self._index(video_id, kind, language, sha256, path)
+
+    def put_bytes(self,
+        video_id: str, kind: AssetKind, content: bytes, suffix: str, language: Optional[str] = None,
+    ) -> Path:
+        """Stores the content as a file, written atomically; returns its path in the cache."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self._store_path(sha256, suffix)
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            temp_path.write_bytes(content)
+            os.replace(temp_path, path)
+        return self._index(video_id, kind, language, sha256, path)
+
+    def _drop_entries(self, rows: list) -> None:
+        """Drops the broken entries (key, path), and their files if no other entry uses them."""
+        for key, path in rows:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if not self._db.execute("SELECT 1 FROM entries WHERE path = ?", (path,)).fetchone():
+                Path(path).unlink(missing_ok=True)
+            self._stats.dropped += 1
+
+    def _remove_entries(self, rows: list) -> int:
+        """Deletes the entries (key, path, size) and the files no other entry uses; returns the bytes freed."""
+        freed = 0
+        for key, path, size in rows:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if not self._db.execute("SELECT 1 FROM entries WHERE path = ?", (path,)).fetchone():
+                Path(path).unlink(missing_ok=True)
+                freed += size
+            self._stats.evictions += 1
+        self._stats.evicted_bytes += freed
+        return freed
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Evicts the expired entries, then the least recently used ones over `max_bytes`, \
+        except the `keep` key and the entries used in the last `eviction_grace` seconds. \
+        Returns the number of bytes freed."""
+        freed = 0
+        now = time.time()
+        with self._lock:
+            if self.max_age is not None:
+                freed += self._remove_entries(self._db.execute(
+                    "SELECT key, path, size FROM entries WHERE last_accessed < ? AND key IS NOT ?",
+                    (now - max(self.max_age, self.eviction_grace), keep)
+                ).fetchall())
+
+            if self.max_bytes is not None:
+                # a file shared by several entries counts once
+                total = self._db.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT path, size FROM entries)"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    for row in self._db.execute(
+                        "SELECT key, path, size FROM entries WHERE last_accessed < ? AND key IS NOT ? "
+                        "ORDER BY last_accessed",
+                        (now - self.eviction_grace, keep)
+                    ).fetchall():
+                        removed = self._remove_entries([row])
+                        freed += removed
+                        total -= removed
+                        if total <= self.max_bytes:
+                            break
+            self._db.commit()
+
+        if freed:
+            logger.info(f"Download cache evicted {freed / 2**20:.1f} MiB: {self._stats}")
+        return freed
+
+    def verify(self) -> int:
+        """Drops every entry whose file is gone or changed size; returns how many were dropped."""
+        with self._lock:
+            broken = [
+                (key, path) for key, path, size in self._db.execute("SELECT key, path, size FROM entries").fetchall()
+                if not Path(path).is_file() or Path(path).stat().st_size != size
+            ]
+            self._drop_entries(broken)
+            self._db.commit()
+        return len(broken)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT path, size FROM entries)"
+            ).fetchone()[0]
+
+
+# ========== PROCESS-WIDE CACHE ==========
+
+_download_caches: Dict[Path, DownloadCache] = {}
+_download_caches_lock = threading.Lock()
+
+
+def get_download_cache(cache_dir: Optional[Union[Path, str]] = None) -> DownloadCache:
+    """Returns the process-wide download cache stored in `cache_dir`."""
+    key = Path(cache_dir or DownloadCache._default_cache_dir).resolve()
+    with _download_caches_lock:
+        cache = _download_caches.get(key)
+        if cache is None:
+            cache = _download_caches[key] = DownloadCache(key)
+    return cache
@@ -0,0 +1,199 @@
+"""Local, CPU-only speech-to-text of the downloaded audio, for the videos without subtitles.
+
+Needs the optional `faster-whisper` package and the `ffmpeg` executable (see `is_speech_to_text_available()`).
+"""
+import shutil
+import threading
+import subprocess
+import importlib.util
+from pathlib import Path
+from loguru import logger
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing_extensions import Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .video_transcript import WebVTTCue, cues_2_webvtt
+
+
+# whisper's input: 16 kHz mono
+SAMPLE_RATE: int = 16000
+
+
+def is_speech_to_text_available() -> bool:
+    """Whether `faster-whisper` is installed and `ffmpeg` is on the PATH."""
+    return importlib.util.find_spec("faster_whisper") is not None and shutil.which("ffmpeg") is not None
+
+
+def iter_audio_segments(
+    audio_path: Union[Path, str],
+    segment_seconds: float = 30.0,
+    sample_rate: int = SAMPLE_RATE,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Decodes any audio file to mono PCM with ffmpeg and yields it segment by segment while \
+    it's decoded, so the whole audio is never in memory.
+
+    Yields:
+        Tuple[int, np.ndarray]: the segment's start in milliseconds, and its float32 samples in [-1, 1].
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", str(audio_path),
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+    ]
+    segment_bytes = int(segment_seconds * sample_rate) * 2
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        n_samples = 0
+        while True:
+            data = process.stdout.read(segment_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768.0
+            yield n_samples * 1000 // sample_rate, samples
+            n_samples += len(samples)
+
+        error = process.stderr.read().decode(errors="replace").strip()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg could not decode {audio_path}: {error}")
+    finally:
+        # the consumer may stop early: don't leave ffmpeg blocked on a full pipe
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+class SpeechToText:
+    """Transcribes audio files with a faster-whisper model on the CPU.
+
+    The audio is decoded in fixed-length segments (see `iter_audio_segments()`) that are transcribed \
+    concurrently by `num_workers` threads, CTranslate2 releases the GIL while it runs. At most \
+    `2 * num_workers` segments are decoded ahead, and the cues are yielded in order as they're ready.
+    """
+
+    def __init__(self,
+        model_size: str = "base",
+        compute_type: str = "int8",
+        num_workers: int = 2,
+        cpu_threads: int = 0,
+        segment_seconds: float = 30.0,
+        beam_size: int = 1,
+        vad_filter: bool = True,
+    ) -> None:
+        """
+        Args:
+            model_size (str, optional): A whisper model size (e.g. `tiny`, `base`, `small`) or path. \
+                Defaults to "base".
+            compute_type (str, optional): CTranslate2 quantization, `int8` is the fastest on the CPU. \
+                Defaults to "int8".
+            num_workers (int, optional): Segments transcribed at once. Defaults to 2.
+            cpu_threads (int, optional): Threads of each transcription, 0 for CTranslate2's default. \
+                Defaults to 0.
+            segment_seconds (float, optional): Length of the segments, whisper's window is 30s. \
+                Defaults to 30.0.
+            beam_size (int, optional): 1 is greedy decoding. Defaults to 1.
+            vad_filter (bool, optional): Skip the silences with the Silero VAD. Defaults to True.
+        """
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.num_workers = max(1, num_workers)
+        self.cpu_threads = cpu_threads
+        self.segment_seconds = segment_seconds
+        self.beam_size = beam_size
+        self.vad_filter = vad_filter
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The `faster_whisper.WhisperModel`, loaded on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    try:
+                        from faster_whisper import WhisperModel
+                    except ImportError as e:
+                        raise ImportError(
+                            "Local speech-to-text needs `faster-whisper`: pip install faster-whisper"
+                        ) from e
+                    logger.debug(f"Loading whisper model: {self.model_size} ({self.compute_type})")
+                    self._model = WhisperModel(
+                        self.model_size, device="cpu", compute_type=self.compute_type,
+                        cpu_threads=self.cpu_threads, num_workers=self.num_workers,
+                    )
+        return self._model
+
+    def _transcribe_segment(
+        self, start_ms: int, samples: np.ndarray, language: Optional[str] = None
+    ) -> Tuple[str, List[WebVTTCue]]:
+        """The segment's language and cues, timed from the start of the audio."""
+        segments, info = self.model.transcribe(
+            samples, language=language, beam_size=self.beam_size, vad_filter=self.vad_filter,
+            # every segment is transcribed on its own
+            condition_on_previous_text=False,
+        )
+        cues = [
+            WebVTTCue(start_ms + int(segment.start * 1000), start_ms + int(segment.end * 1000), segment.text.strip())
+            for segment in segments if segment.text.strip()
+        ]
+        return info.language, cues
+
+    def iter_cues(
+        self, audio_path: Union[Path, str], language: Optional[str] = None, info: Optional[Dict[str, str]] = None,
+    ) -> Iterator[WebVTTCue]:
+        """Transcribes an audio file and yields its cues in order.
+
+        Args:
+            audio_path (Union[Path, str]): Any audio/video file ffmpeg can decode.
+            language (Optional[str], optional): The spoken language, e.g. `en`. Defaults to None: \
+                detected on the first segment and used for the rest.
+            info (Optional[Dict[str, str]], optional): If provided, the `language` is written into it. \
+                Defaults to None.
+        """
+        if info is None:
+            info = {}
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="intellitube-stt") as pool:
+            try:
+                for start_ms, samples in iter_audio_segments(audio_path, self.segment_seconds):
+                    if language is None:
+                        # the language is detected once, the same for every segment
+                        language, cues = self._transcribe_segment(start_ms, samples)
+                        info["language"] = language
+                        yield from cues
+                        continue
+
+                    pending.append(pool.submit(self._transcribe_segment, start_ms, samples, language))
+                    while len(pending) >= 2 * self.num_workers:
+                        yield from pending.popleft().result()[1]
+
+                while pending:
+                    yield from pending.popleft().result()[1]
+            finally:
+                for future in pending:
+                    future.cancel()
+        info.setdefault("language", language)
+
+    def transcribe(self, audio_path: Union[Path, str], language: Optional[str] = None) -> str:
+        """Transcribes an audio file to WEBVTT content (see `iter_cues()`)."""
+        info: Dict[str, str] = {}
+        cues = list(self.iter_cues(audio_path, language, info))
+        return cues_2_webvtt(cues, info.get("language"))
+
+
+# ========== PROCESS-WIDE MODELS ==========
+
+_speech_to_text_models: Dict[Tuple[str, str], SpeechToText] = {}
+_speech_to_text_lock = threading.Lock()
+
+
+def get_speech_to_text(model_size: str = "base", compute_type: str = "int8") -> SpeechToText:
+    """Returns the process-wide `SpeechToText` of the model, so it's loaded once and shared by all the sessions."""
+    key = (model_size, compute_type)
+    with _speech_to_text_lock:
+        speech_to_text = _speech_to_text_models.get(key)
+        if speech_to_text is None:
+            speech_to_text = _speech_to_text_models[key] = SpeechToText(model_size, compute_type)
+    return speech_to_text
@@ -0,0 +1,72 @@
+"""Fast, local token counting helpers."""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing_extensions import Callable, Iterable, Optional, Union
+
+from langchain_core.documents import Document
+
+
+def estimate_num_tokens(text: str) -> int:
+    """Estimates the number of tokens in `text` without running a tokenizer.
+    Uses the common ~4 characters per token rule of thumb for English text."""
+    return (len(text) + 3) // 4
+
+
+class TokenCounter:
+    """Token counter that memoizes the counts of a real tokenizer by a hash of the content.
+
+    Counting the same texts again (e.g. the summaries checked on every collapse round) \
+    is a dictionary lookup instead of a re-tokenization. It counts with `estimate_num_tokens()` \
+    by default, so it never needs a network call or a tokenizer download; that estimate is a \
+    `len()`, cheaper than hashing the text, so it's not memoized. Pass an exact (slower) \
+    `count_function` like `llm.get_num_tokens` to memoize that instead.
+    """
+
+    def __init__(self,
+        count_function: Callable[[str], int] = estimate_num_tokens,
+        max_entries: int = 10_000,
+        memoize: Optional[bool] = None,
+    ) -> None:
+        """
+        Args:
+            count_function (Callable[[str], int], optional): Counts the tokens of a text. \
+                Defaults to `estimate_num_tokens`.
+            max_entries (int, optional): Size of the memo (LRU). Defaults to 10_000.
+            memoize (Optional[bool], optional): Memoize the counts. Defaults to None: \
+                only if `count_function` is not `estimate_num_tokens`.
+        """
+        self.count_function = count_function
+        self.max_entries = max_entries
+        self.memoize = memoize if memoize is not None else count_function is not estimate_num_tokens
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str) -> int:
+        if not self.memoize:
+            return self.count_function(text)
+
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return count
+
+        count = self.count_function(text)
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def count_documents(self, documents: Iterable[Union[str, Document]]) -> int:
+        """Total tokens of `documents` (strings or `Document`s)."""
+        return sum(
+            self(document.page_content if isinstance(document, Document) else document)
+            for document in documents
+        )
@@ -1,7 +1,404 @@
 import re
-from typing import Any, Dict, List, Optional, Union
+from collections import deque
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+)
+from pydantic import BaseModel
 from langchain_core.documents import Document
 
+from .token_counter import estimate_num_tokens
+
+
+# `HH:MM:SS.mmm --> HH:MM:SS.mmm [cue settings]` (the hour part is optional)
+_CUE_TIMING_RE = re.compile(
+    r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})\s+-->\s+"
+    r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})"
+)
+# inline markup such as `<c>`, `</c>` or word-level `<00:00:01.199>` timestamps
+_CUE_TAG_RE = re.compile(r"<[^>]*>")
+# the word-level timestamps only YouTube's automatic captions have
+_WORD_TIMESTAMP_RE = re.compile(r"<\d+:\d{2}:\d{2}\.\d{3}>")
+_SENTENCE_END_CHARS = ('.', '?', '!')
+
+
+class WebVTTCue(NamedTuple):
+    """A single WEBVTT cue. `start` & `end` are in milliseconds."""
+    start: int
+    end: int
+    text: str
+
+
+def ms_2_timestamp(ms: int) -> str:
+    """Converts milliseconds to a WEBVTT timestamp, e.g.: `3360` -> `"00:00:03.360"`."""
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def _timestamp_2_ms(timestamp: str) -> int:
+    """Converts a WEBVTT timestamp to milliseconds, e.g.: `"00:00:03.360"` -> `3360`."""
+    *hm, seconds = timestamp.split()[0].replace(',', '.').split(':')
+    total = 0
+    for part in hm:
+        total = total * 60 + int(part)
+    return round((total * 60 + float(seconds)) * 1000)
+
+
+def _parse_cue_timing(line: str) -> Optional[Tuple[int, int]]:
+    """Parses a cue timing line to `(start, end)` in milliseconds. Returns `None` if it's not one."""
+    M = _CUE_TIMING_RE.match(line)
+    if not M:
+        return None
+
+    # missing hour parts default to '0'
+    h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, M.groups('0'))
+    return (
+        ((h1 * 60 + m1) * 60 + s1) * 1000 + ms1,
+        ((h2 * 60 + m2) * 60 + s2) * 1000 + ms2,
+    )
+
+
+def _iter_vtt_lines(
+    vtt_content: Optional[str] = None,
+    vtt_file_path: Optional[str] = None,
+) -> Iterator[str]:
+    """Yields the lines of a WEBVTT file/content without the trailing line breaks.
+    The file is read incrementally, it is never loaded into memory as a whole."""
+    if vtt_content:
+        for line in vtt_content.splitlines():
+            yield line
+        return
+
+    with open(vtt_file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            yield line.rstrip("\r\n")
+
+
+def iter_webvtt_cues(
+    vtt_content: Optional[str] = None,
+    vtt_file_path: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    strip_tags: bool = True,
+) -> Iterator[WebVTTCue]:
+    """Parses a WEBVTT file/content in a single pass and yields its cues one by one.
+
+    Args:
+        vtt_content (Optional[str], optional): WEBVTT File content as a string. Defaults to None.
+        vtt_file_path (Optional[str], optional): WEBVTT file path. Defaults to None.
+        metadata (Optional[Dict[str, str]], optional): If provided, the header metadata \
+            (e.g. `Kind`, `Language`) is written into this dictionary. Defaults to None.
+        strip_tags (bool, optional): Remove inline markup (`<c>`, word timestamps etc.) \
+            from the cue text. Defaults to True.
+
+    Raises:
+        ValueError: If both of the arguments found empty.
+
+    **NOTE: If both values are provided, `vtt_content` is used and `vtt_file_path` is ignored.**
+
+    Yields:
+        WebVTTCue: cues with the start/end time in milliseconds & the full (multi-line) text.
+    """
+
+    if not vtt_file_path and not vtt_content:
+        raise ValueError("One of `vtt_file_path` and `vtt_content` must be provided. Found both blank!")
+
+    if metadata is None:
+        metadata = {}
+
+    in_header = True
+    start = end = 0
+    text_lines: Optional[List[str]] = None  # `None` when not inside a cue
+
+    for line in _iter_vtt_lines(vtt_content, vtt_file_path):
+        if text_lines is not None:
+            # inside a cue: everything up to the next blank line is cue text
+            if line:
+                if strip_tags and '<' in line:
+                    line = _CUE_TAG_RE.sub('', line)
+                line = line.strip()
+                if line:
+                    text_lines.append(line)
+                continue
+
+            yield WebVTTCue(start, end, "\n".join(text_lines))
+            text_lines = None
+            continue
+
+        if not line:
+            in_header = False   # the header ends at the first blank line
+            continue
+
+        if '-->' not in line:
+            # cue identifiers, NOTE/STYLE blocks & header lines
+            if in_header:
+                if line.startswith("WEBVTT"):
+                    metadata["type"] = "WEBVTT"
+                elif ':' in line:
+                    key, value = line.split(':', 1)
+                    metadata[key.strip()] = value.strip()
+            continue
+
+        timing = _parse_cue_timing(line)
+        if not timing:
+            continue
+
+        start, end = timing
+        in_header = False
+        text_lines = []
+
+    if text_lines is not None:
+        yield WebVTTCue(start, end, "\n".join(text_lines))
+
+
+def _iter_cues_from(
+    vtt_content: Optional[Union[str, dict]] = None,
+    vtt_file_path: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> Iterable[WebVTTCue]:
+    """Cues from a legacy `webvtt_2_json()` dict or straight from the WEBVTT file/content."""
+    if type(vtt_content) != dict:
+        return iter_webvtt_cues(vtt_content, vtt_file_path, metadata)
+
+    if metadata is not None:
+        metadata.update(vtt_content["metadata"])
+
+    return (
+        WebVTTCue(
+            _timestamp_2_ms(caption["start"]),
+            _timestamp_2_ms(caption["end"]),
+            caption.get("text", ""),
+        )
+        for caption in vtt_content["captions"]
+    )
+
+
+def cues_2_webvtt(cues: Iterable[WebVTTCue], language: Optional[str] = None) -> str:
+    """Writes cues as WEBVTT content, readable by `iter_webvtt_cues()`."""
+    lines = ["WEBVTT", "Kind: captions"]
+    if language:
+        lines.append(f"Language: {language}")
+    for cue in cues:
+        # a blank line would end the cue early
+        text = "\n".join(line for line in cue.text.splitlines() if line.strip())
+        lines += ["", f"{ms_2_timestamp(cue.start)} --> {ms_2_timestamp(cue.end)}", text]
+    return "\n".join(lines) + "\n"
+
+
+def is_auto_caption_webvtt(
+    vtt_content: Optional[str] = None,
+    vtt_file_path: Optional[str] = None,
+    max_lines: int = 200,
+) -> bool:
+    """Whether a WEBVTT file/content is YouTube's rolling auto-captions (word-level timestamps \
+    within its first `max_lines` lines), the only transcripts `dedupe_rolling_cues()` should merge."""
+    for i, line in enumerate(_iter_vtt_lines(vtt_content, vtt_file_path)):
+        if i >= max_lines:
+            break
+        if '<' in line and _WORD_TIMESTAMP_RE.search(line):
+            return True
+    return False
+
+
+class TranscriptDedupStats(BaseModel):
+    """Size of a transcript before & after `dedupe_rolling_cues()`."""
+    input_cues: int = 0
+    output_cues: int = 0
+    input_chars: int = 0
+    output_chars: int = 0
+
+    @property
+    def saved_chars(self) -> int:
+        return self.input_chars - self.output_chars
+
+    @property
+    def reduction(self) -> float:
+        """Fraction of the input text that was removed (`0.0` - `1.0`)."""
+        return self.saved_chars / self.input_chars if self.input_chars else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.input_cues} cues -> {self.output_cues} sentences, "
+            f"{self.input_chars} -> {self.output_chars} chars "
+            f"({self.reduction:.1%} smaller)"
+        )
+
+
+def _overlap_length(history: List[str], words: List[str]) -> int:
+    """Length of the longest suffix of `history` that is also a prefix of `words`."""
+    for k in range(min(len(history), len(words)), 0, -1):
+        if history[-k:] == words[:k]:
+            return k
+    return 0
+
+
+def dedupe_rolling_cues(
+    cues: Iterable[WebVTTCue],
+    stats: Optional[TranscriptDedupStats] = None,
+    window: int = 4,
+    max_words: int = 30,
+    max_gap_ms: int = 2000,
+    hold_ms: int = 50,
+) -> Iterator[WebVTTCue]:
+    """Merges the rolling (overlapping) cues of YouTube auto-captions into clean, timestamped sentences.
+
+    Auto-captions show every line twice: a cue repeats the previous cue's line above the new one, \
+    and a ~10ms cue holds the previous line alone on screen in between. Only those whole-line \
+    repeats are dropped, plus, for cues whose timings overlap the previous one, the lines seen \
+    within the last `window` lines and the words that repeat the end of the previous text. \
+    The remaining words are regrouped into sentences. Regular captions, where a repeated line or \
+    word is real speech, keep all their words; don't dedupe uploaded subtitles or speech-to-text output \
+    (see `is_auto_caption_webvtt()`).
+
+    Args:
+        cues (Iterable[WebVTTCue]): cues, e.g. from `iter_webvtt_cues()`.
+        stats (Optional[TranscriptDedupStats], optional): If provided, it's updated with the input \
+            & output sizes as the cues are consumed. Defaults to None.
+        window (int, optional): Number of recent lines an overlapping cue is compared against. Defaults to 4.
+        max_words (int, optional): A sentence is cut after this many words, auto-captions \
+            have no punctuation. Defaults to 30.
+        max_gap_ms (int, optional): A silence longer than this always ends a sentence. Defaults to 2000.
+        hold_ms (int, optional): A cue this short that only repeats the previous cue's last line \
+            is the auto-caption hold cue. Defaults to 50.
+
+    Yields:
+        WebVTTCue: one cue per sentence, spanning from the first to the last cue it was built from.
+    """
+
+    if stats is None:
+        stats = TranscriptDedupStats()
+
+    def make_sentence(start: int, end: int, words: List[str]) -> WebVTTCue:
+        text = " ".join(words)
+        stats.output_cues += 1
+        stats.output_chars += len(text)
+        return WebVTTCue(start, end, text)
+
+    recent_lines = deque(maxlen=window)
+    previous_lines: List[str] = []
+    previous_end: Optional[int] = None
+    history: List[str] = []     # most recently emitted words
+    history_size = window * 16
+
+    sentence: List[str] = []
+    start = end = 0
+
+    for cue in cues:
+        stats.input_cues += 1
+        stats.input_chars += len(cue.text)
+
+        lines = [line for line in cue.text.split("\n") if line]
+        overlaps = previous_end is not None and cue.start < previous_end
+        # the rolling pattern: the previous line again above a new one, or held alone for a few ms
+        rolling = bool(lines) and lines[0] in previous_lines[-1:] and (
+            len(lines) > 1 or cue.end - cue.start <= hold_ms
+        )
+
+        new_words: List[str] = []
+        for i, line in enumerate(lines):
+            if (rolling and i == 0) or (overlaps and line in recent_lines):
+                continue
+
+            words = line.split()
+            if overlaps:
+                words = words[_overlap_length(history, words):]
+            new_words.extend(words)
+            history.extend(words)
+
+        recent_lines.extend(lines)
+        previous_lines = lines
+        previous_end = cue.end
+        if len(history) > history_size:
+            del history[:-history_size]
+
+        if not new_words:
+            # a repeat of the text on screen, it only extends the current sentence
+            if sentence:
+                end = max(end, cue.end)
+            continue
+
+        if sentence and cue.start - end > max_gap_ms:
+            yield make_sentence(start, end, sentence)
+            sentence = []
+
+        if not sentence:
+            start = cue.start
+        end = cue.end
+
+        for word in new_words:
+            sentence.append(word)
+            if len(sentence) >= max_words or word.endswith(_SENTENCE_END_CHARS):
+                yield make_sentence(start, end, sentence)
+                sentence = []
+                start = cue.start
+
+    if sentence:
+        yield make_sentence(start, end, sentence)
+
+
+def chunk_transcript_cues(
+    cues: Iterable[WebVTTCue],
+    max_tokens: int = 128,
+    length_function: Callable[[str], int] = estimate_num_tokens,
+    overlap_cues: int = 0,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[Document]:
+    """Packs whole cues into chunks of up to `max_tokens` tokens, in a single pass.
+
+    Cues are never split, a cue longer than `max_tokens` becomes a chunk of its own. \
+    Every chunk keeps the time range it covers in its metadata (`start`, `end`, `start_ms`, `end_ms`).
+
+    Args:
+        cues (Iterable[WebVTTCue]): cues, e.g. from `iter_webvtt_cues()` or `dedupe_rolling_cues()`.
+        max_tokens (int, optional): Token budget of a chunk. Defaults to 128.
+        length_function (Callable[[str], int], optional): Counts the tokens of a cue's text. \
+            Defaults to `estimate_num_tokens`.
+        overlap_cues (int, optional): Number of trailing cues of a chunk to repeat at the start \
+            of the next one. Defaults to 0.
+        metadata (Optional[Dict[str, Any]], optional): Added to every chunk's metadata. Defaults to None.
+
+    Yields:
+        Document: transcript chunks.
+    """
+
+    metadata = metadata or {}
+    chunk: List[WebVTTCue] = []
+    chunk_tokens: List[int] = []
+    n_tokens = 0
+
+    def make_chunk() -> Document:
+        start, end = chunk[0].start, chunk[-1].end
+        return Document(
+            page_content="\n".join(cue.text for cue in chunk),
+            metadata={
+                **metadata,
+                "start": ms_2_timestamp(start),
+                "end": ms_2_timestamp(end),
+                "start_ms": start,
+                "end_ms": end,
+            }
+        )
+
+    for cue in cues:
+        cue_tokens = length_function(cue.text)
+
+        if chunk and n_tokens + cue_tokens > max_tokens:
+            yield make_chunk()
+
+            # carry the overlap over only if there's room left for the new cue
+            keep = max(len(chunk) - overlap_cues, 0)
+            while keep < len(chunk) and sum(chunk_tokens[keep:]) + cue_tokens > max_tokens:
+                keep += 1
+            del chunk[:keep], chunk_tokens[:keep]
+            n_tokens = sum(chunk_tokens)
+
+        chunk.append(cue)
+        chunk_tokens.append(cue_tokens)
+        n_tokens += cue_tokens
+
+    if chunk:
+        yield make_chunk()
+
 
 def webvtt_2_json(
     vtt_content: Optional[str] = None,
@@ -15,18 +412,18 @@ def webvtt_2_json(
 
     Raises:
         ValueError: If both of the arguments found empty.
-    
+
     **NOTE: If both values are provided, `vtt_content` is used and `vtt_file_path` is ignored.**
 
     Returns:
         Dict[str, Any]: A dictionary containing metadata & captions.
-    
+
     # Example Return Output:
     ```python
     {
         "metadata": {
-            'type': 'WEBVTT', 
-            'Kind': 'captions', 
+            'type': 'WEBVTT',
+            'Kind': 'captions',
             'Language': 'en'
         },
         "captions": list(
@@ -40,46 +437,17 @@ def webvtt_2_json(
     }
     ```
     """
-    
-    if not vtt_file_path and not vtt_content:
-        raise ValueError("One of `vtt_file_path` and `vtt_content` must be provided. Found both blank!")
-    
-    lines: List[str] = (vtt_content or "").split("\n")
 
-    if not lines[0]:
-        with open(vtt_file_path, 'r') as file:
-            lines = file.read().strip().split("\n")
-    
     metadata = {}
-    json_data = []
-
-    for line in lines:
-        try:
-            if not line: continue
-
-            M = re.match("\d+:\d+:.+ --> \d+:\d+:.+", line)
-            # print(line, M)
-
-            if M:
-                time_range = line.split("-->")
-                json_data.append({
-                    "start": time_range[0].strip(),
-                    "end": time_range[1].strip(),
-                })
-                # print(f"Match: {M.start(), M.end(), M.string}")
-            else:
-                if not json_data and not M:
-                    if line != "WEBVTT":
-                        data = line.split(':')
-                        metadata[data[0].strip()] = data[1].strip()
-                    else:
-                        metadata["type"] = "WEBVTT"
-                else:
-                    json_data[-1]["text"] = line
-        
-        except Exception as e:
-            print(f"ERROR: {e}")
-    
+    json_data = [
+        {
+            "start": ms_2_timestamp(cue.start),
+            "end": ms_2_timestamp(cue.end),
+            "text": cue.text,
+        }
+        for cue in iter_webvtt_cues(vtt_content, vtt_file_path, metadata)
+    ]
+
     return {
         "metadata": metadata,
         "captions": json_data
@@ -89,35 +457,40 @@ def webvtt_2_json(
 def webvtt_2_langchain_documents(
     vtt_content: Optional[Union[str, dict]] = None,
     vtt_file_path: Optional[str] = None,
+    dedupe: bool = False,
+    dedupe_stats: Optional[TranscriptDedupStats] = None,
 ) -> List[Document]:
     """Converts WEBVTT file/content to a `list` of LangChain `Document` Objects.
 
     Args:
         vtt_content (Optional[str | dict], optional): WEBVTT File content as a `str` or a `dict`. Defaults to None.
         vtt_file_path (Optional[str], optional): WEBVTT file path. Defaults to None.
+        dedupe (bool, optional): Merge rolling auto-caption cues with `dedupe_rolling_cues()`. Defaults to False.
+        dedupe_stats (Optional[TranscriptDedupStats], optional): Collects the deduplication savings. Defaults to None.
 
     Returns:
         List[Document]: `list` of LangChain `Document` Objects.
     """
-    
-    vtt_json: dict
+
+    metadata: Dict[str, str] = {}
     documents: List[Document] = []
 
-    if type(vtt_content) == dict:
-        vtt_json = vtt_content
-    else:
-        vtt_json = webvtt_2_json(vtt_content, vtt_file_path)
+    cues = _iter_cues_from(vtt_content, vtt_file_path, metadata)
+    if dedupe:
+        cues = dedupe_rolling_cues(cues, dedupe_stats)
 
-    for caption in vtt_json["captions"]:
+    for cue in cues:
         documents.append(Document(
-            page_content=caption['text'],
+            page_content=cue.text,
             metadata={
-                **vtt_json["metadata"],
-                "start": caption["start"],
-                "end": caption["end"],
+                **metadata,
+                "start": ms_2_timestamp(cue.start),
+                "end": ms_2_timestamp(cue.end),
+                "start_ms": cue.start,
+                "end_ms": cue.end,
             }
         ))
-    
+
     return documents
 
 
@@ -125,31 +498,33 @@ def webvtt_2_str(
     vtt_content: Optional[Union[str, dict]] = None,
     vtt_file_path: Optional[str] = None,
     include_timestamps: bool = False,
+    dedupe: bool = False,
+    dedupe_stats: Optional[TranscriptDedupStats] = None,
 ) -> str:
     """Converts WEBVTT file/content to a single string.
 
     Args:
         vtt_content (Optional[Union[str, dict]], optional): WEBVTT File content as a `str` or a `dict`. Defaults to None.
         vtt_file_path (Optional[str], optional): WEBVTT file path. Defaults to None.
+        include_timestamps (bool, optional): Prefix every line with its time range. Defaults to False.
+        dedupe (bool, optional): Merge rolling auto-caption cues with `dedupe_rolling_cues()`. Defaults to False.
+        dedupe_stats (Optional[TranscriptDedupStats], optional): Collects the deduplication savings. Defaults to None.
 
     Returns:
         str: a string
     """
-    
-    vtt_json: dict
-
-    if type(vtt_content) == dict:
-        vtt_json = vtt_content
-    else:
-        vtt_json = webvtt_2_json(vtt_content, vtt_file_path)
-    
+
+    cues = _iter_cues_from(vtt_content, vtt_file_path)
+    if dedupe:
+        cues = dedupe_rolling_cues(cues, dedupe_stats)
+
     vtt_str = "\n".join(
         (
             "" if not include_timestamps
-            else f'From {caption["start"]} to {caption["end"]}: '
-        ) + caption['text']
-        
-        for caption in vtt_json["captions"]
+            else f'From {ms_2_timestamp(cue.start)} to {ms_2_timestamp(cue.end)}: '
+        ) + cue.text
+
+        for cue in cues
     )
 
     return vtt_str
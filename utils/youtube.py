@@ -1,16 +1,34 @@
 import os
+import re
+import copy
+import json
 import uuid
+import time
 import shutil
+import asyncio
+import hashlib
 import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from loguru import logger
-from typing import Any, Dict, List, Literal, Union, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, Tuple, Union, Optional
 
 from yt_dlp import YoutubeDL
 from pydantic import BaseModel
 
-from .cacher import Cacher
+from .concurrency import AsyncRateLimiter, get_executor, run_in_threadpool
+from .download_cache import get_download_cache
+from .speech_to_text import SAMPLE_RATE, get_speech_to_text, is_speech_to_text_available
+
+
+_YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com', 'youtu.be')
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# every thread keeps its own `YoutubeDL`s (they are not thread-safe), one per config
+_thread_local = threading.local()
 
 
 class YTContentData(BaseModel):
@@ -42,17 +60,191 @@ class YTContentData(BaseModel):
         return super().model_post_init(context)
 
 
-def search_youtube(query: str, max_results=5) -> List[Dict[str, Any]]:
+def is_youtube_host(host: str) -> bool:
+    """Whether `host` is YouTube or one of its subdomains (not e.g. `notyoutube.com`)."""
+    host = host.lower()
+    return any(host == h or host.endswith('.' + h) for h in _YOUTUBE_HOSTS)
+
+
+def extract_youtube_video_id(url: str) -> Optional[str]:
+    """Returns the video ID of a YouTube URL, or `None` if it's not a YouTube video URL.
+    Handles `watch?v=`, `youtu.be/`, `shorts/`, `embed/`, `live/` & `v/` links."""
+    parts = urlsplit(url if '//' in url else '//' + url)
+    host = (parts.hostname or '').lower()
+    if not is_youtube_host(host):
+        return None
+
+    if host.endswith('youtu.be'):
+        video_id = parts.path.strip('/').split('/')[0]
+    elif parts.path == '/watch':
+        video_id = dict(parse_qsl(parts.query)).get('v', '')
+    else:
+        segments = parts.path.strip('/').split('/')
+        video_id = (
+            segments[1] if len(segments) > 1 and segments[0] in ('shorts', 'embed', 'live', 'v')
+            else ''
+        )
+    return video_id if _VIDEO_ID_RE.match(video_id) else None
+
+
+def canonical_source_key(source: Any) -> str:
+    """Canonical name of a source, e.g. every URL of a YouTube video maps to the same `youtube:<id>` key."""
+    source = str(source)
+    video_id = extract_youtube_video_id(source)
+    return f"youtube:{video_id}" if video_id else source
+
+
+def youtube_timestamp_url(video_url: str, start_ms: int) -> str:
+    """Returns a link to `video_url` that starts playing at `start_ms` milliseconds,
+    e.g.: `https://www.youtube.com/watch?v=X&t=231s`."""
+    parts = urlsplit(video_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != 't']
+    query.append(('t', f"{start_ms // 1000}s"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def get_youtube_dl(config: Dict[str, Any]) -> YoutubeDL:
+    """Returns this thread's `YoutubeDL` for `config`, created on the first call and reused after, \
+    so the extractors & the HTTP session are set up once per thread instead of once per video."""
+    key = json.dumps(config, sort_keys=True, default=str)
+    ydls: Dict[str, YoutubeDL] = getattr(_thread_local, 'ydls', None)
+    if ydls is None:
+        ydls = _thread_local.ydls = {}
+    ydl = ydls.get(key)
+    if ydl is None:
+        # `YoutubeDL` normalizes its params in place
+        ydl = ydls[key] = YoutubeDL(copy.deepcopy(config))
+    return ydl
+
+
+def normalize_search_query(query: str) -> str:
+    """Case & whitespace insensitive form of a search query, the key of its cached results."""
+    return " ".join(query.lower().split())
+
+
+def _format_search_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'title': entry.get('title'),
+        'id': entry.get('id'),
+        'url': f"https://www.youtube.com/watch?v={entry.get('id')}",
+        'duration': entry.get('duration'),
+        'channel': entry.get('uploader') or entry.get('channel'),
+    }
+
+
+class _SearchResults:
+    """The results of a query read so far, and the lazy iterator that fetches the next pages.
+
+    The iterator fetches with the `YoutubeDL` that started the search, from whichever thread \
+    reads it next, so every search has its own instead of a thread's shared one.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.results: List[Dict[str, Any]] = []
+        self.created = time.monotonic()
+        self.exhausted = False
+        self.error: Optional[Exception] = None
+        self.lock = threading.Lock()
+        self._ydl = YoutubeDL({'quiet': True, 'skip_download': True, 'extract_flat': True})
+        info: Dict[str, Any] = self._ydl.extract_info(f"ytsearchall:{query}", download=False, process=False)
+        self._entries: Iterator[Dict[str, Any]] = iter(info.get('entries') or [])
+
+    def take(self, stop: int) -> List[Dict[str, Any]]:
+        """The first `stop` results, fetching only the pages that were not read yet. \
+        If a page can't be fetched, the error is raised now and on every later read past it."""
+        with self.lock:
+            while len(self.results) < stop and not self.exhausted:
+                if self.error is not None:
+                    raise self.error
+                try:
+                    self.results.append(_format_search_entry(next(self._entries)))
+                except StopIteration:
+                    self.exhausted = True
+                except Exception as e:
+                    # the generator is closed after raising: it would look exhausted
+                    self.error = e
+                    raise
+            return self.results[:stop]
+
+
+class YouTubeSearchCache:
+    """Results of the YouTube searches, kept for `ttl` seconds by normalized query.
+
+    A query is run as an unbounded, lazy search (`ytsearchall:`, not processed), so asking for \
+    more results of a cached query only fetches the pages after the ones already read. \
+    The least recently used queries are dropped after `max_queries`.
+    """
+
+    def __init__(self, ttl: Optional[float] = 3600, max_queries: int = 256) -> None:
+        self.ttl = ttl
+        self.max_queries = max_queries
+        self.hits = 0
+        self.misses = 0
+        self._queries: "OrderedDict[str, _SearchResults]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _results_of(self, query: str) -> _SearchResults:
+        key = normalize_search_query(query)
+        with self._lock:
+            search = self._queries.get(key)
+            if search is not None and self.ttl is not None and time.monotonic() - search.created > self.ttl:
+                search = None
+            if search is None:
+                search = self._queries[key] = _SearchResults(key)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return search
+
+    def search(self, query: str, max_results: int = 5, offset: int = 0) -> List[Dict[str, Any]]:
+        search = self._results_of(query)
+        cached = len(search.results) >= offset + max_results or search.exhausted
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        try:
+            return search.take(offset + max_results)[offset:]
+        except Exception:
+            # a failed page fetch is not the end of the results: the next search starts over
+            key = normalize_search_query(query)
+            with self._lock:
+                if self._queries.get(key) is search:
+                    del self._queries[key]
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries.clear()
+
+
+_youtube_search_cache = YouTubeSearchCache()
+
+
+def get_youtube_search_cache() -> YouTubeSearchCache:
+    """Returns the process-wide cache of the YouTube search results."""
+    return _youtube_search_cache
+
+
+def search_youtube(query: str, max_results=5, offset: int = 0, use_cache: bool = True) -> List[Dict[str, Any]]:
     """
     Searches YouTube using yt-dlp and returns a list of video metadata.
 
     Args:
         query (str): The search query.
         max_results (int): Number of top results to return.
+        offset (int): Number of results to skip, e.g. `max_results` for the 2nd page. \
+            The pages of a cached query that were read before are not fetched again.
+        use_cache (bool): Serve the results from the process-wide search cache \
+            (see `YouTubeSearchCache`). A fresh search is run otherwise.
 
     Returns:
         list: A list of dictionaries containing video metadata (title, id, url, duration, etc.)
     """
+    if use_cache:
+        return get_youtube_search_cache().search(query, max_results, offset)
+
     ydl_opts = {
         'quiet': True,
         'skip_download': True,
@@ -60,26 +252,41 @@ def search_youtube(query: str, max_results=5) -> List[Dict[str, Any]]:
         'force_generic_extractor': False,
     }
 
-    search_url = f"ytsearch{max_results}:{query}"
-
-    with YoutubeDL(ydl_opts) as ydl:
-        info: Dict[str, Any] = ydl.extract_info(search_url, download=False)
-        return [
-            {
-                'title': entry.get('title'),
-                'id': entry.get('id'),
-                'url': f"https://www.youtube.com/watch?v={entry.get('id')}",
-                'duration': entry.get('duration'),
-                'channel': entry.get('uploader'),
-            }
-            for entry in info.get('entries', [])
-        ]
+    search_url = f"ytsearch{offset + max_results}:{query}"
+
+    # this thread's extractor, set up once (see `get_youtube_dl()`)
+    ydl = get_youtube_dl(ydl_opts)
+    info: Dict[str, Any] = ydl.extract_info(search_url, download=False)
+    return [_format_search_entry(entry) for entry in info.get('entries', [])][offset:]
+
+
+def search_youtube_batch(
+    queries: List[str], max_results: int = 5, use_cache: bool = True,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Runs many searches concurrently on the shared thread pool. Duplicate queries (after \
+    normalization) run once. Uncached searches reuse each worker thread's extractor (see \
+    `get_youtube_dl()`); a cached search owns one, its next pages may be read from any thread.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: the results of every query, or an empty list if it failed.
+    """
+    unique_queries = {normalize_search_query(query): query for query in queries}
+
+    def search(query: str) -> List[Dict[str, Any]]:
+        try:
+            return search_youtube(query, max_results, use_cache=use_cache)
+        except Exception as e:
+            logger.error(f"YouTube search failed for {query!r}: {e}")
+            return []
+
+    results = dict(zip(unique_queries, get_executor().map(search, unique_queries.values())))
+    return {query: results[normalize_search_query(query)] for query in queries}
 
 
 def download_youtube_content(
     url: str,
     output_dir: str,
-    suffix: Literal['mp3', 'vtt'],
+    suffix: Literal['mp3', 'opus', 'vtt'],
     config: Dict[str, Any]
 ) -> Union[str, None]:
     
@@ -89,113 +296,391 @@ def download_youtube_content(
 
     with tempfile.TemporaryDirectory(dir=output_dir) as tempdir:
         temp_file = os.path.join(tempdir, f"{unq_fname}.%(ext)s")
-        config['outtmpl'] = temp_file
-
-        with YoutubeDL(config) as ydl:
-            try:
-                # download the transcript
-                ydl.download([url])
-
-                downloaded_fp = None
-
-                for filename in os.listdir(tempdir):
-                    if filename.startswith(unq_fname):
-                        downloaded_fp = os.path.join(tempdir, filename)
-                        break
-                
-                if not downloaded_fp or not os.path.exists(downloaded_fp):
-                    raise Exception('Download was unsuccessful!')
-                
-                shutil.move(downloaded_fp, output_path)
-
-            except Exception as e:
-                logger.error(f"Error encountered: {e}")
-                return None
+        ydl = get_youtube_dl(config)
+        ydl.params['outtmpl']['default'] = temp_file
+
+        try:
+            # download the transcript
+            ydl.download([url])
+
+            downloaded_fp = None
+
+            for filename in os.listdir(tempdir):
+                if filename.startswith(unq_fname):
+                    downloaded_fp = os.path.join(tempdir, filename)
+                    break
+            
+            if not downloaded_fp or not os.path.exists(downloaded_fp):
+                raise Exception('Download was unsuccessful!')
+            
+            shutil.move(downloaded_fp, output_path)
+
+        except Exception as e:
+            logger.error(f"Error encountered: {e}")
+            return None
     
     return output_path
 
 
-def download_youtube_audio_or_transcript(
+def _pick_subtitle_track(
+    info: Dict[str, Any], language: Optional[str] = None
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """The `(language, WebVTT format)` of the best subtitle track: the requested language, \
+    else the video's own language or English; uploaded subtitles before automatic captions."""
+    preferred = [language] if language else [info.get('language'), 'en']
+    for is_automatic, tracks in enumerate((info.get('subtitles') or {}, info.get('automatic_captions') or {})):
+        # automatic captions are also machine-translated to every language,
+        # `<lang>-orig` is the one recognized from the audio
+        keys = sorted(tracks, key=lambda key: not key.endswith('-orig'))
+        for lang in filter(None, preferred):
+            for key in keys:
+                if key == lang or key.startswith(lang + '-'):
+                    vtt = next((fmt for fmt in tracks[key] if fmt.get('ext') == 'vtt'), None)
+                    if vtt:
+                        return key, vtt
+        # any uploaded track is still better than a machine translation
+        if not language and not is_automatic and keys:
+            vtt = next((fmt for fmt in tracks[keys[0]] if fmt.get('ext') == 'vtt'), None)
+            if vtt:
+                return keys[0], vtt
+    return None
+
+
+def fetch_youtube_subtitles(video_url: str, language: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """Fetches a video's subtitles in memory: the track URLs come from the video's metadata \
+    (`extract_info()`, without processing the formats), and the track is read straight from \
+    the response, no temp files. Returns `(language, WebVTT content)`, None if there's no track.
+
+    Raises:
+        Exception: the metadata or the track could not be fetched (e.g. a network error), \
+            so a transient failure is not mistaken for a video without subtitles.
+    """
+    ydl = get_youtube_dl({'quiet': True, 'skip_download': True})
+    info = ydl.extract_info(video_url, download=False, process=False)
+    track = _pick_subtitle_track(info, language)
+    if not track:
+        logger.warning(f"No WebVTT subtitles found for {video_url} ({language or 'any language'})")
+        return None
+    track_language, vtt_format = track
+    with ydl.urlopen(vtt_format['url']) as response:
+        content = response.read().decode('utf-8')
+    return track_language, content
+
+
+def _download_subtitles(video_url: str, output_dir: str, language: Optional[str] = None) -> Optional[str]:
+    """Fallback of `fetch_youtube_subtitles()` when no WebVTT track is listed: yt-dlp downloads \
+    (& converts) the subtitles. Returns the path of the downloaded file, None if there's none."""
+    logger.debug('Downloading transcript...')
+    config = {
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'skip_download': True,
+        'quiet': True,
+    }
+    if language:
+        config['subtitleslangs'] = [language]
+    return download_youtube_content(url=video_url, output_dir=output_dir, suffix='vtt', config=config)
+
+
+def fetch_youtube_transcript(
     video_url: str,
-    preferred_output: Literal['audio', 'transcript', 'both'] = 'transcript',
-    cache_dir: str = 'test_data/cache/youtube/cache',
+    language: Optional[str] = None,
     output_dir: str = 'test_data/cache/youtube/downloads',
     use_cache: bool = True,
-) -> YTContentData:
-    
-    cache = Cacher(video_url, 'json', cache_dir)
-    cache_data: YTContentData = None
-    
-    # TODO: Delete old cache
-    # TODO: SOLVE ISSUE: when use_cache=False, it recreates the cache from scratch
+    write_cache: bool = True,
+) -> Optional[str]:
+    """The WebVTT content of a video's transcript, read from the download cache or fetched in memory \
+    (see `fetch_youtube_subtitles()`, then the yt-dlp download of `download_youtube_audio_or_transcript()`); \
+    written to the cache only if `write_cache`. None if the video has no subtitles; fetch errors \
+    are raised."""
+    cache = get_download_cache(output_dir)
+    video_id = _cache_video_id(video_url)
 
-    if cache.cache_file_exists() and use_cache:
-        logger.debug('Cache exists, validating cache...')
+    if use_cache:
+        transcript_path = cache.get(video_id, 'transcript', language)
+        if transcript_path:
+            return transcript_path.read_text(encoding='utf-8')
 
-        cache_data = YTContentData(**cache.load_cache())
-        cache_valid = True
+    subtitles = fetch_youtube_subtitles(video_url, language)
+    if subtitles:
+        if write_cache:
+            cache.put_bytes(video_id, 'transcript', subtitles[1].encode('utf-8'), '.vtt', language=language)
+        return subtitles[1]
 
-        if preferred_output in ['transcript', 'both'] and not cache_data.transcript_path:
-            cache_valid = False
-        
-        if preferred_output in ['audio', 'both'] and not cache_data.audio_path:
-            cache_valid = False
+    downloaded_path = _download_subtitles(video_url, str(cache.cache_dir), language)
+    if not downloaded_path:
+        return None
+    content = Path(downloaded_path).read_text(encoding='utf-8')
+    if write_cache:
+        cache.put_file(video_id, 'transcript', downloaded_path, language=language)
+    else:
+        os.remove(downloaded_path)
+    return content
+
+
+def transcribe_youtube_audio(
+    video_url: str,
+    language: Optional[str] = None,
+    output_dir: str = 'test_data/cache/youtube/downloads',
+    use_cache: bool = True,
+    model_size: str = 'base',
+) -> Optional[str]:
+    """Transcribes a video's audio locally, on the CPU (see `SpeechToText`), for the videos without \
+    subtitles. The 16 kHz mono audio & the WebVTT transcript are kept in the download cache.
+
+    Returns:
+        Optional[str]: the WebVTT content, None if speech-to-text is not available or the audio \
+            could not be downloaded.
+    """
+    if not is_speech_to_text_available():
+        logger.warning("Speech-to-text is not available: install `faster-whisper` and `ffmpeg`")
+        return None
+
+    cache = get_download_cache(output_dir)
+    video_id = _cache_video_id(video_url)
+    if use_cache:
+        transcript_path = cache.get(video_id, 'speech_transcript', language)
+        if transcript_path:
+            return transcript_path.read_text(encoding='utf-8')
+
+    try:
+        yt_video_data = download_youtube_audio_or_transcript(
+            video_url, 'audio', output_dir=output_dir, use_cache=use_cache, audio_format='speech'
+        )
+    except Exception as e:
+        # e.g. `YTContentData` rejects a download without any file
+        logger.error(f"Could not download the audio of {video_url}: {e}")
+        return None
+    if not yt_video_data.audio_path:
+        return None
+
+    logger.debug(f'Transcribing the audio of {video_url}...')
+    vtt_content = get_speech_to_text(model_size).transcribe(yt_video_data.audio_path, language)
+    cache.put_bytes(video_id, 'speech_transcript', vtt_content.encode('utf-8'), '.vtt', language=language)
+    return vtt_content
+
+
+def _cache_video_id(video_url: str) -> str:
+    """The canonical video id, so every link form of a video shares its downloads."""
+    return extract_youtube_video_id(video_url) or (
+        "url-" + hashlib.sha256(video_url.encode()).hexdigest()[:16]
+    )
 
-        if cache_valid:
-            logger.debug('Cache contains the requested data. Using cache.')
-            return cache_data
-        logger.debug('Current cache DOES NOT contain newly requested data. Downloading it now...')
 
-    # first create output dirs, if they already don't exist
-    os.makedirs(output_dir, exist_ok=True)
+def download_youtube_audio_or_transcript(
+    video_url: str,
+    preferred_output: Literal['audio', 'transcript', 'both'] = 'transcript',
+    cache_dir: Optional[str] = None,
+    output_dir: str = 'test_data/cache/youtube/downloads',
+    use_cache: bool = True,
+    language: Optional[str] = None,
+    audio_format: Literal['mp3', 'speech'] = 'mp3',
+) -> YTContentData:
+    """Downloads a video's transcript and/or audio, through the download cache in `output_dir`.
+
+    Args:
+        video_url (str): any link of the video, the cache is keyed by its video id.
+        preferred_output (Literal['audio', 'transcript', 'both'], optional): Defaults to 'transcript'.
+        cache_dir (Optional[str], optional): Unused, the cache index now lives in `output_dir`. \
+            Kept for compatibility. Defaults to None.
+        output_dir (str, optional): Folder of the download cache (see `DownloadCache`). \
+            Defaults to 'test_data/cache/youtube/downloads'.
+        use_cache (bool, optional): Look the video up in the cache first; the downloads are \
+            cached either way. Defaults to True.
+        language (Optional[str], optional): Language of the subtitles, e.g. 'en'. \
+            Defaults to None (yt-dlp's choice).
+        audio_format (Literal['mp3', 'speech'], optional): `mp3` at 44.1 kHz, or `speech`: \
+            16 kHz mono Opus, the input of speech-to-text, much smaller & faster to decode. \
+            Defaults to 'mp3'.
+    """
+    cache = get_download_cache(output_dir)
+    audio_kind = 'speech' if audio_format == 'speech' else 'audio'
+    video_id = _cache_video_id(video_url)
 
     audio_path = None
     transcript_path = None
 
-    if preferred_output in ['transcript', 'both']:
-        logger.debug('Downloading transcript...')
-        transcript_path = download_youtube_content(
-            url=video_url,
-            output_dir=output_dir,
-            suffix='vtt',
-            config={
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'skip_download': True,
-                'quiet': True,
-            }    
-        )
+    if use_cache:
+        if preferred_output in ['transcript', 'both']:
+            transcript_path = cache.get(video_id, 'transcript', language)
+        if preferred_output in ['audio', 'both']:
+            audio_path = cache.get(video_id, audio_kind)
+        logger.debug(f'Download cache of {video_id}: transcript={transcript_path}, audio={audio_path}')
+
+    if preferred_output in ['transcript', 'both'] and not transcript_path:
+        logger.debug('Fetching transcript...')
+        subtitles = fetch_youtube_subtitles(video_url, language)
+        if subtitles:
+            transcript_path = cache.put_bytes(
+                video_id, 'transcript', subtitles[1].encode('utf-8'), '.vtt', language=language
+            )
+
+    if preferred_output in ['transcript', 'both'] and not transcript_path:
+        # no WebVTT track was listed: let yt-dlp download (& convert) the subtitles
+        transcript_path = _download_subtitles(video_url, str(cache.cache_dir), language)
+        if transcript_path:
+            transcript_path = cache.put_file(video_id, 'transcript', transcript_path, language=language)
     
-    if preferred_output in ['audio', 'both']:
+    if preferred_output in ['audio', 'both'] and not audio_path:
         logger.debug('Downloading audio...')
+        if audio_format == 'speech':
+            # whisper resamples to 16 kHz mono anyway: a speech quality Opus file
+            # is ~10x smaller than the mp3, and cheap to decode
+            codec, quality, postprocessor_args = 'opus', '32', ['-ar', str(SAMPLE_RATE), '-ac', '1']
+        else:
+            # Set sample rate to 44.1kHz, which is CD quality and recommended
+            codec, quality, postprocessor_args = 'mp3', '192', ['-ar', '44100']
         audio_path = download_youtube_content(
             url=video_url,
-            output_dir=output_dir,
-            suffix='mp3',
+            output_dir=str(cache.cache_dir),
+            suffix=codec,
             config={
                 'format': 'bestaudio/best',
                 'quiet': True,
                 'postprocessors': [{
                     'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
+                    'preferredcodec': codec,
+                    'preferredquality': quality,
                 }],
-                'postprocessor_args': [
-                    # Set sample rate to 44.1kHz, which is CD quality and recommended
-                    '-ar', '44100'
-                ],
+                'postprocessor_args': postprocessor_args,
                 'prefer_ffmpeg': True,
             }
         )
+        if audio_path:
+            audio_path = cache.put_file(video_id, audio_kind, audio_path)
 
-    if cache_data:
-        transcript_path = transcript_path or cache_data.transcript_path
-        audio_path = audio_path or cache_data.audio_path
-    
-    data = YTContentData(
+    logger.debug(f'Download cache: {cache.stats}')
+    return YTContentData(
         type = 'text' if preferred_output == 'transcript' else preferred_output,
-        transcript_path = transcript_path,
-        audio_path = audio_path,
+        transcript_path = str(transcript_path) if transcript_path else None,
+        audio_path = str(audio_path) if audio_path else None,
     )
-    cache.save_cache(data.model_dump())
-    return data
+
+
+# ========== BATCH DOWNLOADS ==========
+
+def cached_youtube_content(
+    video_url: str,
+    preferred_output: Literal['audio', 'transcript', 'both'] = 'transcript',
+    output_dir: str = 'test_data/cache/youtube/downloads',
+    language: Optional[str] = None,
+) -> Optional[YTContentData]:
+    """The video's downloads if all of `preferred_output` is in the download cache, None otherwise."""
+    cache = get_download_cache(output_dir)
+    video_id = _cache_video_id(video_url)
+
+    transcript_path = audio_path = None
+    if preferred_output in ['transcript', 'both']:
+        transcript_path = cache.get(video_id, 'transcript', language)
+        if not transcript_path:
+            return None
+    if preferred_output in ['audio', 'both']:
+        audio_path = cache.get(video_id, 'audio')
+        if not audio_path:
+            return None
+
+    return YTContentData(
+        type = 'text' if preferred_output == 'transcript' else preferred_output,
+        transcript_path = str(transcript_path) if transcript_path else None,
+        audio_path = str(audio_path) if audio_path else None,
+    )
+
+
+def _iter_playlist_video_ids(ydl: YoutubeDL, info: Dict[str, Any], depth: int = 0):
+    for entry in info.get('entries') or []:
+        video_id = entry.get('id') if _VIDEO_ID_RE.match(entry.get('id') or '') else None
+        if video_id and entry.get('ie_key', 'Youtube') == 'Youtube':
+            yield video_id
+        elif entry.get('url') and depth < 2:
+            # a channel lists its tabs (videos, shorts, ...) as nested playlists
+            yield from _iter_playlist_video_ids(
+                ydl, ydl.extract_info(entry['url'], download=False), depth + 1
+            )
+
+
+def expand_youtube_urls(urls: Union[str, List[str]]) -> List[str]:
+    """The video URLs to download for `urls`: playlist & channel URLs are expanded to the URLs \
+    of their videos (a flat listing, nothing is downloaded), and duplicate videos are dropped."""
+    if isinstance(urls, str):
+        urls = [urls]
+
+    video_urls: Dict[str, str] = {}
+    for url in urls:
+        video_id = extract_youtube_video_id(url)
+        host = (urlsplit(url if '//' in url else '//' + url).hostname or '').lower()
+        is_youtube = is_youtube_host(host)
+
+        if video_id or not is_youtube:
+            video_urls.setdefault(video_id or url, url)
+            continue
+
+        ydl = get_youtube_dl({'quiet': True, 'skip_download': True, 'extract_flat': 'in_playlist'})
+        try:
+            info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            logger.error(f"Could not list the videos of {url}: {e}")
+            continue
+        video_ids = list(_iter_playlist_video_ids(ydl, info))
+        logger.info(f"{url}: {len(video_ids)} videos")
+        for video_id in video_ids:
+            video_urls.setdefault(video_id, f"https://www.youtube.com/watch?v={video_id}")
+    return list(video_urls.values())
+
+
+def _rate_limit_key(url: str) -> str:
+    host = (urlsplit(url if '//' in url else '//' + url).hostname or '').lower()
+    return 'youtube.com' if is_youtube_host(host) else host
+
+
+async def aiter_youtube_downloads(
+    urls: Union[str, List[str]],
+    preferred_output: Literal['audio', 'transcript', 'both'] = 'transcript',
+    max_concurrency: int = 4,
+    requests_per_second: Optional[float] = 2.0,
+    output_dir: str = 'test_data/cache/youtube/downloads',
+    language: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Union[YTContentData, Exception]]]:
+    """Downloads many videos concurrently, and yields every `(url, data or error)` as soon as \
+    it's done (in completion order), so the caller can process it while the others download.
+
+    Args:
+        urls (Union[str, List[str]]): video URLs, and/or playlist & channel URLs (see `expand_youtube_urls()`).
+        preferred_output (Literal['audio', 'transcript', 'both'], optional): Defaults to 'transcript'.
+        max_concurrency (int, optional): Max. number of downloads in flight. Defaults to 4.
+        requests_per_second (Optional[float], optional): Rate of new downloads per host, None for \
+            no rate limit. Cached videos are not limited. Defaults to 2.0.
+        output_dir (str, optional): Folder of the download cache. Defaults to 'test_data/cache/youtube/downloads'.
+        language (Optional[str], optional): Language of the subtitles. Defaults to None (yt-dlp's choice).
+    """
+    urls = await run_in_threadpool(expand_youtube_urls, urls)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    host_limiters: Dict[str, AsyncRateLimiter] = {}
+
+    async def download(url: str) -> Tuple[str, Union[YTContentData, Exception]]:
+        try:
+            data = await run_in_threadpool(
+                cached_youtube_content, url, preferred_output, output_dir, language
+            )
+            if data:
+                return url, data
+
+            limiter = host_limiters.setdefault(
+                _rate_limit_key(url), AsyncRateLimiter(max_concurrency, requests_per_second)
+            )
+            async with semaphore, limiter:
+                return url, await run_in_threadpool(
+                    download_youtube_audio_or_transcript,
+                    url, preferred_output, output_dir=output_dir, use_cache=False, language=language,
+                )
+        except Exception as e:
+            logger.error(f"Download of {url} failed: {e!r}")
+            return url, e
+
+    tasks = [asyncio.ensure_future(download(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # the consumer stopped early
+        for task in tasks:
+            task.cancel()
@@ -1,6 +1,12 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
 from pathlib import Path
+from datetime import datetime
 from loguru import logger
-from typing_extensions import Any, List, Dict, Optional, Union
+from typing_extensions import Any, Callable, List, Dict, Optional, Union
 
 from pydantic import BaseModel
 from langchain_core.documents import Document
@@ -12,10 +18,90 @@ from qdrant_client.http import models
 from qdrant_client import QdrantClient
 from langchain_qdrant import QdrantVectorStore
 
+from intellitube.utils import canonical_source_key
+from intellitube.embeddings import (
+    DEFAULT_EMBEDDING_MODEL,
+    load_embedding_model, get_cached_embeddings, get_embedding_dimension
+)
+
+
+# one local Qdrant client per storage path: a path can be opened only once per process
+_qdrant_clients: Dict[Path, QdrantClient] = {}
+_qdrant_clients_lock = threading.Lock()
+_shared_collection_lock = threading.Lock()
+# serialize the read-modify-write of a source's `chat_ids`: a payload update replaces the whole list
+_source_locks: Dict[tuple, threading.RLock] = {}
+_source_locks_lock = threading.Lock()
+
+
+def get_qdrant_client(path: Union[Path, str]) -> QdrantClient:
+    """Returns the process-wide Qdrant client of the local database at `path`."""
+    path = Path(path).resolve()
+    with _qdrant_clients_lock:
+        client = _qdrant_clients.get(path)
+        if client is None:
+            client = QdrantClient(path=str(path))
+            _qdrant_clients[path] = client
+            logger.debug(f"New Qdrant Client Initialized: {path}")
+    return client
+
+
+def close_qdrant_client(path: Union[Path, str]) -> None:
+    """Closes & removes the pooled client of `path` (e.g. before deleting the database)."""
+    with _qdrant_clients_lock:
+        client = _qdrant_clients.pop(Path(path).resolve(), None)
+    if client is not None:
+        client.close()
+
+
+class SourceManifest:
+    """Record of the sources indexed in a collection, persisted as JSON next to its database.
+
+    Each entry is keyed by the canonical source (see `VectorStoreManager.source_key()`) and holds \
+    the source's `content_hash`, its point `ids` and when it was indexed.
+    """
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        self._sources: Dict[str, Dict[str, Any]] = (
+            json.loads(self._path.read_text()) if self._path.exists() else {}
+        )
+
+    def get(self, source_key: str) -> Optional[Dict[str, Any]]:
+        return self._sources.get(source_key)
+
+    def set(self, source_key: str, content_hash: str, ids: List[str]) -> None:
+        with self._lock:
+            self._sources[source_key] = {
+                "content_hash": content_hash,
+                "ids": ids,
+                "indexed_timestamp": datetime.timestamp(datetime.now()),
+            }
+            # write to a temporary file first, so a crash never leaves a half-written manifest
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+            temp_path.write_text(json.dumps(self._sources))
+            os.replace(temp_path, self._path)
+
+
+_source_manifests: Dict[Path, SourceManifest] = {}
+_source_manifests_lock = threading.Lock()
+
+
+def get_source_manifest(path: Union[Path, str]) -> SourceManifest:
+    """Returns the process-wide manifest at `path`, shared by all managers of the collection."""
+    path = Path(path).resolve()
+    with _source_manifests_lock:
+        manifest = _source_manifests.get(path)
+        if manifest is None:
+            manifest = _source_manifests[path] = SourceManifest(path)
+    return manifest
+
 
 class VectorStoreManager:
     # fallback embedding model
-    _fallback_embedding_model_name: str = 'sentence-transformers/all-MiniLM-L12-v2'
+    _fallback_embedding_model_name: str = DEFAULT_EMBEDDING_MODEL
     _embedding_model: Union[BaseModel, Embeddings] = None
     
     # define paths
@@ -25,6 +111,12 @@ class VectorStoreManager:
     # collection names & status
     _collection_name: str = "my collection"
 
+    # shared (multi-tenant) mode: every chat lives in one collection
+    _shared_db_local_path: Path = _db_local_path / "shared"
+    _shared_collection_name: str = "intellitube"
+    _shared_collection: bool = False
+    _chat_id: Optional[str] = None
+
     # vector store
     _client: QdrantClient = None
     _vector_store: QdrantVectorStore = None
@@ -32,6 +124,9 @@ class VectorStoreManager:
     # retriever
     _retriever: VectorStoreRetriever = None
 
+    # namespace of the deterministic point ids
+    _point_id_namespace: uuid.UUID = uuid.UUID("5b0e3f52-9c1e-4c38-8a43-6f1f0d1b7c2e")
+
     @property
     def fallback_embedding_model_name(self) -> str:
         return self._fallback_embedding_model_name
@@ -60,6 +155,32 @@ class VectorStoreManager:
     def collection_exists(self) -> bool:
         return self.client.collection_exists(self.collection_name)
     
+    @property
+    def manifest(self) -> SourceManifest:
+        """The sources indexed in the collection."""
+        return get_source_manifest(
+            self.db_local_path / f"{self.collection_name}.manifest.json"
+        )
+    
+    @property
+    def shared_collection(self) -> bool:
+        return self._shared_collection
+    
+    @property
+    def chat_id(self) -> Optional[str]:
+        return self._chat_id
+    
+    @property
+    def search_filter(self) -> Optional[models.Filter]:
+        """Restricts the searches to the current chat's documents (in shared mode)."""
+        if not self.shared_collection:
+            return None
+        return models.Filter(must=[
+            models.FieldCondition(
+                key="metadata.chat_ids", match=models.MatchValue(value=self.chat_id)
+            )
+        ])
+    
     @property
     def client(self) -> QdrantClient:
         assert self._client is not None, "Initialize vector store first!"
@@ -74,7 +195,7 @@ class VectorStoreManager:
     def retriever(self) -> VectorStoreRetriever:
         """Summons the default retriever!"""
         if not self._retriever:
-            self._retriever = self.vectorstore.as_retriever()
+            self._retriever = self.as_retriever()
         return self._retriever
     
     def __init__(self,
@@ -83,48 +204,317 @@ class VectorStoreManager:
         collection_path_on_disk: Optional[str] = None,
         collection_name: Optional[str] = None,
         vector_config: Optional[models.VectorParams] = None,
-        auto_init_vector_store: bool = True
+        auto_init_vector_store: bool = True,
+        use_embedding_cache: bool = True,
+        embedding_cache_path: Optional[str] = None,
+        shared_collection: bool = False,
+        chat_id: Optional[str] = None,
     ) -> None:
+        """
+        Args:
+            shared_collection (bool, optional): Keep all the chats in one collection, instead of \
+                one database per chat. The points are tagged with their `chat_ids` & `source_hash`, \
+                searches are filtered by `chat_id` and a source is stored only once across chats. \
+                `path_on_disk` & `collection_name` default to the shared database. Defaults to False.
+            chat_id (Optional[str], optional): The chat this manager serves. Required in shared mode.
+        """
+        if shared_collection:
+            if not chat_id:
+                raise ValueError("`chat_id` must be provided in shared collection mode.")
+            path_on_disk = path_on_disk or self._shared_db_local_path
+            collection_name = collection_name or self._shared_collection_name
+
+        self._shared_collection = shared_collection
+        self._chat_id = chat_id
         self._db_local_path = path_on_disk or self.db_local_path
         self._collection_local_path = collection_path_on_disk or self.collection_local_path
         self.collection_name = collection_name or self.collection_name
         self._embedding_model = embedding_model or self.load_fallback_embedding_model()
 
+        # don't re-embed the chunks that were already embedded once (e.g. in another chat)
+        if use_embedding_cache:
+            self._embedding_model = get_cached_embeddings(
+                self._embedding_model, cache_path=embedding_cache_path
+            )
+
         if auto_init_vector_store:
             self.init_vector_store(vector_config=vector_config)
         
-    def load_fallback_embedding_model(self) -> None:
-        from langchain_huggingface import HuggingFaceEmbeddings
-        return HuggingFaceEmbeddings(
-            model=self.fallback_embedding_model_name
-        )
+    def load_fallback_embedding_model(self) -> Embeddings:
+        # loaded once per process & shared by every session
+        return load_embedding_model(self.fallback_embedding_model_name)
+    
+    def as_retriever(self, **kwargs) -> VectorStoreRetriever:
+        """`QdrantVectorStore.as_retriever()` that only sees the current chat's documents."""
+        if self.shared_collection:
+            kwargs["search_kwargs"] = {
+                **kwargs.get("search_kwargs", {}), "filter": self.search_filter
+            }
+        return self.vectorstore.as_retriever(**kwargs)
     
     def init_vector_store(self, vector_config: Optional[models.VectorParams] = None) -> None:
-        if self.collection_local_path.exists():
-            self._vector_store = QdrantVectorStore.from_existing_collection(
+        self._client = get_qdrant_client(self.db_local_path)
+
+        if self.shared_collection:
+            self._init_shared_collection(vector_config)
+        elif self.collection_local_path.exists():
+            self._vector_store = QdrantVectorStore(
+                client=self.client,
                 collection_name=self.collection_name,
-                embedding=self.embedding_model,
-                path=self.db_local_path
+                embedding=self.embedding_model
             )
             logger.debug("Vector Store loaded from existing collection.")
         else:
-            self._client = QdrantClient(path=self.db_local_path)
             # create the collection
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=vector_config or models.VectorParams(
-                    size=len(self.embedding_model.embed_query("hehe")),
+                    size=get_embedding_dimension(self.embedding_model),
                     distance=models.Distance.COSINE
                 )
             )
-            logger.debug("New Qdrant Client Initialized.")
+            # the collection was just created for this model, no need to embed a
+            # dummy text only to validate its vector size
             self._vector_store = QdrantVectorStore(
                 client=self.client,
                 collection_name=self.collection_name,
-                embedding=self.embedding_model
+                embedding=self.embedding_model,
+                validate_collection_config=False,
             )
             logger.debug("New Vector Store Created.")
     
+    def _init_shared_collection(self, vector_config: Optional[models.VectorParams] = None) -> None:
+        created = False
+        with _shared_collection_lock:  # two chats may start at the same time
+            if not self.collection_exists:
+                self.client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config=vector_config or models.VectorParams(
+                        size=get_embedding_dimension(self.embedding_model),
+                        distance=models.Distance.COSINE
+                    )
+                )
+                for field_name in ("metadata.chat_ids", "metadata.source_hash", "metadata.source_key"):
+                    self.client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field_name,
+                        field_schema=models.PayloadSchemaType.KEYWORD,
+                    )
+                created = True
+
+        self._vector_store = QdrantVectorStore(
+            client=self.client,
+            collection_name=self.collection_name,
+            embedding=self.embedding_model,
+            validate_collection_config=not created,
+        )
+        logger.debug(f"Shared Vector Store {'Created' if created else 'Loaded'} for chat: {self.chat_id}")
+    
+    @staticmethod
+    def content_hash(documents: List[Document]) -> str:
+        """Hash of the documents' contents, identifies a source regardless of its URL/path."""
+        digest = hashlib.sha256()
+        for document in documents:
+            digest.update(document.page_content.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def _source_filter(self, source_hash: str) -> models.Filter:
+        return models.Filter(must=[
+            models.FieldCondition(
+                key="metadata.source_hash", match=models.MatchValue(value=source_hash)
+            )
+        ])
+    
+    def _source_lock(self, source_hash: str) -> threading.RLock:
+        """The process-wide lock of a source's `chat_ids` in this collection."""
+        key = (self.db_local_path.resolve(), self.collection_name, source_hash)
+        with _source_locks_lock:
+            return _source_locks.setdefault(key, threading.RLock())
+    
+    def link_source(self, source_hash: str) -> bool:
+        """Makes an already indexed source visible to the current chat (shared mode).
+
+        Returns:
+            bool: `False` if no points of the source exist, i.e. it must be indexed first.
+        """
+        source_filter = self._source_filter(source_hash)
+        # another chat may link the source at the same time, its id must not be lost
+        with self._source_lock(source_hash):
+            points, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=source_filter,
+                limit=1, with_payload=True, with_vectors=False,
+            )
+            if not points:
+                return False
+            
+            chat_ids: List[str] = (points[0].payload.get("metadata") or {}).get("chat_ids", [])
+            if self.chat_id not in chat_ids:
+                self.client.set_payload(
+                    collection_name=self.collection_name,
+                    payload={"chat_ids": chat_ids + [self.chat_id]},
+                    points=source_filter,
+                    key="metadata",
+                )
+        return True
+    
+    @staticmethod
+    def source_key(source: Any) -> str:
+        """Canonical name of a source, e.g. every URL of a YouTube video maps to the same key."""
+        return canonical_source_key(source)
+    
+    def point_id(self, source_key: str, content: str) -> str:
+        """Deterministic point id, re-adding a chunk overwrites the point instead of duplicating it."""
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        return str(uuid.uuid5(self._point_id_namespace, f"{source_key}\0{content_hash}"))
+    
+    def use_indexed_source(self, source: Any) -> bool:
+        """Checks if `source` is already indexed, so it does not need to be loaded again.
+        In shared mode, the source is also made visible to the current chat.
+        """
+        entry = self.manifest.get(self.source_key(source))
+        if not entry:
+            return False
+        if self.shared_collection:
+            if not self.link_source(entry["content_hash"]):
+                return False
+            self._unlink_stale_points(self.source_key(source), entry["content_hash"])
+        return True
+    
+    def _add_source(self, source_key: str, documents: List[Document], split: Callable) -> None:
+        """Indexes the documents of a single source, unless exactly this content is already indexed."""
+        source_hash = self.content_hash(documents)
+        entry = self.manifest.get(source_key)
+
+        if entry and entry["content_hash"] == source_hash:
+            if not self.shared_collection or self.link_source(source_hash):
+                logger.info(f"Source already indexed, skipping: {source_key}")
+                if self.shared_collection:
+                    # the chat may still be linked to the version it indexed before
+                    self._unlink_stale_points(source_key, source_hash)
+                return
+        
+        # in shared mode the same content may be indexed under another URL/path (or by another chat)
+        if self.shared_collection and self.link_source(source_hash):
+            logger.info(f"Source already indexed, linked it to chat {self.chat_id}: {source_key}")
+            self._unlink_stale_points(source_key, source_hash)
+            self.manifest.set(source_key, source_hash, entry["ids"] if entry else [])
+            return
+        
+        documents = split(documents)
+        
+        # the same chunk may occur more than once in a source, keep one point per id
+        points = {self.point_id(source_key, doc.page_content): doc for doc in documents}
+        ids = list(points.keys())
+
+        logger.info(f"Adding documents of: {source_key}")
+        if not self.shared_collection:
+            self.vectorstore.add_documents(list(points.values()), ids=ids)
+        else:
+            self._upsert_shared_points(points, source_key, source_hash, entry["content_hash"] if entry else None)
+            self._unlink_stale_points(source_key, source_hash)
+
+        # the source changed since it was indexed: drop the outdated chunks
+        # (in shared mode, `_unlink_stale_points()` unlinks them from this chat only)
+        if entry and not self.shared_collection:
+            stale_ids = list(set(entry["ids"]) - set(ids))
+            if stale_ids:
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=models.PointIdsList(points=stale_ids),
+                )
+        self.manifest.set(source_key, source_hash, ids)
+    
+    def _upsert_shared_points(
+        self, points: Dict[str, Document], source_key: str, source_hash: str, previous_hash: Optional[str] = None,
+    ) -> None:
+        """Writes a source's points to the shared collection, tagged with its `source_hash`. \
+        The unchanged chunks of a re-indexed source keep the chats they were linked to; its outdated \
+        chunks are unlinked from the current chat (see `_unlink_stale_points()`)."""
+        # lock the previous version too, its chunks are rewritten; always in the same order
+        locks = [self._source_lock(h) for h in sorted({source_hash, previous_hash or source_hash})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            existing = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=list(points.keys()), with_payload=True, with_vectors=False,
+            )
+            chat_ids: Dict[str, List[str]] = {
+                str(point.id): (point.payload.get("metadata") or {}).get("chat_ids", [])
+                for point in existing
+            }
+            for point_id, document in points.items():
+                linked = chat_ids.get(point_id, [])
+                document.metadata = {
+                    **document.metadata,
+                    "chat_ids": linked + [self.chat_id] if self.chat_id not in linked else linked,
+                    "source_hash": source_hash,
+                    "source_key": source_key,
+                }
+            self.vectorstore.add_documents(list(points.values()), ids=list(points.keys()))
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+    
+    def _unlink_stale_points(self, source_key: str, source_hash: str) -> None:
+        """Removes the current chat from the points of the other (outdated) versions of a source, \
+        and deletes the points no chat is linked to anymore."""
+        def stale_filter(*must: models.FieldCondition) -> models.Filter:
+            return models.Filter(
+                must=[
+                    models.FieldCondition(key="metadata.source_key", match=models.MatchValue(value=source_key)),
+                    models.FieldCondition(key="metadata.chat_ids", match=models.MatchValue(value=self.chat_id)),
+                    *must,
+                ],
+                must_not=self._source_filter(source_hash).must,
+            )
+        
+        def scroll_all(scroll_filter: models.Filter) -> List[Any]:
+            points, offset = [], None
+            while True:
+                page, offset = self.client.scroll(
+                    collection_name=self.collection_name, scroll_filter=scroll_filter,
+                    limit=256, offset=offset, with_payload=True, with_vectors=False,
+                )
+                points.extend(page)
+                if offset is None:
+                    return points
+        
+        stale_hashes = {
+            (point.payload.get("metadata") or {}).get("source_hash") for point in scroll_all(stale_filter())
+        }
+        # the `chat_ids` of a version are updated under its lock (see `link_source()`), one at a time
+        for stale_hash in sorted(filter(None, stale_hashes)):
+            with self._source_lock(stale_hash):
+                unused_ids: List[Any] = []
+                # remaining chat ids -> points
+                relinked: Dict[tuple, List[Any]] = {}
+                for point in scroll_all(stale_filter(*self._source_filter(stale_hash).must)):
+                    chat_ids = tuple(
+                        chat_id for chat_id in (point.payload.get("metadata") or {}).get("chat_ids", [])
+                        if chat_id != self.chat_id
+                    )
+                    (relinked.setdefault(chat_ids, []) if chat_ids else unused_ids).append(point.id)
+                
+                for chat_ids, point_ids in relinked.items():
+                    self.client.set_payload(
+                        collection_name=self.collection_name,
+                        payload={"chat_ids": list(chat_ids)},
+                        points=point_ids,
+                        key="metadata",
+                    )
+                if unused_ids:
+                    self.client.delete(
+                        collection_name=self.collection_name,
+                        points_selector=models.PointIdsList(points=unused_ids),
+                    )
+                logger.info(
+                    f"Unlinked {sum(map(len, relinked.values())) + len(unused_ids)} outdated chunks of "
+                    f"{source_key} from chat {self.chat_id} ({len(unused_ids)} deleted)"
+                )
+    
     def add_documents(self, 
         documents: List[Document], 
         split_text: bool = False, 
@@ -132,16 +522,25 @@ class VectorStoreManager:
         skip_if_collection_exists: bool = True,
     ) -> None:
         
-        if skip_if_collection_exists and self.collection_exists:
+        def split(documents: List[Document]) -> List[Document]:
+            if not split_text:
+                return documents
+            logger.info("Splitting text...")
+            self._text_splitter = RecursiveCharacterTextSplitter(**split_config)
+            return self._text_splitter.split_documents(documents)
+        
+        # the shared collection always exists, deduplication is done per source instead
+        if not self.shared_collection and skip_if_collection_exists and self.collection_exists:
             logger.warning(
                 "Collection exists, so NOT ADDING documents." \
                 "To override this behaviour, set `skip_if_collection_exists` parameter to `False`.")
             return
         
-        if split_text:
-            logger.info("Splitting text...")
-            self._text_splitter = RecursiveCharacterTextSplitter(**split_config)
-            documents = self._text_splitter.split_documents(documents)
-        
-        logger.info("Adding documents...")
-        self._vector_store.add_documents(documents)
+        sources: Dict[str, List[Document]] = {}
+        for document in documents:
+            sources.setdefault(
+                self.source_key(document.metadata.get("source", "")), []
+            ).append(document)
+
+        for source_key, source_documents in sources.items():
+            self._add_source(source_key, source_documents, split)